@@ -0,0 +1,70 @@
+"""
+Command line tools.
+
+Usage:
+    python -m app.cli import-history --user-id USER_ID Streaming_History_Audio_*.json
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from typing import Optional
+
+from app.database import create_tables, user_session_maker
+from app.schemas.tracking import ImportSummary
+from app.services.import_service import import_file
+
+
+async def import_history(user_id: str, paths: list[str]) -> None:
+    """Import extended streaming history files for a user."""
+    await create_tables()
+    started = time.monotonic()
+    total = ImportSummary()
+
+    def report(summary: ImportSummary) -> None:
+        elapsed = time.monotonic() - started
+        print(
+            f"  {summary.parsed} read, {summary.imported} imported, "
+            f"{summary.duplicates} duplicates, {summary.skipped} skipped ({elapsed:.0f}s)",
+            flush=True,
+        )
+
+    for path in paths:
+        print(f"{path}:")
+        async with user_session_maker(user_id)() as db:
+            with open(path, "rb") as file:
+                summary = await import_file(db, user_id, file, on_progress=report)
+        report(summary)
+        for field in ("parsed", "imported", "duplicates", "skipped"):
+            setattr(total, field, getattr(total, field) + getattr(summary, field))
+
+    elapsed = time.monotonic() - started
+    print(f"Done: {total.imported} plays imported from {len(paths)} file(s) in {elapsed:.1f}s")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser(
+        "import-history",
+        help="Import Spotify extended streaming history (Streaming_History_Audio_*.json)",
+    )
+    import_parser.add_argument("--user-id", required=True, help="Spotify user ID to import for")
+    import_parser.add_argument("files", nargs="+", help="Export files")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "import-history":
+        try:
+            asyncio.run(import_history(args.user_id, args.files))
+        except ValueError as e:
+            print(f"Import failed: {e}", file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
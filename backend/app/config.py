@@ -1,6 +1,7 @@
 """Application configuration using Pydantic Settings."""
 
 from functools import lru_cache
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 
@@ -16,9 +17,118 @@ class Settings(BaseSettings):
     secret_key: str = "change-this-in-production"
     database_url: str = "sqlite+aiosqlite:///./spotify_stats.db"
     
+    # Connection pool for server databases (postgresql+asyncpg://...);
+    # SQLite files keep SQLAlchemy's defaults
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_pre_ping: bool = True
+    db_pool_recycle_seconds: int = 1800
+    
+    # Reads (stats, history, analytics) use their own engine and pool, on
+    # database_read_url if set (e.g. a PostgreSQL replica). With SQLite all
+    # writes go through a single pooled connection, so they queue in the
+    # app instead of retrying on the database lock.
+    database_read_url: Optional[str] = None
+    sqlite_single_writer: bool = True
+    
     # Frontend
     frontend_url: str = "http://127.0.0.1:3000"
     
+    # Analytics: rows are streamed in batches of analytics_batch_size;
+    # batches above the threshold are split across the process pool's
+    # workers and folded in parallel (0 workers keeps everything inline)
+    analytics_process_workers: int = 2
+    analytics_offload_threshold: int = 20000
+    analytics_batch_size: int = 50000
+    
+    # Archive: plays older than this many days (whole months) move from the
+    # database to compressed segment files in archive_dir (0, the default,
+    # keeps every play in the database; e.g. 365 enables the archive)
+    archive_after_days: int = 0
+    archive_dir: str = "./archive"
+    
+    # Streaming history import: plays written per transaction
+    import_batch_size: int = 20000
+    
+    # Store listening sessions in one table per month, so window queries
+    # only read the months they cover (existing rows are moved at startup)
+    session_partitioning: bool = False
+    # How long a process trusts its list of partitions before re-reading the
+    # catalog (partitions created by other processes show up after this)
+    partition_cache_seconds: float = 60.0
+    
+    # Spread users' listening data over this many SQLite files in shard_dir
+    # (by hash of the user id), so writers for different users don't wait
+    # on one database lock. Tokens stay in database_url. 0 disables.
+    # SQLite only; users stored elsewhere are moved by migrate_to_shards.
+    shard_count: int = 0
+    shard_dir: str = "./shards"
+    
+    # SQLite storage profile applied to every connection: WAL journal with
+    # synchronous=NORMAL, a larger page cache and memory-mapped reads.
+    # Checkpoints and PRAGMA optimize run from the scheduler.
+    sqlite_tuning: bool = True
+    sqlite_cache_size_kib: int = 65536
+    sqlite_mmap_size_mb: int = 256
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_checkpoint_minutes: int = 10
+    sqlite_optimize_hours: int = 6
+    
+    # Online backups of the SQLite databases: gzip snapshots in backup_dir,
+    # the newest backup_keep kept per database (0 hours disables). Pages are
+    # copied backup_step_pages at a time, with a backup_step_pause_ms pause
+    # after each step in which writers get the database to themselves.
+    backup_interval_hours: int = 24
+    backup_dir: str = "./backups"
+    backup_keep: int = 7
+    backup_step_pages: int = 1024
+    backup_step_pause_ms: int = 5
+    
+    # With several processes (uvicorn --workers N) the one holding a lease
+    # row in the main database runs the background jobs. The lease is
+    # renewed every leader_heartbeat_seconds and taken over by another
+    # process once it has not been renewed for leader_lease_seconds.
+    leader_election: bool = True
+    leader_lease_seconds: int = 15
+    leader_heartbeat_seconds: int = 5
+    
+    # Activity-tiered polling by the tracking job: users seen playing are
+    # polled every tick, users who played in the last poll_recent_minutes
+    # or are in one of their usual listening hours every
+    # poll_recent_seconds, and the rest every poll_dormant_seconds. Usual
+    # hours hold at least poll_usual_hour_share of a user's plays over the
+    # last poll_profile_days and are reloaded every poll_profile_hours.
+    poll_tiers: bool = True
+    poll_recent_seconds: int = 120
+    poll_dormant_seconds: int = 600
+    poll_recent_minutes: int = 30
+    poll_profile_days: int = 28
+    poll_profile_hours: int = 6
+    poll_usual_hour_share: float = 0.06
+    
+    # Live feed (GET /api/live/stream): at most live_max_subscribers open
+    # streams, live_max_subscribers_per_user per user. Processes other
+    # than the scheduler's pick up its updates every live_sync_seconds;
+    # idle streams get a keepalive comment every live_keepalive_seconds.
+    live_max_subscribers: int = 1000
+    live_max_subscribers_per_user: int = 10
+    live_sync_seconds: float = 1.0
+    live_keepalive_seconds: int = 15
+    
+    # Event loop monitor: lag is sampled every loop_monitor_interval_ms
+    # (0 disables) and the stack of code blocking the loop for longer than
+    # loop_block_threshold_ms is logged
+    loop_monitor_interval_ms: int = 100
+    loop_block_threshold_ms: int = 250
+    
+    # On-demand profiling: requests with an X-Profile: <profiling_token>
+    # header (or ?profile=<token>) and requested scheduler ticks are sampled
+    # every profiling_interval_ms into collapsed stack files in profile_dir.
+    # No token disables profiling.
+    profiling_token: Optional[str] = None
+    profiling_interval_ms: int = 5
+    profile_dir: str = "./profiles"
+    
     # Spotify API URLs
     spotify_auth_url: str = "https://accounts.spotify.com/authorize"
     spotify_token_url: str = "https://accounts.spotify.com/api/token"
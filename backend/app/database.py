@@ -1,24 +1,110 @@
 """Database configuration and session management."""
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+import zlib
+from pathlib import Path
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import NullPool
 
 from app.config import get_settings
 
 settings = get_settings()
 
-# Create async engine
-engine = create_async_engine(
-    settings.database_url,
-    echo=False,  # Set to True for SQL debugging
-)
 
-# Session factory
+def _apply_sqlite_profile(dbapi_connection, connection_record) -> None:
+    """Set the storage pragmas on a new SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run next to the writer; with it, NORMAL only syncs
+    # at checkpoints and can't corrupt the database on power loss
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA cache_size=-{settings.sqlite_cache_size_kib}")
+    cursor.execute(f"PRAGMA mmap_size={settings.sqlite_mmap_size_mb * 1024 * 1024}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def configure_engine(async_engine: AsyncEngine) -> AsyncEngine:
+    """Apply the SQLite storage profile to an engine's connections."""
+    if settings.sqlite_tuning and async_engine.dialect.name == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", _apply_sqlite_profile)
+    return async_engine
+
+
+def _make_query_only(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def _pool_options(url: str, read_only: bool) -> dict:
+    """Pool settings for an engine's role."""
+    if url.startswith("sqlite"):
+        if read_only or not settings.sqlite_single_writer or ":memory:" in url:
+            return {}
+        # One connection: writers wait for the pool, not for SQLITE_BUSY
+        return {"pool_size": 1, "max_overflow": 0}
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+    }
+
+
+def create_engine_for(url: str, read_only: bool = False, pooled: bool = True) -> AsyncEngine:
+    """Create a write or read-only engine, each with its own pool (or none)."""
+    async_engine = configure_engine(create_async_engine(
+        url,
+        echo=False,  # Set to True for SQL debugging
+        **(_pool_options(url, read_only) if pooled else {"poolclass": NullPool}),
+    ))
+    if read_only and async_engine.dialect.name == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", _make_query_only)
+    return async_engine
+
+
+# Write engine, and a read engine with its own pool for API reads
+engine = create_engine_for(settings.database_url)
+read_engine = create_engine_for(settings.database_read_url or settings.database_url, read_only=True)
+# Unpooled engine for the scheduler lease: a heartbeat opens its own
+# connection instead of waiting for the (single) write connection
+lease_engine = create_engine_for(settings.database_url, pooled=False)
+
+# Session factories
 async_session_maker = async_sessionmaker(
     engine,
     class_=AsyncSession,
     expire_on_commit=False,
 )
+read_session_maker = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+lease_session_maker = async_sessionmaker(
+    lease_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+# Tables that live only in the main database when sharding is enabled
+MAIN_TABLES = {"user_tokens", "scheduler_leases", "live_status"}
+
+# PostgreSQL advisory lock held while a process creates or upgrades tables
+SCHEMA_LOCK_KEY = zlib.crc32(b"spotify-stats-schema")
+
+# Shard engines and session factories (write, read), created on first use
+_shard_engines: dict[int, AsyncEngine] = {}
+_shard_read_engines: dict[int, AsyncEngine] = {}
+_shard_makers: dict[int, tuple[async_sessionmaker, async_sessionmaker]] = {}
 
 
 class Base(DeclarativeBase):
@@ -26,6 +112,83 @@ class Base(DeclarativeBase):
     pass
 
 
+def shard_for(user_id: str) -> int:
+    """Shard number of a user (stable across restarts and processes)."""
+    return zlib.crc32(user_id.encode()) % settings.shard_count
+
+
+def shard_session_maker(shard: int, read_only: bool = False) -> async_sessionmaker:
+    """Session factory of one shard's SQLite file."""
+    makers = _shard_makers.get(shard)
+    if makers is None:
+        path = Path(settings.shard_dir) / f"shard-{shard:03d}.db"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        url = f"sqlite+aiosqlite:///{path}"
+        _shard_engines[shard] = create_engine_for(url)
+        _shard_read_engines[shard] = create_engine_for(url, read_only=True)
+        makers = (
+            async_sessionmaker(_shard_engines[shard], class_=AsyncSession, expire_on_commit=False),
+            async_sessionmaker(_shard_read_engines[shard], class_=AsyncSession, expire_on_commit=False),
+        )
+        _shard_makers[shard] = makers
+    return makers[1] if read_only else makers[0]
+
+
+def stored_shards() -> list[int]:
+    """Shards with a file in shard_dir, including ones beyond shard_count."""
+    shards = set()
+    for path in Path(settings.shard_dir).glob("shard-*.db"):
+        number = path.stem.removeprefix("shard-")
+        if number.isdigit():
+            shards.add(int(number))
+    return sorted(shards)
+
+
+def user_session_maker(user_id: str, read_only: bool = False) -> async_sessionmaker:
+    """Session factory for a user's listening data (their shard, if sharded)."""
+    if settings.shard_count <= 0:
+        return read_session_maker if read_only else async_session_maker
+    return shard_session_maker(shard_for(user_id), read_only)
+
+
+def data_session_makers() -> list[async_sessionmaker]:
+    """Write session factories of every database holding listening data."""
+    if settings.shard_count <= 0:
+        return [async_session_maker]
+    return [shard_session_maker(shard) for shard in range(settings.shard_count)]
+
+
+def all_engines() -> list[AsyncEngine]:
+    """The main write engine and every shard write engine."""
+    if settings.shard_count <= 0:
+        return [engine]
+    data_session_makers()
+    return [engine] + [_shard_engines[shard] for shard in range(settings.shard_count)]
+
+
+def holds_user(db: AsyncSession, user_id: str) -> bool:
+    """Whether a session's database is the one holding the user's data."""
+    if settings.shard_count <= 0:
+        return True
+    return db.bind is _shard_engines.get(shard_for(user_id))
+
+
+async def dispose_shards() -> None:
+    """Close all shard connections."""
+    for shard_engine in [*_shard_engines.values(), *_shard_read_engines.values()]:
+        await shard_engine.dispose()
+    _shard_engines.clear()
+    _shard_read_engines.clear()
+    _shard_makers.clear()
+
+
+def dialect_insert(db: AsyncSession, table):
+    """INSERT construct with ON CONFLICT support for the session's database."""
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
 async def get_db() -> AsyncSession:
     """Dependency to get database session."""
     async with async_session_maker() as session:
@@ -35,7 +198,100 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+async def get_read_db() -> AsyncSession:
+    """Dependency to get a session on the read engine."""
+    async with read_session_maker() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+def _upgrade_schema(conn) -> None:
+    """Bring tables created by older versions up to date."""
+    columns = {column["name"] for column in inspect(conn).get_columns("listening_sessions")}
+    if "played_bucket" in columns:
+        return
+    
+    # Dedup bucket: 3-minute slots since the epoch (PLAY_BUCKET_SECONDS)
+    if conn.dialect.name == "postgresql":
+        epoch = "CAST(EXTRACT(EPOCH FROM played_at) AS BIGINT)"
+    else:
+        epoch = "CAST(strftime('%s', played_at) AS INTEGER)"
+    
+    conn.execute(text("ALTER TABLE listening_sessions ADD COLUMN played_bucket INTEGER"))
+    conn.execute(text(f"UPDATE listening_sessions SET played_bucket = {epoch} / 180"))
+    # Older duplicates keep their rows but drop out of the unique index
+    conn.execute(text(
+        "UPDATE listening_sessions SET played_bucket = NULL WHERE id NOT IN ("
+        "SELECT MIN(id) FROM listening_sessions GROUP BY user_id, track_id, played_bucket)"
+    ))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX idx_user_track_bucket "
+        "ON listening_sessions (user_id, track_id, played_bucket)"
+    ))
+
+
+def _create_data_tables(conn) -> None:
+    tables = [table for table in Base.metadata.sorted_tables if table.name not in MAIN_TABLES]
+    Base.metadata.create_all(conn, tables=tables)
+
+
+def _run_migrations(conn) -> None:
+    """Upgrade the database to the latest Alembic revision."""
+    from alembic import command
+    from alembic.config import Config
+    
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "migrations"))
+    config.attributes["connection"] = conn
+    command.upgrade(config, "head")
+
+
+async def _lock_schema(conn) -> None:
+    """
+    Wait for other processes' schema changes and keep them out until commit.
+    
+    Workers starting together would otherwise all see a table missing and
+    all try to create it.
+    """
+    if conn.dialect.name == "postgresql":
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+    else:
+        # Takes the database's write lock (waiting up to busy_timeout)
+        await conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
 async def create_tables():
-    """Create all database tables."""
+    """
+    Create all database tables.
+    
+    PostgreSQL schemas are managed by the Alembic migrations in
+    backend/migrations; SQLite files are created from the models. Each
+    database is changed by one process at a time.
+    """
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await _lock_schema(conn)
+        if conn.dialect.name == "postgresql":
+            await conn.run_sync(_run_migrations)
+        else:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(_upgrade_schema)
+    await create_shard_tables()
+
+
+async def create_shard_tables():
+    """Create the listening data tables in every shard."""
+    if settings.shard_count <= 0:
+        return
+    if engine.dialect.name != "sqlite":
+        # Shards are SQLite files; the rest of the data would be split
+        # between them and the PostgreSQL server
+        raise RuntimeError("shard_count needs a SQLite database_url; PostgreSQL is not sharded")
+    
+    data_session_makers()
+    for shard_engine in _shard_engines.values():
+        async with shard_engine.begin() as conn:
+            await _lock_schema(conn)
+            await conn.run_sync(_create_data_tables)
+            await conn.run_sync(_upgrade_schema)
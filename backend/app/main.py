@@ -2,13 +2,20 @@
 
 import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import get_settings
-from app.database import create_tables
-from app.routers import auth_router, spotify_router, tracking_router
-from app.services.scheduler import start_scheduler, stop_scheduler
+from app.database import create_tables, dispose_shards, read_session_maker
+from app.routers import auth_router, live_router, spotify_router, tracking_router
+from app.services.aggregation import shutdown_executor
+from app.services.backup_service import last_backups
+from app.services import loop_monitor
+from app.services.live_feed import live_feed
+from app.services.maintenance import collect_database_stats
+from app.services.profiler import is_authorized, profiling_middleware, request_tick_profile
+from app.services.request_timing import server_timing_middleware
+from app.services.scheduler import runs_jobs, start_scheduler, stop_scheduler
 
 # Configure logging
 logging.basicConfig(
@@ -23,15 +30,21 @@ settings = get_settings()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan handler."""
-    # Startup
+    # Startup (data migrations and backfills run as the scheduler's first job)
     await create_tables()
+    loop_monitor.start_loop_monitor()
+    live_feed.start(read_session_maker)
     start_scheduler()
     print("🚀 Spotify Stats API started!")
     print(f"📊 API docs: http://localhost:8000/docs")
     print("🎵 Background tracking enabled (every 30s)")
     yield
     # Shutdown
-    stop_scheduler()
+    await stop_scheduler()
+    await live_feed.stop()
+    await loop_monitor.stop_loop_monitor()
+    shutdown_executor()
+    await dispose_shards()
     print("👋 Shutting down...")
 
 
@@ -51,10 +64,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Server-Timing header and a timing log line for every request
+app.middleware("http")(server_timing_middleware)
+
+# Sampling profiles of requests carrying the profiling token
+app.middleware("http")(profiling_middleware)
+
 # Include routers
 app.include_router(auth_router)
 app.include_router(spotify_router)
 app.include_router(tracking_router)
+app.include_router(live_router)
 
 
 @app.get("/")
@@ -71,3 +91,32 @@ async def root():
 async def health():
     """Health check endpoint."""
     return {"status": "healthy"}
+
+
+@app.get("/health/db")
+async def database_health():
+    """Size, WAL size and page statistics of the SQLite databases, and the last backups."""
+    return {
+        "databases": await collect_database_stats(),
+        "backups": [result._asdict() for result in last_backups],
+    }
+
+
+@app.get("/health/loop")
+async def loop_health():
+    """Event loop lag percentiles and the latest periods the loop was blocked."""
+    if loop_monitor.monitor is None:
+        return {"enabled": False}
+    return {"enabled": True, **loop_monitor.monitor.stats()}
+
+
+@app.post("/admin/profile/tick")
+async def profile_tick(x_profile: str = Header(...)):
+    """Profile the next background tracking tick (requires the profiling token)."""
+    if not is_authorized(x_profile):
+        raise HTTPException(status_code=403, detail="Profiling not allowed")
+    if not runs_jobs():
+        # Under leader election only the lease holder runs the ticks
+        raise HTTPException(status_code=409, detail="Not the scheduler process")
+    request_tick_profile()
+    return {"message": "The next tracking tick will be profiled", "profile_dir": settings.profile_dir}
@@ -2,5 +2,10 @@
 
 from app.models.listening_session import ListeningSession
 from app.models.user_token import UserToken
+from app.models.day_sketch import ListeningDaySketch
+from app.models.entity_summary import ListeningEntitySummary
+from app.models.id_sequence import IdSequence
+from app.models.scheduler_lease import SchedulerLease
+from app.models.live_status import LiveStatus
 
-__all__ = ["ListeningSession", "UserToken"]
+__all__ = ["ListeningSession", "UserToken", "ListeningDaySketch", "ListeningEntitySummary", "IdSequence", "SchedulerLease", "LiveStatus"]
@@ -0,0 +1,37 @@
+"""Per-user, per-day sketch model for approximate statistics."""
+
+from sqlalchemy import Column, Integer, String, Text, LargeBinary, Index
+
+from app.database import Base
+
+
+class ListeningDaySketch(Base):
+    """Daily totals plus mergeable distinct-count and top-K sketches."""
+    
+    __tablename__ = "listening_day_sketches"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String, nullable=False)
+    day = Column(String(10), nullable=False)  # YYYY-MM-DD (UTC)
+    
+    # Exact totals
+    plays = Column(Integer, nullable=False, default=0)
+    time_ms = Column(Integer, nullable=False, default=0)
+    hourly = Column(Text, nullable=True)  # JSON: 24 x [plays, time_ms]
+    
+    # HyperLogLog sketches (see app.services.sketches)
+    tracks_hll = Column(LargeBinary, nullable=True)
+    artists_hll = Column(LargeBinary, nullable=True)
+    albums_hll = Column(LargeBinary, nullable=True)
+    
+    # Space-Saving summaries (JSON)
+    top_tracks = Column(Text, nullable=True)
+    top_artists = Column(Text, nullable=True)
+    top_albums = Column(Text, nullable=True)
+    
+    __table_args__ = (
+        Index('idx_sketch_user_day', 'user_id', 'day', unique=True),
+    )
+    
+    def __repr__(self) -> str:
+        return f"<ListeningDaySketch(user_id='{self.user_id}', day='{self.day}', plays={self.plays})>"
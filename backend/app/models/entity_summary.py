@@ -0,0 +1,32 @@
+"""Per-user lifetime summary of tracks, artists and albums."""
+
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Index
+
+from app.database import Base
+
+
+class ListeningEntitySummary(Base):
+    """Model for lifetime listening totals of one track, artist or album."""
+    
+    __tablename__ = "listening_entity_summaries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String, nullable=False)
+    entity_type = Column(String(10), nullable=False)  # "track", "artist" or "album"
+    entity_key = Column(String, nullable=False)  # track_id, artist_name or album_name
+    name = Column(String, nullable=False)
+    artist_name = Column(String, nullable=True)  # For tracks and albums
+    
+    first_played_at = Column(DateTime, nullable=False)
+    last_played_at = Column(DateTime, nullable=False)
+    play_count = Column(Integer, nullable=False, default=0)
+    total_ms = Column(BigInteger, nullable=False, default=0)  # Past int32 after ~596 hours
+    
+    __table_args__ = (
+        Index('idx_summary_user_entity', 'user_id', 'entity_type', 'entity_key', unique=True),
+        Index('idx_summary_user_first', 'user_id', 'entity_type', 'first_played_at'),
+        Index('idx_summary_user_last', 'user_id', 'entity_type', 'last_played_at'),
+    )
+    
+    def __repr__(self) -> str:
+        return f"<ListeningEntitySummary({self.entity_type}='{self.name}', plays={self.play_count})>"
@@ -0,0 +1,14 @@
+"""Named id sequences shared by several tables."""
+
+from sqlalchemy import Column, Integer, String
+
+from app.database import Base
+
+
+class IdSequence(Base):
+    """Last id handed out for a sequence (e.g. listening sessions across partitions)."""
+    
+    __tablename__ = "id_sequences"
+    
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
@@ -6,6 +6,22 @@ from sqlalchemy.sql import func
 
 from app.database import Base
 
+# Plays of the same track are deduplicated within 3 minutes; the bucket
+# lets the database enforce that with a unique index
+PLAY_BUCKET_SECONDS = 180
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def play_bucket(played_at: datetime) -> int:
+    """Index of the 3-minute bucket a (naive UTC) play time falls into."""
+    return int((played_at - _EPOCH).total_seconds()) // PLAY_BUCKET_SECONDS
+
+
+def _default_bucket(context) -> int:
+    played_at = context.get_current_parameters().get("played_at")
+    return play_bucket(played_at or datetime.utcnow())
+
 
 class ListeningSession(Base):
     """Model for storing individual listening sessions."""
@@ -20,10 +36,13 @@ class ListeningSession(Base):
     album_name = Column(String, nullable=False)
     duration_ms = Column(Integer, nullable=False)
     played_at = Column(DateTime, server_default=func.now(), nullable=False)
+    # NULL only for duplicates that predate the unique index
+    played_bucket = Column(Integer, nullable=True, default=_default_bucket)
     
     __table_args__ = (
         Index('idx_user_played', 'user_id', 'played_at'),
         Index('idx_user_track', 'user_id', 'track_id'),
+        Index('idx_user_track_bucket', 'user_id', 'track_id', 'played_bucket', unique=True),
     )
     
     def __repr__(self) -> str:
@@ -0,0 +1,15 @@
+"""Latest live status of each tracked user, shared between processes."""
+
+from sqlalchemy import Column, Float, String, Text
+
+from app.database import Base
+
+
+class LiveStatus(Base):
+    """What the scheduler last saw a user playing and recording."""
+    
+    __tablename__ = "live_status"
+    
+    user_id = Column(String, primary_key=True)
+    version = Column(Float, nullable=False)  # Unix time of the last change
+    payload = Column(Text, nullable=False)  # JSON: now_playing, last_play
@@ -0,0 +1,16 @@
+"""Lease row used to elect the process that runs the background jobs."""
+
+from sqlalchemy import Column, DateTime, String
+
+from app.database import Base
+
+
+class SchedulerLease(Base):
+    """Current holder of a named lease and when it runs out unless renewed."""
+    
+    __tablename__ = "scheduler_leases"
+    
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    acquired_at = Column(DateTime, nullable=False)
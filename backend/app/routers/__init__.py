@@ -3,5 +3,6 @@
 from app.routers.auth import router as auth_router
 from app.routers.spotify import router as spotify_router
 from app.routers.tracking import router as tracking_router
+from app.routers.live import router as live_router
 
-__all__ = ["auth_router", "spotify_router", "tracking_router"]
+__all__ = ["auth_router", "spotify_router", "tracking_router", "live_router"]
@@ -13,8 +13,9 @@ from app.config import get_settings
 from app.schemas.auth import TokenResponse
 from app.database import get_db
 from app.models.user_token import UserToken
+from app.services.request_timing import TimedRoute, span
 
-router = APIRouter(prefix="/api/auth", tags=["auth"])
+router = APIRouter(prefix="/api/auth", tags=["auth"], route_class=TimedRoute)
 settings = get_settings()
 
 # In-memory state storage (use Redis in production)
@@ -64,17 +65,18 @@ async def callback(
     
     # Exchange code for tokens
     async with httpx.AsyncClient() as client:
-        response = await client.post(
-            settings.spotify_token_url,
-            data={
-                "grant_type": "authorization_code",
-                "code": code,
-                "redirect_uri": settings.spotify_redirect_uri,
-                "client_id": settings.spotify_client_id,
-                "client_secret": settings.spotify_client_secret,
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
+        with span("spotify"):
+            response = await client.post(
+                settings.spotify_token_url,
+                data={
+                    "grant_type": "authorization_code",
+                    "code": code,
+                    "redirect_uri": settings.spotify_redirect_uri,
+                    "client_id": settings.spotify_client_id,
+                    "client_secret": settings.spotify_client_secret,
+                },
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+            )
         
         if response.status_code != 200:
             raise HTTPException(
@@ -86,10 +88,11 @@ async def callback(
     
     # Get user profile to store with tokens
     async with httpx.AsyncClient() as client:
-        profile_response = await client.get(
-            f"{settings.spotify_api_base_url}/me",
-            headers={"Authorization": f"Bearer {tokens['access_token']}"},
-        )
+        with span("spotify"):
+            profile_response = await client.get(
+                f"{settings.spotify_api_base_url}/me",
+                headers={"Authorization": f"Bearer {tokens['access_token']}"},
+            )
         
         user_profile = profile_response.json() if profile_response.status_code == 200 else {}
     
@@ -139,16 +142,17 @@ async def callback(
 async def refresh_token(refresh_token: str):
     """Refresh access token using refresh token."""
     async with httpx.AsyncClient() as client:
-        response = await client.post(
-            settings.spotify_token_url,
-            data={
-                "grant_type": "refresh_token",
-                "refresh_token": refresh_token,
-                "client_id": settings.spotify_client_id,
-                "client_secret": settings.spotify_client_secret,
-            },
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
-        )
+        with span("spotify"):
+            response = await client.post(
+                settings.spotify_token_url,
+                data={
+                    "grant_type": "refresh_token",
+                    "refresh_token": refresh_token,
+                    "client_id": settings.spotify_client_id,
+                    "client_secret": settings.spotify_client_secret,
+                },
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+            )
         
         if response.status_code != 200:
             raise HTTPException(
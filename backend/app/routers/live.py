@@ -0,0 +1,82 @@
+"""Live router: server-sent events with what users are playing."""
+
+from typing import Optional
+
+import httpx
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from app.config import get_settings
+from app.database import read_session_maker
+from app.models.user_token import UserToken
+from app.services.live_feed import FeedFull, format_event, live_feed
+from app.services.request_timing import TimedRoute
+from app.services.spotify_service import SpotifyService
+
+router = APIRouter(prefix="/api/live", tags=["live"], route_class=TimedRoute)
+settings = get_settings()
+
+
+async def get_stream_user_id(
+    access_token: Optional[str] = Query(None),
+    authorization: Optional[str] = Header(None),
+) -> str:
+    """
+    Get the user of a stream's access token.
+    
+    EventSource can't send headers, so the token may also come as
+    ?access_token=. A token stored for a tracked user needs no Spotify call.
+    """
+    token = access_token
+    if token is None and authorization and authorization.startswith("Bearer "):
+        token = authorization[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing access token")
+    
+    async with read_session_maker() as db:
+        result = await db.execute(select(UserToken.user_id).where(UserToken.access_token == token))
+        user_id = result.scalars().first()
+    if user_id is not None:
+        return user_id
+    
+    try:
+        user = await SpotifyService(token).get_current_user()
+        return user.id
+    except httpx.HTTPStatusError:
+        raise HTTPException(status_code=401, detail="Invalid access token")
+
+
+@router.get("/stream")
+async def stream(user_id: str = Depends(get_stream_user_id)):
+    """
+    Stream the user's live status as server-sent events.
+    
+    A ``status`` event with now_playing and last_play is sent on connect
+    and whenever the scheduler sees a change; changes in between are
+    coalesced into the latest status. Idle streams get keepalive comments.
+    """
+    try:
+        live_feed.check_room(user_id)
+    except FeedFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    async def events():
+        try:
+            async with read_session_maker() as db:
+                subscription = await live_feed.subscribe(db, user_id)
+        except FeedFull:
+            return
+        
+        try:
+            while True:
+                status = await subscription.next(settings.live_keepalive_seconds)
+                yield format_event(status) if status is not None else ": keepalive\n\n"
+        finally:
+            subscription.close()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -4,6 +4,7 @@ from typing import Literal
 from fastapi import APIRouter, HTTPException, Header
 import httpx
 
+from app.services.request_timing import TimedRoute
 from app.services.spotify_service import SpotifyService
 from app.schemas.spotify import (
     SpotifyUser,
@@ -13,7 +14,7 @@ from app.schemas.spotify import (
     RecentlyPlayedResponse,
 )
 
-router = APIRouter(prefix="/api/spotify", tags=["spotify"])
+router = APIRouter(prefix="/api/spotify", tags=["spotify"], route_class=TimedRoute)
 
 TimeRange = Literal["short_term", "medium_term", "long_term"]
 
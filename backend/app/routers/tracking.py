@@ -1,23 +1,29 @@
 """Tracking router for custom listening statistics."""
 
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Header
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Header, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 import httpx
 
-from app.database import get_db
+from app.database import user_session_maker
 from app.services.tracking_service import TrackingService
+from app.services.import_service import import_stream
+from app.services.request_timing import TimedRoute
 from app.services.spotify_service import SpotifyService
 from app.schemas.tracking import (
     RecordPlayRequest,
     RecordPlayResponse,
+    RecordPlayBatchRequest,
+    RecordPlayBatchResponse,
     TrackingStats,
     TrackingHistory,
     AdvancedAnalytics,
     MonthlyComparison,
+    ForgottenFavorite,
+    ImportSummary,
 )
 
-router = APIRouter(prefix="/api/tracking", tags=["tracking"])
+router = APIRouter(prefix="/api/tracking", tags=["tracking"], route_class=TimedRoute)
 
 
 async def get_user_id(authorization: str = Header(...)) -> str:
@@ -35,31 +41,76 @@ async def get_user_id(authorization: str = Header(...)) -> str:
         raise HTTPException(status_code=401, detail="Invalid access token")
 
 
+async def get_user_db(user_id: str = Depends(get_user_id)) -> AsyncSession:
+    """Dependency to get a write session on the database holding the user's data."""
+    async with user_session_maker(user_id)() as session:
+        yield session
+
+
+async def get_user_read_db(user_id: str = Depends(get_user_id)) -> AsyncSession:
+    """Dependency to get a read-only session, so reads don't queue behind writes."""
+    async with user_session_maker(user_id, read_only=True)() as session:
+        yield session
+
+
 @router.post("/record", response_model=RecordPlayResponse)
 async def record_play(
     request: RecordPlayRequest,
     user_id: str = Depends(get_user_id),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_user_db),
 ):
     """Record a play session."""
     service = TrackingService(db, user_id)
     return await service.record_play(request)
 
 
+@router.post("/record/batch", response_model=RecordPlayBatchResponse)
+async def record_plays(
+    request: RecordPlayBatchRequest,
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_user_db),
+):
+    """Record plays queued by a client (up to 1000 per request)."""
+    service = TrackingService(db, user_id)
+    return await service.record_plays(request.plays)
+
+
+@router.post("/import", response_model=ImportSummary)
+async def import_history(
+    request: Request,
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_user_db),
+):
+    """
+    Import a Spotify extended streaming history file.
+    
+    The request body is the raw content of one Streaming_History_Audio_*.json
+    file. It is parsed while it is being received, so files of any size can
+    be uploaded.
+    """
+    try:
+        return await import_stream(db, user_id, request.stream())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/stats", response_model=TrackingStats)
 async def get_stats(
     days: int = 30,
+    approx: bool = False,
     user_id: str = Depends(get_user_id),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_user_read_db),
 ):
     """
     Get tracking statistics.
     
     Args:
         days: Number of days to include (0 = all time)
+        approx: Answer from per-day sketches (whole UTC days, estimated
+            unique counts and top lists)
     """
     service = TrackingService(db, user_id)
-    return await service.get_stats(days=days)
+    return await service.get_stats(days=days, approx=approx)
 
 
 @router.get("/history", response_model=TrackingHistory)
@@ -67,8 +118,10 @@ async def get_history(
     days: int = 30,
     limit: int = 100,
     offset: int = 0,
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None,
     user_id: str = Depends(get_user_id),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_user_read_db),
 ):
     """
     Get listening history from tracking database.
@@ -76,17 +129,30 @@ async def get_history(
     Args:
         days: Number of days to include (0 = all time)
         limit: Maximum number of items to return
-        offset: Offset for pagination
+        offset: Offset for pagination (ignored when cursor is given)
+        cursor: next_cursor from the previous page
+        include_total: Whether to count all matching items (default: only
+            without a cursor)
     """
     service = TrackingService(db, user_id)
-    return await service.get_history(days=days, limit=limit, offset=offset)
+    try:
+        return await service.get_history(
+            days=days,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            include_total=include_total,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/analytics", response_model=AdvancedAnalytics)
 async def get_analytics(
     days: int = 30,
+    approx: bool = False,
     user_id: str = Depends(get_user_id),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_user_read_db),
 ):
     """
     Get advanced listening analytics.
@@ -102,16 +168,18 @@ async def get_analytics(
     
     Args:
         days: Number of days to analyze (0 = all time)
+        approx: Answer from per-day sketches (whole UTC days, estimated
+            unique counts)
     """
-    service = TrackingService(db, user_id)
-    return await service.get_advanced_analytics(days=days)
+    service = TrackingService(db, user_id, session_factory=user_session_maker(user_id, read_only=True))
+    return await service.get_advanced_analytics(days=days, approx=approx)
 
 
 @router.get("/monthly", response_model=List[MonthlyComparison])
 async def get_monthly_comparison(
     months: int = 6,
     user_id: str = Depends(get_user_id),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_user_read_db),
 ):
     """
     Get month-over-month comparison.
@@ -126,3 +194,27 @@ async def get_monthly_comparison(
     """
     service = TrackingService(db, user_id)
     return await service.get_monthly_comparison(months=months)
+
+
+@router.get("/forgotten", response_model=List[ForgottenFavorite])
+async def get_forgotten_favorites(
+    entity_type: Literal["track", "artist", "album"] = "artist",
+    inactive_days: int = 90,
+    limit: int = 10,
+    user_id: str = Depends(get_user_id),
+    db: AsyncSession = Depends(get_user_read_db),
+):
+    """
+    Get forgotten favorites - most played items not heard recently.
+    
+    Args:
+        entity_type: What to look for (track, artist or album)
+        inactive_days: Minimum number of days since the last play
+        limit: Maximum number of items to return
+    """
+    service = TrackingService(db, user_id)
+    return await service.get_forgotten_favorites(
+        entity_type=entity_type,
+        inactive_days=inactive_days,
+        limit=limit,
+    )
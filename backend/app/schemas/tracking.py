@@ -1,6 +1,6 @@
 """Tracking schemas for custom statistics."""
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict
 from datetime import datetime
 
@@ -21,6 +21,31 @@ class RecordPlayResponse(BaseModel):
     recorded: bool = True
 
 
+class RecordPlayBatchItem(RecordPlayRequest):
+    """Play queued by a client, with the time it was played."""
+    played_at: datetime
+
+
+class RecordPlayBatchRequest(BaseModel):
+    """Request to record several queued plays."""
+    plays: List[RecordPlayBatchItem] = Field(..., min_length=1, max_length=1000)
+
+
+class RecordPlayBatchResponse(BaseModel):
+    """Response after recording a batch, with one result per play in request order."""
+    results: List[RecordPlayResponse]
+    recorded: int
+    duplicates: int
+
+
+class ImportSummary(BaseModel):
+    """Progress and outcome of a streaming history import."""
+    parsed: int = 0  # Entries read from the export
+    imported: int = 0  # New plays stored
+    duplicates: int = 0  # Plays already recorded
+    skipped: int = 0  # Podcasts, short or incomplete entries
+
+
 class TrackPlayCount(BaseModel):
     """Track with play count."""
     track_id: str
@@ -29,6 +54,7 @@ class TrackPlayCount(BaseModel):
     album_name: str
     play_count: int
     total_time_ms: int
+    first_played_at: Optional[datetime] = None  # First listen ever
 
 
 class ArtistPlayCount(BaseModel):
@@ -36,6 +62,7 @@ class ArtistPlayCount(BaseModel):
     artist_name: str
     play_count: int
     total_time_ms: int
+    first_played_at: Optional[datetime] = None  # First listen ever
 
 
 class AlbumPlayCount(BaseModel):
@@ -60,6 +87,7 @@ class TrackingStats(BaseModel):
     top_tracks: List[TrackPlayCount]
     top_artists: List[ArtistPlayCount]
     top_albums: List[AlbumPlayCount]
+    approximate: bool = False  # True when answered from sketches (?approx=true)
 
 
 class ListeningSessionResponse(BaseModel):
@@ -76,9 +104,10 @@ class ListeningSessionResponse(BaseModel):
 class TrackingHistory(BaseModel):
     """Tracking history response."""
     items: List[ListeningSessionResponse]
-    total: int
+    total: Optional[int] = None  # Only counted when include_total=true
     limit: int
     offset: int
+    next_cursor: Optional[str] = None  # Pass as ?cursor= to get the next page
 
 
 # ===== ADVANCED ANALYTICS SCHEMAS =====
@@ -151,6 +180,18 @@ class AdvancedAnalytics(BaseModel):
     most_played_day: str
     average_track_length_ms: int
     listening_variety_score: float  # 0-100, how diverse is listening
+    approximate: bool = False  # True when answered from sketches (?approx=true)
+
+
+class ForgottenFavorite(BaseModel):
+    """Often played track, artist or album not heard for a while."""
+    entity_type: str  # "track", "artist" or "album"
+    name: str
+    artist_name: Optional[str] = None
+    play_count: int
+    total_time_ms: int
+    first_played_at: datetime
+    last_played_at: datetime
 
 
 class MonthlyComparison(BaseModel):
@@ -0,0 +1,471 @@
+"""
+CPU-bound aggregation of listening history.
+
+The fold functions here work on plain column tuples and return mergeable
+partial results, so a large window can be split into batches and folded in
+a process pool instead of on the event loop. Everything in this module must
+stay picklable.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable, Optional, Sequence
+
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.services.request_timing import span
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Global process pool, created on first use
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+class StatsPartial:
+    """Partial get_stats aggregate.
+
+    Rows: (track_id, track_name, artist_name, album_name, duration_ms, played_at)
+    """
+
+    def __init__(self):
+        self.plays = 0
+        self.time_ms = 0
+        self.first_played_at: Optional[datetime] = None
+        self.tracks: dict[str, list] = {}  # track_id -> [count, time_ms, track_name, artist_name, album_name]
+        self.artists: dict[str, list] = {}  # artist_name -> [count, time_ms]
+        self.albums: dict[str, list] = {}  # album_name -> [count, time_ms, artist_name]
+
+    def merge(self, other: "StatsPartial") -> None:
+        """Merge a partial computed over later rows."""
+        self.plays += other.plays
+        self.time_ms += other.time_ms
+        if other.first_played_at and (not self.first_played_at or other.first_played_at < self.first_played_at):
+            self.first_played_at = other.first_played_at
+
+        for track_id, (count, time_ms, *info) in other.tracks.items():
+            entry = self.tracks.get(track_id)
+            if entry is None:
+                self.tracks[track_id] = [count, time_ms, *info]
+            else:
+                entry[0] += count
+                entry[1] += time_ms
+
+        for artist, (count, time_ms) in other.artists.items():
+            entry = self.artists.setdefault(artist, [0, 0])
+            entry[0] += count
+            entry[1] += time_ms
+
+        for album, (count, time_ms, artist) in other.albums.items():
+            entry = self.albums.setdefault(album, [0, 0, artist])
+            entry[0] += count
+            entry[1] += time_ms
+            entry[2] = artist
+
+
+def fold_stats(rows: Sequence[tuple]) -> StatsPartial:
+    """Aggregate rows for get_stats."""
+    partial = StatsPartial()
+    tracks = partial.tracks
+    artists = partial.artists
+    albums = partial.albums
+    time_ms = 0
+    first_played_at = None
+
+    for track_id, track_name, artist_name, album_name, duration_ms, played_at in rows:
+        time_ms += duration_ms
+        if first_played_at is None or played_at < first_played_at:
+            first_played_at = played_at
+
+        entry = tracks.get(track_id)
+        if entry is None:
+            tracks[track_id] = [1, duration_ms, track_name, artist_name, album_name]
+        else:
+            entry[0] += 1
+            entry[1] += duration_ms
+
+        entry = artists.get(artist_name)
+        if entry is None:
+            artists[artist_name] = [1, duration_ms]
+        else:
+            entry[0] += 1
+            entry[1] += duration_ms
+
+        entry = albums.get(album_name)
+        if entry is None:
+            albums[album_name] = [1, duration_ms, artist_name]
+        else:
+            entry[0] += 1
+            entry[1] += duration_ms
+            entry[2] = artist_name
+
+    partial.plays = len(rows)
+    partial.time_ms = time_ms
+    partial.first_played_at = first_played_at
+    return partial
+
+
+class DayRuns:
+    """
+    Runs of consecutive listening days.
+
+    Days must be added in ascending order. Two instances built over
+    consecutive, ordered batches merge into the runs of the whole range, so
+    streaks can be folded without keeping every date around. Batches whose
+    ranges overlap can't be merged; rebuild the runs with from_days.
+    """
+
+    def __init__(self):
+        self.first: Optional[date] = None
+        self.last: Optional[date] = None
+        self.leading = 0  # run starting at first
+        self.trailing = 0  # run ending at last
+        self.longest = 0
+
+    @classmethod
+    def from_days(cls, days) -> "DayRuns":
+        """Runs over a set of days in any order."""
+        runs = cls()
+        for day in sorted(days):
+            runs.add(day)
+        return runs
+
+    def overlaps(self, other: "DayRuns") -> bool:
+        """Whether other's days don't all come after ours."""
+        return self.last is not None and other.first is not None and other.first <= self.last
+
+    def _is_single_run(self) -> bool:
+        return self.leading == (self.last - self.first).days + 1
+
+    def add(self, day: date) -> None:
+        """Record a listening day (no earlier than the last one added)."""
+        if self.last is None:
+            self.first = self.last = day
+            self.leading = self.trailing = self.longest = 1
+            return
+        if day <= self.last:
+            return
+
+        if day - self.last == timedelta(days=1):
+            if self._is_single_run():
+                self.leading += 1
+            self.trailing += 1
+        else:
+            self.trailing = 1
+        self.last = day
+        self.longest = max(self.longest, self.trailing)
+
+    def merge(self, other: "DayRuns") -> None:
+        """Merge runs computed over a later batch of days."""
+        if other.last is None:
+            return
+        if self.last is None:
+            self.__dict__.update(other.__dict__)
+            return
+
+        gap = (other.first - self.last).days
+        if gap <= 1:
+            # The batches touch: our trailing run continues into theirs
+            joined = self.trailing + other.leading - (1 if gap == 0 else 0)
+            if self._is_single_run():
+                self.leading = joined
+            self.trailing = joined if other._is_single_run() else other.trailing
+            self.longest = max(self.longest, other.longest, joined)
+        else:
+            self.trailing = other.trailing
+            self.longest = max(self.longest, other.longest)
+        self.last = other.last
+
+
+class AnalyticsPartial:
+    """Partial get_advanced_analytics aggregate.
+
+    Rows: (played_at, duration_ms, artist_name), ordered by played_at
+    """
+
+    def __init__(self):
+        self.plays = 0
+        self.time_ms = 0
+        self.daily: dict[str, list] = {}  # YYYY-MM-DD -> [plays, time_ms]
+        self.hourly = [[0, 0] for _ in range(24)]
+        self.weekday = [[0, 0] for _ in range(7)]
+        self.artists: set[str] = set()
+        self.runs = DayRuns()
+
+    @property
+    def first_date(self) -> Optional[date]:
+        return self.runs.first
+
+    def merge(self, other: "AnalyticsPartial") -> None:
+        """
+        Merge a partial computed over other rows.
+
+        Usually those rows are later ones. Live plays imported into an
+        archived month are not, and then the runs are counted again from
+        the listening days.
+        """
+        self.plays += other.plays
+        self.time_ms += other.time_ms
+        overlaps = self.runs.overlaps(other.runs)
+        if not overlaps:
+            self.runs.merge(other.runs)
+
+        for day, (plays, time_ms) in other.daily.items():
+            entry = self.daily.setdefault(day, [0, 0])
+            entry[0] += plays
+            entry[1] += time_ms
+
+        if overlaps:
+            self.runs = DayRuns.from_days(date.fromisoformat(day) for day in self.daily)
+
+        for mine, theirs in zip(self.hourly + self.weekday, other.hourly + other.weekday):
+            mine[0] += theirs[0]
+            mine[1] += theirs[1]
+
+        self.artists |= other.artists
+
+
+def fold_analytics(rows: Sequence[tuple]) -> AnalyticsPartial:
+    """Aggregate rows for get_advanced_analytics."""
+    partial = AnalyticsPartial()
+    daily = partial.daily
+    hourly = partial.hourly
+    weekday = partial.weekday
+    artists = partial.artists
+    runs = partial.runs
+    time_ms = 0
+
+    for played_at, duration_ms, artist_name in rows:
+        time_ms += duration_ms
+
+        day = played_at.strftime("%Y-%m-%d")
+        entry = daily.get(day)
+        if entry is None:
+            daily[day] = [1, duration_ms]
+            runs.add(played_at.date())
+        else:
+            entry[0] += 1
+            entry[1] += duration_ms
+
+        entry = hourly[played_at.hour]
+        entry[0] += 1
+        entry[1] += duration_ms
+
+        entry = weekday[played_at.weekday()]
+        entry[0] += 1
+        entry[1] += duration_ms
+
+        artists.add(artist_name)
+
+    partial.plays = len(rows)
+    partial.time_ms = time_ms
+    return partial
+
+
+def fold_analytics_hours(rows: Sequence[tuple]) -> AnalyticsPartial:
+    """
+    Aggregate pre-grouped rows for get_advanced_analytics.
+
+    Rows: (hour, plays, time_ms, artist_name), one per artist per hour as
+    grouped by the database (date_trunc), ordered by hour. Gives the same
+    partial as fold_analytics over the underlying plays.
+    """
+    partial = AnalyticsPartial()
+    daily = partial.daily
+    hourly = partial.hourly
+    weekday = partial.weekday
+    artists = partial.artists
+    runs = partial.runs
+    total_plays = 0
+    time_ms = 0
+
+    for hour, plays, hour_ms, artist_name in rows:
+        total_plays += plays
+        time_ms += hour_ms
+
+        day = hour.strftime("%Y-%m-%d")
+        entry = daily.get(day)
+        if entry is None:
+            daily[day] = [plays, hour_ms]
+            runs.add(hour.date())
+        else:
+            entry[0] += plays
+            entry[1] += hour_ms
+
+        entry = hourly[hour.hour]
+        entry[0] += plays
+        entry[1] += hour_ms
+
+        entry = weekday[hour.weekday()]
+        entry[0] += plays
+        entry[1] += hour_ms
+
+        artists.add(artist_name)
+
+    partial.plays = total_plays
+    partial.time_ms = time_ms
+    return partial
+
+
+class MonthPartial:
+    """Partial get_monthly_comparison aggregate for one month.
+
+    Rows: (track_id, track_name, artist_name, duration_ms)
+    """
+
+    def __init__(self):
+        self.plays = 0
+        self.time_ms = 0
+        self.artists: dict[str, int] = {}  # artist_name -> plays
+        self.tracks: dict[str, list] = {}  # track_id -> [plays, track_name]
+
+    def merge(self, other: "MonthPartial") -> None:
+        """Merge another partial."""
+        self.plays += other.plays
+        self.time_ms += other.time_ms
+        for artist, plays in other.artists.items():
+            self.artists[artist] = self.artists.get(artist, 0) + plays
+        for track_id, (plays, name) in other.tracks.items():
+            entry = self.tracks.setdefault(track_id, [0, name])
+            entry[0] += plays
+
+
+def fold_month(rows: Sequence[tuple]) -> MonthPartial:
+    """Aggregate one month of rows for get_monthly_comparison."""
+    partial = MonthPartial()
+    artists = partial.artists
+    tracks = partial.tracks
+    time_ms = 0
+
+    for track_id, track_name, artist_name, duration_ms in rows:
+        time_ms += duration_ms
+        artists[artist_name] = artists.get(artist_name, 0) + 1
+        entry = tracks.get(track_id)
+        if entry is None:
+            tracks[track_id] = [1, track_name]
+        else:
+            entry[0] += 1
+
+    partial.plays = len(rows)
+    partial.time_ms = time_ms
+    return partial
+
+
+class MonthlyPartial:
+    """Partial get_monthly_comparison aggregate, one MonthPartial per month.
+
+    Rows: (track_id, track_name, artist_name, duration_ms, played_at)
+    """
+
+    def __init__(self):
+        self.months: dict[str, MonthPartial] = {}  # YYYY-MM -> partial
+
+    def merge(self, other: "MonthlyPartial") -> None:
+        """Merge another partial."""
+        for month, partial in other.months.items():
+            self.months.setdefault(month, MonthPartial()).merge(partial)
+
+
+def fold_months(rows: Sequence[tuple]) -> MonthlyPartial:
+    """Aggregate rows spanning several months for get_monthly_comparison."""
+    grouped: dict[str, list[tuple]] = {}
+    for track_id, track_name, artist_name, duration_ms, played_at in rows:
+        grouped.setdefault(played_at.strftime("%Y-%m"), []).append(
+            (track_id, track_name, artist_name, duration_ms)
+        )
+
+    partial = MonthlyPartial()
+    partial.months = {month: fold_month(month_rows) for month, month_rows in grouped.items()}
+    return partial
+
+
+def get_executor() -> Optional[ProcessPoolExecutor]:
+    """Get the shared process pool, or None if offloading is disabled."""
+    global _executor
+
+    if settings.analytics_process_workers <= 0:
+        return None
+
+    if _executor is None:
+        # spawn behaves the same on every platform and doesn't copy the
+        # event loop's threads into the workers
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.analytics_process_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        logger.info(f"Started analytics process pool ({settings.analytics_process_workers} workers)")
+
+    return _executor
+
+
+def shutdown_executor() -> None:
+    """Shut down the process pool if it was started."""
+    global _executor
+
+    if _executor:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_fold(fold: Callable[[Sequence[tuple]], object], rows: Sequence):
+    """
+    Run a fold function over rows.
+
+    Small inputs are folded inline. Above ``analytics_offload_threshold``
+    rows, the input is cut into one batch per worker (at most
+    ``analytics_batch_size`` rows each) that are folded in parallel in the
+    process pool and merged here, which keeps the event loop free for
+    other requests.
+    """
+    with span("aggregate"):
+        return await _run_fold(fold, rows)
+
+
+async def _run_fold(fold: Callable[[Sequence[tuple]], object], rows: Sequence):
+    executor = get_executor()
+    if executor is None or len(rows) < settings.analytics_offload_threshold:
+        return fold(rows)
+
+    loop = asyncio.get_running_loop()
+    # A streamed chunk is one input, so split it for every worker to get a part
+    per_worker = -(-len(rows) // max(settings.analytics_process_workers, 1))
+    batch_size = max(min(settings.analytics_batch_size, per_worker), 1)
+    batches = [
+        [tuple(row) for row in rows[i:i + batch_size]]
+        for i in range(0, len(rows), batch_size)
+    ]
+    partials = await asyncio.gather(
+        *(loop.run_in_executor(executor, fold, batch) for batch in batches)
+    )
+
+    result = partials[0]
+    for partial in partials[1:]:
+        result.merge(partial)
+    return result
+
+
+async def stream_fold(db: AsyncSession, query: Select, fold: Callable[[Sequence[tuple]], object]):
+    """
+    Fold a query's rows chunk by chunk.
+
+    Rows are streamed from the database in chunks of
+    ``analytics_batch_size`` and each chunk is folded (offloaded when large
+    enough) and merged in order before the next one is read, so memory is
+    bounded by the chunk size rather than the window.
+    """
+    batch_size = max(settings.analytics_batch_size, 1)
+    result = await db.stream(query.execution_options(yield_per=batch_size))
+
+    partial = fold([])
+    chunks = result.partitions()
+    while True:
+        with span("sql"):
+            chunk = await anext(chunks, None)
+        if chunk is None:
+            return partial
+        partial.merge(await run_fold(fold, chunk))
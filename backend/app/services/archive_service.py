@@ -0,0 +1,299 @@
+"""
+Archive tier for old listening sessions.
+
+Plays older than ``archive_after_days`` (rounded down to whole months) are
+moved out of listening_sessions into per-user, per-month segment files
+(see app.services.segments). This keeps the live table and its indexes
+small, while the aggregations read archived months next to the live rows.
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional, Sequence
+
+from sqlalchemy import Table, select, delete, and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import data_session_makers
+from app.services.partitions import PARTITION_PREFIX, drop_partition, month_key, session_tables
+from app.services.segments import COLUMNS, Segment, write_segment
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+SEGMENT_SUFFIX = ".seg"
+MAX_OPEN_SEGMENTS = 64
+DELETE_BATCH_SIZE = 500
+
+
+class ArchivedPlay(NamedTuple):
+    """An archived play, with the ListeningSession columns."""
+    id: int
+    user_id: str
+    track_id: str
+    track_name: str
+    artist_name: str
+    album_name: str
+    duration_ms: int
+    played_at: datetime
+    played_bucket: Optional[int]
+
+
+def _month(value: datetime) -> str:
+    return value.strftime("%Y-%m")
+
+
+def _next_month(month_start: datetime) -> datetime:
+    return (month_start + timedelta(days=32)).replace(day=1)
+
+
+class ArchiveStore:
+    """Segment files under a root directory, one folder per user."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._open: OrderedDict[Path, tuple[int, Segment]] = OrderedDict()
+        # Segments being rewritten, which must not be mapped
+        self._writing: set[Path] = set()
+
+    def _user_dir(self, user_id: str) -> Path:
+        # Hex keeps any user id filesystem-safe
+        return self.root / user_id.encode().hex()
+
+    def _path(self, user_id: str, month: str) -> Path:
+        return self._user_dir(user_id) / f"{month}{SEGMENT_SUFFIX}"
+
+    def _evict(self, path: Path) -> None:
+        cached = self._open.pop(path, None)
+        if cached:
+            cached[1].close()
+
+    def users(self) -> list[str]:
+        """Users with archived plays."""
+        if not self.root.is_dir():
+            return []
+        users = []
+        for path in self.root.iterdir():
+            try:
+                users.append(bytes.fromhex(path.name).decode())
+            except ValueError:
+                continue
+        return sorted(users)
+
+    def months(self, user_id: str) -> list[str]:
+        """Archived months (YYYY-MM) of a user, oldest first."""
+        user_dir = self._user_dir(user_id)
+        if not user_dir.is_dir():
+            return []
+        return sorted(path.stem for path in user_dir.glob(f"*{SEGMENT_SUFFIX}"))
+
+    def segment(self, user_id: str, month: str) -> Segment:
+        """Open a segment, reusing the mapping while the file is unchanged."""
+        path = self._path(user_id, month)
+        if path in self._writing:
+            # Read a copy so that no mapping holds the file during the rewrite
+            return Segment(path, mapped=False)
+        mtime = path.stat().st_mtime_ns
+
+        cached = self._open.get(path)
+        if cached and cached[0] == mtime:
+            self._open.move_to_end(path)
+            return cached[1]
+        if cached:
+            cached[1].close()
+
+        segment = Segment(path)
+        self._open[path] = (mtime, segment)
+        if len(self._open) > MAX_OPEN_SEGMENTS:
+            _, (_, oldest) = self._open.popitem(last=False)
+            oldest.close()
+        return segment
+
+    def _months_between(self, user_id: str, start: Optional[datetime], end: Optional[datetime]) -> list[str]:
+        months = self.months(user_id)
+        if start:
+            months = [m for m in months if m >= _month(start)]
+        if end:
+            months = [m for m in months if m <= _month(end - timedelta(microseconds=1))]
+        return months
+
+    def read(
+        self,
+        user_id: str,
+        columns: Sequence[str],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Iterator[list[tuple]]:
+        """Yield rows with start <= played_at < end, one month at a time, oldest first."""
+        for month in self._months_between(user_id, start, end):
+            rows = self.segment(user_id, month).select(columns, start, end)
+            if rows:
+                yield rows
+
+    def plays(self, user_id: str) -> Iterator[list[ArchivedPlay]]:
+        """Yield all archived plays of a user, one month at a time."""
+        for rows in self.read(user_id, COLUMNS):
+            yield [ArchivedPlay(row[0], user_id, *row[1:]) for row in rows]
+
+    def count(self, user_id: str, start: Optional[datetime] = None) -> int:
+        """Number of archived plays since start."""
+        total = 0
+        for month in self._months_between(user_id, start, None):
+            lo, hi = self.segment(user_id, month).bounds(start)
+            total += hi - lo
+        return total
+
+    def latest(
+        self,
+        user_id: str,
+        limit: int,
+        before: Optional[tuple[datetime, int]] = None,
+        start: Optional[datetime] = None,
+    ) -> list[ArchivedPlay]:
+        """Up to ``limit`` newest plays ordered by (played_at, id) descending, below ``before``."""
+        plays: list[ArchivedPlay] = []
+        for month in reversed(self._months_between(user_id, start, None)):
+            if before and month > _month(before[0]):
+                continue
+            rows = self.segment(user_id, month).select(COLUMNS, start)
+            for row in reversed(rows):
+                if before and (row[6], row[0]) >= before:
+                    continue
+                plays.append(ArchivedPlay(row[0], user_id, *row[1:]))
+                if len(plays) >= limit:
+                    return plays
+        return plays
+
+    def add(self, user_id: str, month: str, rows: Sequence[tuple]) -> None:
+        """Add rows (tuples in COLUMNS order) to a month, rewriting its segment."""
+        path = self._path(user_id, month)
+        # The file is replaced below, which fails on Windows while it is mapped
+        self._evict(path)
+        if path.exists():
+            # Runs in a worker thread, so read through a private mapping
+            # rather than the shared cache
+            segment = Segment(path)
+            try:
+                existing = segment.select(COLUMNS)
+            finally:
+                segment.close()
+            # Rows already archived by an interrupted run are not duplicated
+            # (SQLite may reuse the ids of deleted rows, so match more than id)
+            known = {(row[0], row[1], row[6]) for row in existing}
+            rows = existing + [row for row in rows if (row[0], row[1], row[6]) not in known]
+
+        write_segment(path, rows)
+
+    async def add_in_thread(self, user_id: str, month: str, rows: Sequence[tuple]) -> None:
+        """Run add() in a worker thread, keeping readers off the file meanwhile."""
+        path = self._path(user_id, month)
+        self._writing.add(path)
+        try:
+            self._evict(path)
+            await asyncio.to_thread(self.add, user_id, month, rows)
+        finally:
+            self._writing.discard(path)
+
+    def close(self) -> None:
+        for _, segment in self._open.values():
+            segment.close()
+        self._open.clear()
+
+
+# Global store, created on first use
+_archive: Optional[ArchiveStore] = None
+
+
+def get_archive() -> ArchiveStore:
+    """Get the shared archive store."""
+    global _archive
+
+    if _archive is None:
+        _archive = ArchiveStore(Path(settings.archive_dir))
+    return _archive
+
+
+def archive_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Start of the oldest month that stays in the live table."""
+    boundary = (now or datetime.utcnow()) - timedelta(days=settings.archive_after_days)
+    return datetime(boundary.year, boundary.month, 1)
+
+
+async def archive_old_sessions(db: AsyncSession, cutoff: Optional[datetime] = None) -> int:
+    """
+    Move plays older than cutoff into segment files. Returns plays moved.
+
+    Each user-month is written to its segment first and then deleted from
+    the table in its own transaction. A crash in between leaves the rows in
+    both places; the next run merges them instead of duplicating them.
+    Monthly partitions that end before the cutoff are dropped afterwards.
+    """
+    cutoff = cutoff or archive_cutoff()
+    store = get_archive()
+
+    moved = 0
+    for table in await session_tables(db, None, cutoff):
+        moved += await _archive_table(db, store, table, cutoff)
+
+        # A monthly partition entirely before the cutoff is now empty
+        month = table.name[len(PARTITION_PREFIX):]
+        if table.name.startswith(PARTITION_PREFIX) and month < month_key(cutoff):
+            await drop_partition(db, month)
+            await db.commit()
+
+    if moved:
+        logger.info(f"Archived {moved} plays older than {cutoff:%Y-%m-%d}")
+    return moved
+
+
+async def _archive_table(db: AsyncSession, store: ArchiveStore, table: Table, cutoff: datetime) -> int:
+    """Archive one table's plays older than cutoff, one user-month at a time."""
+    result = await db.execute(select(table.c.user_id).where(table.c.played_at < cutoff).distinct())
+    user_ids = result.scalars().all()
+
+    moved = 0
+    for user_id in user_ids:
+        while True:
+            # Oldest month still in the table; only its rows are held in memory
+            oldest = await db.scalar(
+                select(func.min(table.c.played_at)).where(
+                    and_(table.c.user_id == user_id, table.c.played_at < cutoff)
+                )
+            )
+            if oldest is None:
+                break
+            month_start = datetime(oldest.year, oldest.month, 1)
+            month_end = min(_next_month(month_start), cutoff)
+
+            query = select(*(table.c[name] for name in COLUMNS)).where(
+                and_(
+                    table.c.user_id == user_id,
+                    table.c.played_at >= month_start,
+                    table.c.played_at < month_end,
+                )
+            ).order_by(table.c.played_at)
+            rows = [tuple(row) for row in (await db.execute(query)).all()]
+
+            await store.add_in_thread(user_id, _month(month_start), rows)
+
+            ids = [row[0] for row in rows]
+            for i in range(0, len(ids), DELETE_BATCH_SIZE):
+                await db.execute(delete(table).where(table.c.id.in_(ids[i:i + DELETE_BATCH_SIZE])))
+            await db.commit()
+            moved += len(rows)
+
+    return moved
+
+
+async def run_archival() -> None:
+    """Scheduled job: archive plays past the configured age."""
+    if settings.archive_after_days <= 0:
+        return
+
+    for session_maker in data_session_makers():
+        async with session_maker() as db:
+            await archive_old_sessions(db)
@@ -0,0 +1,130 @@
+"""
+Online backups of the SQLite databases.
+
+Snapshots are taken with SQLite's backup API on a separate connection,
+``backup_step_pages`` pages per step, pausing ``backup_step_pause_ms``
+between steps. The source is only locked during a step, so the tracker
+and API keep writing while a backup runs (a write from another
+connection makes SQLite restart the copy, which small steps keep
+cheap). The copy runs in a worker thread and is then gzipped; only
+the newest ``backup_keep`` snapshots of each database are kept.
+
+Archived segment files are plain immutable files and are not included.
+"""
+
+import asyncio
+import gzip
+import logging
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from app.config import get_settings
+from app.services.maintenance import database_path, sqlite_engines
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+SNAPSHOT_SUFFIX = ".db.gz"
+
+
+class BackupResult(NamedTuple):
+    """Outcome of one database backup."""
+    database: str
+    snapshot: str
+    pages: int
+    duration_s: float
+    pages_per_second: float
+    size_bytes: int
+
+
+# Results of the last scheduled run, reported by /health/db
+last_backups: list[BackupResult] = []
+
+
+def backup_database(
+    source: Path,
+    dest_dir: Path,
+    keep: int,
+    step_pages: int,
+    pause_s: float = 0.0,
+    now: Optional[datetime] = None,
+) -> BackupResult:
+    """Copy a live database into a compressed, rotated snapshot."""
+    started = time.monotonic()
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    stamp = (now or datetime.utcnow()).strftime("%Y%m%d-%H%M%S")
+    copy_path = dest_dir / f"{source.stem}-{stamp}.db.tmp"
+    snapshot = dest_dir / f"{source.stem}-{stamp}{SNAPSHOT_SUFFIX}"
+
+    pages = 0
+
+    def progress(status, remaining, total):
+        nonlocal pages
+        pages = total
+        # Called after each step, once the source lock is released
+        if remaining and pause_s > 0:
+            time.sleep(pause_s)
+
+    src = sqlite3.connect(source, timeout=settings.sqlite_busy_timeout_ms / 1000)
+    dst = sqlite3.connect(copy_path)
+    try:
+        # sleep is the wait before retrying a step that found the source busy
+        src.backup(dst, pages=step_pages, progress=progress, sleep=max(pause_s, 0.05))
+    finally:
+        dst.close()
+        src.close()
+
+    try:
+        with open(copy_path, "rb") as raw, gzip.open(snapshot, "wb", compresslevel=6) as compressed:
+            shutil.copyfileobj(raw, compressed, 1024 * 1024)
+    finally:
+        copy_path.unlink(missing_ok=True)
+
+    # Stamps sort chronologically, so the oldest snapshots come first
+    snapshots = sorted(dest_dir.glob(f"{source.stem}-*{SNAPSHOT_SUFFIX}"))
+    for old in snapshots[:-keep] if keep > 0 else []:
+        old.unlink()
+
+    duration = time.monotonic() - started
+    return BackupResult(
+        database=str(source),
+        snapshot=str(snapshot),
+        pages=pages,
+        duration_s=round(duration, 3),
+        pages_per_second=round(pages / duration, 1) if duration > 0 else float(pages),
+        size_bytes=snapshot.stat().st_size,
+    )
+
+
+async def run_backups() -> list[BackupResult]:
+    """Scheduled job: back up every file-backed SQLite database."""
+    results = []
+    for engine in sqlite_engines():
+        path = database_path(engine)
+        if path is None or not path.exists():
+            continue
+        try:
+            result = await asyncio.to_thread(
+                backup_database,
+                path,
+                Path(settings.backup_dir),
+                settings.backup_keep,
+                settings.backup_step_pages,
+                settings.backup_step_pause_ms / 1000,
+            )
+        except Exception as e:
+            logger.error(f"Backup of {path} failed: {e}")
+            continue
+
+        logger.info(
+            f"Backed up {path} to {result.snapshot}: {result.pages} pages in "
+            f"{result.duration_s:.2f}s ({result.pages_per_second:.0f} pages/s)"
+        )
+        results.append(result)
+
+    last_backups[:] = results
+    return results
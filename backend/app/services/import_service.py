@@ -0,0 +1,245 @@
+"""Import of Spotify extended streaming history exports."""
+
+import codecs
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterable, BinaryIO, Callable, Iterable, NamedTuple, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.schemas.tracking import ImportSummary
+from app.services.tracking_service import find_duplicate_plays, insert_new_plays, update_rollups
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Spotify only counts a stream after 30 seconds
+MIN_MS_PLAYED = 30000
+
+READ_CHUNK_SIZE = 1 << 20
+
+
+class ImportedPlay(NamedTuple):
+    """A play parsed from an export, with the ListeningSession columns."""
+    user_id: str
+    track_id: str
+    track_name: str
+    artist_name: str
+    album_name: str
+    duration_ms: int
+    played_at: datetime
+
+
+class JsonArrayParser:
+    """
+    Incremental parser for a top-level JSON array.
+
+    Bytes are fed in arbitrary chunks and complete array elements are
+    returned as soon as they have been read, so a file of any size is parsed
+    with memory bounded by the chunk size.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._started = False
+        self._finished = False
+
+    def feed(self, data: bytes) -> list:
+        """Feed the next chunk of bytes and return the elements it completed."""
+        self._buffer += self._utf8.decode(data)
+        return self._drain()
+
+    def close(self) -> list:
+        """Finish parsing; raises ValueError if the input was not a complete array."""
+        self._buffer += self._utf8.decode(b"", final=True)
+        items = self._drain()
+        if not self._finished or self._buffer.strip():
+            raise ValueError("Expected a complete JSON array")
+        return items
+
+    def _drain(self) -> list:
+        buffer = self._buffer
+        pos = 0
+        items = []
+
+        if not self._started:
+            pos = _skip_whitespace(buffer, pos)
+            if pos == len(buffer):
+                self._buffer = ""
+                return items
+            if buffer[pos] != "[":
+                raise ValueError("Expected a JSON array")
+            self._started = True
+            pos += 1
+
+        while not self._finished:
+            pos = _skip_whitespace(buffer, pos, ",")
+            if pos == len(buffer):
+                break
+            if buffer[pos] == "]":
+                self._finished = True
+                pos += 1
+                break
+            try:
+                item, end = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The element continues in the next chunk
+                break
+            items.append(item)
+            pos = end
+
+        self._buffer = buffer[pos:]
+        return items
+
+
+def _skip_whitespace(buffer: str, pos: int, extra: str = "") -> int:
+    while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] in extra):
+        pos += 1
+    return pos
+
+
+def iter_export_file(file: BinaryIO) -> Iterable[dict]:
+    """Yield the entries of an export file opened in binary mode."""
+    parser = JsonArrayParser()
+    while chunk := file.read(READ_CHUNK_SIZE):
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+async def aiter_export_stream(chunks: AsyncIterable[bytes]) -> AsyncIterable[dict]:
+    """Yield the entries of an export received as a stream of byte chunks."""
+    parser = JsonArrayParser()
+    async for chunk in chunks:
+        for entry in parser.feed(chunk):
+            yield entry
+    for entry in parser.close():
+        yield entry
+
+
+def parse_entry(entry: dict, user_id: str) -> Optional[ImportedPlay]:
+    """
+    Map an extended streaming history entry to a play.
+
+    Returns None for entries that aren't track plays (podcasts, audiobooks)
+    or that were skipped before counting as a stream. ``ts`` is when the
+    playback ended, so the play started ``ms_played`` earlier.
+    """
+    if not isinstance(entry, dict):
+        return None
+
+    uri = entry.get("spotify_track_uri")
+    ms_played = entry.get("ms_played") or 0
+    if not uri or not entry.get("ts") or ms_played < MIN_MS_PLAYED:
+        return None
+
+    try:
+        ended_at = datetime.fromisoformat(entry["ts"].replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+    return ImportedPlay(
+        user_id=user_id,
+        track_id=uri.rsplit(":", 1)[-1],
+        track_name=entry.get("master_metadata_track_name") or "Unknown",
+        artist_name=entry.get("master_metadata_album_artist_name") or "Unknown",
+        album_name=entry.get("master_metadata_album_album_name") or "Unknown",
+        duration_ms=ms_played,
+        played_at=ended_at - timedelta(milliseconds=ms_played),
+    )
+
+
+class HistoryImporter:
+    """
+    Bulk import of parsed export entries for one user.
+
+    Plays are buffered and written in batches of ``import_batch_size``, one
+    transaction per batch. A play is a duplicate if the same track was
+    already recorded within three minutes, the rule the live trackers use,
+    so importing the same file twice or overlapping with tracked history
+    adds nothing.
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        user_id: str,
+        on_progress: Optional[Callable[[ImportSummary], None]] = None,
+    ):
+        self.db = db
+        self.user_id = user_id
+        self.on_progress = on_progress
+        self.summary = ImportSummary()
+        self._pending: list[ImportedPlay] = []
+
+    async def add(self, entry: dict) -> None:
+        """Add one export entry, writing a batch when enough are buffered."""
+        self.summary.parsed += 1
+        play = parse_entry(entry, self.user_id)
+        if play is None:
+            self.summary.skipped += 1
+            return
+
+        self._pending.append(play)
+        if len(self._pending) >= settings.import_batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write buffered plays."""
+        if not self._pending:
+            return
+
+        plays = await self._drop_duplicates(self._pending)
+        self._pending = []
+
+        ids = await insert_new_plays(self.db, plays)
+        plays = [play for play, id_ in zip(plays, ids) if id_ is not None]
+        if plays:
+            await update_rollups(self.db, plays)
+            await self.db.commit()
+
+        self.summary.duplicates += len(ids) - len(plays)
+        self.summary.imported += len(plays)
+        logger.info(
+            f"Import for user {self.user_id}: {self.summary.parsed} entries read, "
+            f"{self.summary.imported} imported, {self.summary.duplicates} duplicates"
+        )
+        if self.on_progress:
+            self.on_progress(self.summary)
+
+    async def _drop_duplicates(self, plays: list[ImportedPlay]) -> list[ImportedPlay]:
+        """Remove plays that repeat a stored or earlier play of the same track."""
+        duplicates = await find_duplicate_plays(self.db, self.user_id, plays)
+        self.summary.duplicates += sum(duplicates)
+        return [play for play, duplicate in zip(plays, duplicates) if not duplicate]
+
+
+async def import_file(
+    db: AsyncSession,
+    user_id: str,
+    file: BinaryIO,
+    on_progress: Optional[Callable[[ImportSummary], None]] = None,
+) -> ImportSummary:
+    """Import one export file opened in binary mode."""
+    importer = HistoryImporter(db, user_id, on_progress)
+    for entry in iter_export_file(file):
+        await importer.add(entry)
+    await importer.flush()
+    return importer.summary
+
+
+async def import_stream(
+    db: AsyncSession,
+    user_id: str,
+    chunks: AsyncIterable[bytes],
+    on_progress: Optional[Callable[[ImportSummary], None]] = None,
+) -> ImportSummary:
+    """Import one export received as a stream of byte chunks."""
+    importer = HistoryImporter(db, user_id, on_progress)
+    async for entry in aiter_export_stream(chunks):
+        await importer.add(entry)
+    await importer.flush()
+    return importer.summary
@@ -0,0 +1,157 @@
+"""
+Leader election through a lease row.
+
+Every process (e.g. each ``uvicorn --workers`` worker) tries to take the
+lease in the main database every ``leader_heartbeat_seconds``. Each step
+is one conditional statement: the holder renews its unexpired lease,
+anyone may take over an expired one, and the first process creates it.
+So at most one process holds an unexpired lease. If the leader dies,
+another worker takes over at its next heartbeat after
+``leader_lease_seconds``; a leader shutting down cleanly releases the
+lease so the takeover is immediate. A leader that could not renew in time
+finds out at its next heartbeat and stops its jobs. Expiry uses the
+workers' clocks, which must roughly agree. Heartbeats run on an unpooled
+engine, so a job holding the write connection cannot delay a renewal
+past the lease.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import get_settings
+from app.database import dialect_insert
+from app.models.scheduler_lease import SchedulerLease
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Lease of the scheduler jobs
+SCHEDULER_LEASE = "scheduler"
+
+# Identifies this process as a lease holder
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def try_acquire(
+    db: AsyncSession,
+    name: str,
+    holder: str,
+    lease_seconds: int,
+    now: Optional[datetime] = None,
+) -> bool:
+    """Take or renew a lease. Returns whether ``holder`` now holds it."""
+    now = now or datetime.utcnow()
+    expires_at = now + timedelta(seconds=lease_seconds)
+    table = SchedulerLease.__table__
+
+    # Renew our own lease, else take over an expired one, else create it
+    result = await db.execute(
+        update(table)
+        .where(table.c.name == name, table.c.holder == holder, table.c.expires_at > now)
+        .values(expires_at=expires_at)
+    )
+    if result.rowcount == 0:
+        result = await db.execute(
+            update(table)
+            .where(table.c.name == name, table.c.expires_at <= now)
+            .values(holder=holder, expires_at=expires_at, acquired_at=now)
+        )
+    if result.rowcount == 0:
+        result = await db.execute(
+            dialect_insert(db, table)
+            .values(name=name, holder=holder, expires_at=expires_at, acquired_at=now)
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def release(db: AsyncSession, name: str, holder: str) -> None:
+    """Give up a lease so another process can take it right away."""
+    table = SchedulerLease.__table__
+    await db.execute(
+        update(table)
+        .where(table.c.name == name, table.c.holder == holder)
+        .values(expires_at=datetime(1970, 1, 1))
+    )
+    await db.commit()
+
+
+class LeaderElection:
+    """Keeps trying to hold a lease and reports gaining and losing it."""
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker,
+        on_elected: Callable[[], None],
+        on_deposed: Callable[[], None],
+        name: str = SCHEDULER_LEASE,
+        holder: str = WORKER_ID,
+        lease_seconds: Optional[int] = None,
+        heartbeat_seconds: Optional[float] = None,
+    ):
+        self.session_maker = session_maker
+        self.on_elected = on_elected
+        self.on_deposed = on_deposed
+        self.name = name
+        self.holder = holder
+        self.lease_seconds = lease_seconds or settings.leader_lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds or settings.leader_heartbeat_seconds
+        self.leading = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop campaigning and release the lease if held."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.leading:
+            self._set_leading(False)
+            try:
+                async with self.session_maker() as db:
+                    await release(db, self.name, self.holder)
+            except Exception as e:
+                logger.error(f"Failed to release the {self.name} lease: {e}")
+
+    async def heartbeat(self) -> bool:
+        """Try to take or renew the lease once."""
+        try:
+            async with self.session_maker() as db:
+                leading = await try_acquire(db, self.name, self.holder, self.lease_seconds)
+        except Exception as e:
+            # Without a renewed lease another worker may take over
+            logger.error(f"Lease heartbeat failed: {e}")
+            leading = False
+        self._set_leading(leading)
+        return leading
+
+    def _set_leading(self, leading: bool) -> None:
+        if leading == self.leading:
+            return
+        self.leading = leading
+        if leading:
+            logger.info(f"{self.holder} took the {self.name} lease")
+            self.on_elected()
+        else:
+            logger.info(f"{self.holder} lost the {self.name} lease")
+            self.on_deposed()
+
+    async def _run(self) -> None:
+        while True:
+            await self.heartbeat()
+            await asyncio.sleep(self.heartbeat_seconds)
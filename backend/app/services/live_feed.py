@@ -0,0 +1,256 @@
+"""
+Live feed of what tracked users are playing.
+
+The tracking job publishes each user's currently-playing track and the
+plays it records. A change (another track, playback stopping, a new
+play) bumps the user's status to a new version, wakes the process's
+subscribers of that user and is written to the live_status table in the
+tracking job's transaction. Other processes (see leader.py) copy newer
+versions of their subscribed users from that table every
+``live_sync_seconds``. Streams only read the table (through the read
+engine), so they never wait for the write connection.
+
+Subscribers read the latest status rather than a queue of changes, so
+updates are coalesced per user and a slow client never holds more than
+one pending status. The feed keeps one status per user and one small
+object per open stream, with at most ``live_max_subscribers`` streams
+(``live_max_subscribers_per_user`` per user). Open streams add no
+Spotify calls: they only read what the scheduler already fetched.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import get_settings
+from app.database import dialect_insert
+from app.models.live_status import LiveStatus
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Marks publish() arguments that leave that part of the status as it is
+UNCHANGED = object()
+
+# Users per live_status query
+SYNC_BATCH_SIZE = 500
+
+
+class FeedFull(Exception):
+    """Raised when a stream would exceed the subscriber limits."""
+
+
+def track_summary(track: dict) -> dict:
+    """The fields of a Spotify track object shown in the feed."""
+    album = track.get("album", {})
+    images = album.get("images") or []
+    return {
+        "track_id": track["id"],
+        "track_name": track.get("name", "Unknown"),
+        "artist_name": ", ".join(a["name"] for a in track.get("artists", [])) or "Unknown",
+        "album_name": album.get("name", "Unknown"),
+        "album_image_url": images[0]["url"] if images else None,
+        "duration_ms": track.get("duration_ms", 0),
+    }
+
+
+class Channel:
+    """Latest status of one user and the event its subscribers wait on."""
+
+    __slots__ = ("status", "version", "changed", "subscribers")
+
+    def __init__(self):
+        self.status = {"now_playing": None, "last_play": None}
+        self.version = 0.0
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+
+    def update(self, status: dict, version: float) -> None:
+        self.status = status
+        self.version = version
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def snapshot(self) -> dict:
+        updated_at = datetime.utcfromtimestamp(self.version).isoformat() + "Z" if self.version else None
+        return {**self.status, "version": self.version, "updated_at": updated_at}
+
+
+class Subscription:
+    """One open stream of a user's status."""
+
+    def __init__(self, feed: "LiveFeed", channel: Channel):
+        self.feed = feed
+        self.channel = channel
+        self.sent: Optional[float] = None
+        self.closed = False
+        channel.subscribers += 1
+        feed.subscribers += 1
+
+    async def next(self, timeout: float) -> Optional[dict]:
+        """
+        The status once it is newer than the last one returned.
+
+        The first call returns the current status right away. Returns None
+        if nothing changed within ``timeout`` seconds.
+        """
+        while self.sent is not None and self.channel.version <= self.sent:
+            try:
+                await asyncio.wait_for(self.channel.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        self.sent = self.channel.version
+        return self.channel.snapshot()
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.channel.subscribers -= 1
+            self.feed.subscribers -= 1
+
+
+class LiveFeed:
+    """Statuses of users and the streams subscribed to them, in one process."""
+
+    def __init__(self):
+        self.channels: dict[str, Channel] = {}
+        self.subscribers = 0
+        self._dirty: set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def _channel(self, user_id: str) -> Channel:
+        channel = self.channels.get(user_id)
+        if channel is None:
+            channel = self.channels[user_id] = Channel()
+        return channel
+
+    def publish(self, user_id: str, now_playing=UNCHANGED, last_play=UNCHANGED) -> bool:
+        """
+        Update a user's status from a tracking poll.
+
+        ``now_playing`` is a Spotify track object or None, ``last_play`` a
+        recorded play (see track_summary, plus played_at). Returns whether
+        the status changed.
+        """
+        channel = self._channel(user_id)
+        status = dict(channel.status)
+        if now_playing is not UNCHANGED:
+            status["now_playing"] = track_summary(now_playing) if now_playing else None
+        if last_play is not UNCHANGED:
+            status["last_play"] = last_play
+        if status == channel.status:
+            return False
+
+        # Versions are times, so a new leader's versions follow the old one's
+        channel.update(status, max(time.time(), channel.version + 1e-6))
+        self._dirty.add(user_id)
+        return True
+
+    async def flush(self, db: AsyncSession) -> None:
+        """Write changed statuses to live_status; the caller commits."""
+        if not self._dirty:
+            return
+        rows = [
+            {
+                "user_id": user_id,
+                "version": self.channels[user_id].version,
+                "payload": json.dumps(self.channels[user_id].status),
+            }
+            for user_id in sorted(self._dirty)
+        ]
+        self._dirty.clear()
+
+        stmt = dialect_insert(db, LiveStatus.__table__).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={"version": stmt.excluded.version, "payload": stmt.excluded.payload},
+        )
+        await db.execute(stmt)
+
+    async def sync(self, db: AsyncSession, user_ids: Optional[list[str]] = None) -> int:
+        """
+        Copy newer statuses written by the scheduler's process.
+
+        Covers the subscribed users unless ``user_ids`` is given. Returns
+        the number of statuses updated.
+        """
+        if user_ids is None:
+            user_ids = [user_id for user_id, channel in self.channels.items() if channel.subscribers]
+
+        updated = 0
+        for i in range(0, len(user_ids), SYNC_BATCH_SIZE):
+            result = await db.execute(
+                select(LiveStatus.user_id, LiveStatus.version, LiveStatus.payload)
+                .where(LiveStatus.user_id.in_(user_ids[i:i + SYNC_BATCH_SIZE]))
+            )
+            for user_id, version, payload in result.all():
+                channel = self._channel(user_id)
+                if version > channel.version:
+                    channel.update(json.loads(payload), version)
+                    updated += 1
+        return updated
+
+    async def load(self, db: AsyncSession, user_ids: list[str]) -> None:
+        """Read the stored statuses of users this process hasn't seen yet."""
+        new = [user_id for user_id in user_ids if user_id not in self.channels]
+        await self.sync(db, new)
+        for user_id in new:
+            self._channel(user_id)
+
+    def check_room(self, user_id: str) -> None:
+        """Raise FeedFull if another stream of the user would exceed the limits."""
+        if self.subscribers >= settings.live_max_subscribers:
+            raise FeedFull("Too many live streams open")
+        channel = self.channels.get(user_id)
+        if channel is not None and channel.subscribers >= settings.live_max_subscribers_per_user:
+            raise FeedFull("Too many live streams open for this user")
+
+    async def subscribe(self, db: AsyncSession, user_id: str) -> Subscription:
+        """Open a stream of a user's status. Raises FeedFull over the limits."""
+        self.check_room(user_id)
+        subscription = Subscription(self, self._channel(user_id))
+        try:
+            await self.sync(db, [user_id])
+        except Exception:
+            subscription.close()
+            raise
+        return subscription
+
+    def start(self, session_maker: async_sessionmaker) -> None:
+        """Keep subscribed users' statuses in step with live_status."""
+        self._task = asyncio.get_running_loop().create_task(self._run(session_maker))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, session_maker: async_sessionmaker) -> None:
+        while True:
+            await asyncio.sleep(settings.live_sync_seconds)
+            if not self.subscribers:
+                continue
+            try:
+                async with session_maker() as db:
+                    await self.sync(db)
+            except Exception as e:
+                logger.error(f"Live status sync failed: {e}")
+
+
+def format_event(status: dict) -> str:
+    """A status as a server-sent event."""
+    return f"event: status\nid: {status['version']}\ndata: {json.dumps(status)}\n\n"
+
+
+# Feed of this process
+live_feed = LiveFeed()
@@ -0,0 +1,161 @@
+"""
+Event loop lag monitor.
+
+The API, the scheduler jobs and all Spotify I/O share one asyncio loop, so
+any synchronous work on it delays everything else. A task on the loop
+sleeps ``loop_monitor_interval_ms`` at a time and records how late it
+wakes up (the lag). A watchdog thread checks that the task keeps waking
+up: once the loop has been stuck for ``loop_block_threshold_ms`` it logs
+the loop thread's current stack, which points at the blocking code while
+it is still running. When the loop comes back the stall is recorded with
+its total duration.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Lag samples kept for the percentiles, and stalls kept for /health/loop
+SAMPLES_KEPT = 3000
+STALLS_KEPT = 20
+
+
+class Stall(NamedTuple):
+    """A period the event loop was blocked."""
+    at: str
+    duration_ms: float
+    location: Optional[str]  # innermost frame of the loop thread's stack
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LoopMonitor:
+    """Samples event loop lag and reports what blocks the loop."""
+
+    def __init__(self, interval_ms: int, threshold_ms: int):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.samples: deque[float] = deque(maxlen=SAMPLES_KEPT)  # lag in seconds
+        self.stalls: deque[Stall] = deque(maxlen=STALLS_KEPT)
+        self.stall_count = 0
+        self.last_beat = time.monotonic()
+        self._blocked_location: Optional[str] = None
+        self._reported_beat: Optional[float] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Start sampling on the running loop and start the watchdog thread."""
+        self._loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _beat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - started - self.interval, 0.0)
+            self.samples.append(lag)
+            self.last_beat = time.monotonic()
+
+            if lag >= self.threshold:
+                self.stall_count += 1
+                self.stalls.append(Stall(
+                    at=datetime.utcnow().isoformat(timespec="seconds"),
+                    duration_ms=round(lag * 1000, 1),
+                    location=self._blocked_location,
+                ))
+                logger.warning(f"Event loop was blocked for {lag * 1000:.0f}ms at {self._blocked_location}")
+                self._blocked_location = None
+
+    def _watch(self) -> None:
+        # Check several times per threshold so stacks are caught mid-stall
+        while not self._stop.wait(self.threshold / 4):
+            beat = self.last_beat
+            blocked = time.monotonic() - beat - self.interval
+            if blocked < self.threshold or beat == self._reported_beat:
+                continue
+            self._reported_beat = beat
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            last = stack[-1]
+            self._blocked_location = f"{last.filename}:{last.lineno} in {last.name}"
+            logger.warning(
+                f"Event loop blocked for over {blocked * 1000:.0f}ms, loop thread stack:\n"
+                + "".join(traceback.format_list(stack))
+            )
+
+    def stats(self) -> dict:
+        """Lag percentiles over the recent samples and the recent stalls."""
+        ordered = sorted(self.samples)
+        return {
+            "samples": len(ordered),
+            "lag_ms": {
+                "p50": round(percentile(ordered, 0.50) * 1000, 2),
+                "p95": round(percentile(ordered, 0.95) * 1000, 2),
+                "p99": round(percentile(ordered, 0.99) * 1000, 2),
+                "max": round((ordered[-1] if ordered else 0.0) * 1000, 2),
+            },
+            "stall_count": self.stall_count,
+            "stalls": [stall._asdict() for stall in self.stalls],
+        }
+
+
+# Monitor of the app's loop, started in the lifespan handler
+monitor: Optional[LoopMonitor] = None
+
+
+def start_loop_monitor() -> None:
+    """Start monitoring the running loop (disabled with a 0 ms interval)."""
+    global monitor
+
+    if settings.loop_monitor_interval_ms <= 0 or monitor is not None:
+        return
+    monitor = LoopMonitor(settings.loop_monitor_interval_ms, settings.loop_block_threshold_ms)
+    monitor.start()
+
+
+async def stop_loop_monitor() -> None:
+    global monitor
+
+    if monitor is not None:
+        await monitor.stop()
+        monitor = None
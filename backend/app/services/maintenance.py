@@ -0,0 +1,107 @@
+"""
+Routine upkeep of the SQLite databases.
+
+With the WAL journal, commits append to the -wal file and pages are only
+copied back into the database at checkpoints. SQLite checkpoints on its
+own once the log passes 1000 pages, but a long-running reader can keep it
+from restarting, so the scheduler also runs a TRUNCATE checkpoint that
+resets the file. PRAGMA optimize refreshes planner statistics for the
+tables whose size changed a lot since the last ANALYZE.
+"""
+
+import logging
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.database import all_engines
+
+logger = logging.getLogger(__name__)
+
+# Rows ANALYZE samples per index; keeps optimize cheap on large tables
+ANALYSIS_LIMIT = 1000
+
+
+def database_path(engine: AsyncEngine) -> Optional[Path]:
+    """Path of a file-backed SQLite database, None for anything else."""
+    if engine.dialect.name != "sqlite":
+        return None
+    database = engine.url.database
+    if not database or database == ":memory:":
+        return None
+    return Path(database)
+
+
+async def checkpoint(engine: AsyncEngine) -> tuple[int, int, int]:
+    """
+    Checkpoint the WAL and truncate it.
+    
+    Returns SQLite's (busy, log pages, checkpointed pages); busy is 1 when
+    a reader kept the checkpoint from finishing.
+    """
+    async with engine.connect() as conn:
+        result = await conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        return tuple(result.one())
+
+
+async def optimize(engine: AsyncEngine) -> None:
+    """Refresh planner statistics (a full ANALYZE the first time)."""
+    async with engine.connect() as conn:
+        await conn.execute(text(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}"))
+        analyzed = await conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+        )
+        if analyzed.first() is None:
+            await conn.execute(text("ANALYZE"))
+        else:
+            await conn.execute(text("PRAGMA optimize"))
+        await conn.commit()
+
+
+async def database_stats(engine: AsyncEngine) -> dict:
+    """File, WAL and page statistics of a SQLite database."""
+    path = database_path(engine)
+    async with engine.connect() as conn:
+        pragmas = {}
+        for name in ("page_size", "page_count", "freelist_count", "journal_mode"):
+            pragmas[name] = (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+    
+    wal_path = Path(f"{path}-wal") if path else None
+    return {
+        "database": str(path) if path else engine.url.render_as_string(hide_password=True),
+        "size_bytes": path.stat().st_size if path and path.exists() else 0,
+        "wal_bytes": wal_path.stat().st_size if wal_path and wal_path.exists() else 0,
+        **pragmas,
+    }
+
+
+def sqlite_engines() -> list[AsyncEngine]:
+    return [engine for engine in all_engines() if engine.dialect.name == "sqlite"]
+
+
+async def run_wal_checkpoints() -> None:
+    """Scheduled job: checkpoint every SQLite database."""
+    for engine in sqlite_engines():
+        try:
+            busy, log_pages, checkpointed = await checkpoint(engine)
+        except Exception as e:
+            logger.error(f"WAL checkpoint failed for {engine.url.database}: {e}")
+            continue
+        if busy:
+            logger.info(f"WAL checkpoint of {engine.url.database} blocked by a reader ({checkpointed}/{log_pages} pages)")
+
+
+async def run_optimize() -> None:
+    """Scheduled job: refresh planner statistics of every SQLite database."""
+    for engine in sqlite_engines():
+        try:
+            await optimize(engine)
+        except Exception as e:
+            logger.error(f"PRAGMA optimize failed for {engine.url.database}: {e}")
+
+
+async def collect_database_stats() -> list[dict]:
+    """Statistics of every SQLite database."""
+    return [await database_stats(engine) for engine in sqlite_engines()]
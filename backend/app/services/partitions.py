@@ -0,0 +1,367 @@
+"""
+Optional monthly partitioning of listening sessions.
+
+With ``session_partitioning`` enabled, plays are written to one table per
+month (``listening_sessions_YYYYMM``), each with its own copy of the
+listening_sessions indexes. Window queries only touch the months that
+overlap the window, and a whole month can be archived and dropped without
+rewriting the indexes of the rest. Ids come from a shared sequence so they
+stay unique across partitions; each process reserves them in blocks of
+``ID_BLOCK_SIZE``, so writers rarely touch the sequence row.
+
+Each process remembers the partitions of every engine it has seen, so
+inserts only issue DDL for a month it doesn't know yet and reads only
+look at the catalog every ``partition_cache_seconds``, or when their
+window's last month has no partition yet. Creating or dropping a
+partition clears the lists of the other engines on the same database
+(e.g. the read engine). A partition dropped by another process can still
+be listed here; reads through read_session_tables then read the catalog
+again and treat that month as empty.
+
+The base listening_sessions table is always read as well, so rows written
+before partitioning was enabled stay visible until they are moved by
+``migrate_to_partitions``. Without partitioning every helper here resolves
+to the base table alone.
+"""
+
+import logging
+import time
+import weakref
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from sqlalchemy import Column, Index, MetaData, Table, event, select, union_all, update, delete, func, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex, CreateTable, DropTable
+
+from app.config import get_settings
+from app.database import data_session_makers, dialect_insert
+from app.models.id_sequence import IdSequence
+from app.models.listening_session import ListeningSession
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+PARTITION_PREFIX = "listening_sessions_"
+SESSION_SEQUENCE = "listening_sessions"
+MIGRATE_BATCH_SIZE = 5000
+ID_BLOCK_SIZE = 1000
+
+# A read whose last month has no partition looks at the catalog again at
+# most this often, so a month started by another process shows up quickly
+MISSING_MONTH_RECHECK_SECONDS = 1.0
+
+# Session.info keys of partitions created and ids reserved in the session's
+# open transaction
+CREATED_KEY = "created_partitions"
+ID_BLOCK_KEY = "id_block"
+CHANGED_KEY = "partitions_changed"
+
+T = TypeVar("T")
+
+_metadata = MetaData()
+_tables: dict[str, Table] = {}
+
+
+class KnownMonths:
+    """Partition months of one database, as last read from its catalog."""
+
+    __slots__ = ("months", "checked_at")
+
+    def __init__(self, months: list[str]):
+        self.months = set(months)
+        self.checked_at = time.monotonic()
+
+
+class IdBlock:
+    """Session ids [next, end) reserved from the sequence."""
+
+    __slots__ = ("next", "end")
+
+    def __init__(self, next: int, end: int):
+        self.next = next
+        self.end = end
+
+    def take(self, count: int) -> Optional[int]:
+        """First of ``count`` ids from the block, or None if too few are left."""
+        if self.end - self.next < count:
+            return None
+        first = self.next
+        self.next += count
+        return first
+
+
+_known: "weakref.WeakKeyDictionary[Engine, KnownMonths]" = weakref.WeakKeyDictionary()
+_id_blocks: "weakref.WeakKeyDictionary[Engine, IdBlock]" = weakref.WeakKeyDictionary()
+
+
+def month_key(value: datetime) -> str:
+    """Partition key (YYYYMM) of a play time."""
+    return value.strftime("%Y%m")
+
+
+def partition_table(month: str) -> Table:
+    """Table object for one month's partition (which may not exist yet)."""
+    table = _tables.get(month)
+    if table is None:
+        base = ListeningSession.__table__
+        # Ids are assigned from the shared sequence, never by the partition
+        columns = [
+            Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable, autoincrement=False)
+            if column.primary_key
+            else Column(column.name, column.type, nullable=column.nullable)
+            for column in base.columns
+        ]
+        indexes = [
+            Index(f"{index.name}_{month}", *(column.name for column in index.columns), unique=index.unique)
+            for index in base.indexes
+        ]
+        table = Table(PARTITION_PREFIX + month, _metadata, *columns, *indexes)
+        _tables[month] = table
+    return table
+
+
+async def existing_months(db: AsyncSession) -> list[str]:
+    """Months that have a partition, oldest first."""
+    names = await db.run_sync(lambda session: inspect(session.connection()).get_table_names())
+    return sorted(
+        name[len(PARTITION_PREFIX):]
+        for name in names
+        if name.startswith(PARTITION_PREFIX) and name[len(PARTITION_PREFIX):].isdigit()
+    )
+
+
+async def known_months(db: AsyncSession, wanted: Optional[str] = None) -> set[str]:
+    """
+    Months that have a partition, from this process's cache of the engine.
+
+    Includes partitions created in the session's open transaction. The
+    catalog is read again if the cache is old, or if month ``wanted`` is
+    missing and was last looked for over a second ago.
+    """
+    engine = db.get_bind()
+    known = _known.get(engine)
+    now = time.monotonic()
+    if (
+        known is None
+        or now - known.checked_at >= settings.partition_cache_seconds
+        or (wanted is not None and wanted not in known.months and now - known.checked_at >= MISSING_MONTH_RECHECK_SECONDS)
+    ):
+        known = _known[engine] = KnownMonths(await existing_months(db))
+    return known.months | db.sync_session.info.get(CREATED_KEY, set())
+
+
+def forget_partitions(engine: Engine, keep: Optional[Engine] = None) -> None:
+    """Clear the cached months of every engine on engine's database (but keep)."""
+    for other in list(_known):
+        if other is not keep and other.url == engine.url:
+            _known.pop(other, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_created(session: Session) -> None:
+    created = session.info.pop(CREATED_KEY, None)
+    changed = session.info.pop(CHANGED_KEY, False)
+    if created or changed:
+        engine = session.get_bind()
+        known = _known.get(engine)
+        if known is not None and created:
+            known.months |= created
+        # Other engines on this database (the read engine) look again
+        forget_partitions(engine, keep=engine)
+
+    # The reservation is durable now, so other sessions may use the rest
+    block = session.info.pop(ID_BLOCK_KEY, None)
+    if block is not None:
+        _id_blocks[session.get_bind()] = block
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_created(session: Session) -> None:
+    # DDL and the sequence update are transactional, so the rolled back
+    # partitions don't exist and the reserved ids may be handed out again
+    session.info.pop(CREATED_KEY, None)
+    session.info.pop(CHANGED_KEY, None)
+    session.info.pop(ID_BLOCK_KEY, None)
+
+
+async def session_tables(
+    db: AsyncSession,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> list[Table]:
+    """
+    Tables that can hold plays in [start, end): the base table, then the
+    overlapping partitions oldest first.
+    """
+    tables = [ListeningSession.__table__]
+    if not settings.session_partitioning:
+        return tables
+
+    last_month = month_key(end - timedelta(microseconds=1) if end else datetime.utcnow())
+    months = sorted(await known_months(db, last_month))
+    if start:
+        months = [m for m in months if m >= month_key(start)]
+    if end:
+        months = [m for m in months if m <= month_key(end - timedelta(microseconds=1))]
+    return tables + [partition_table(m) for m in months]
+
+
+def union_source(tables: list[Table]):
+    """A selectable with the listening_sessions columns over the given tables."""
+    if len(tables) == 1:
+        return tables[0]
+    return union_all(*(select(*table.c) for table in tables)).subquery("listening_sessions")
+
+
+async def sessions_source(
+    db: AsyncSession,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """A selectable with the listening_sessions columns over the tables for [start, end)."""
+    return union_source(await session_tables(db, start, end))
+
+
+def is_missing_table(error: DBAPIError) -> bool:
+    """Whether a statement failed because a table doesn't exist."""
+    # SQLite: "no such table"; PostgreSQL: undefined_table
+    return "no such table" in str(error.orig) or getattr(error.orig, "sqlstate", None) == "42P01"
+
+
+async def read_session_tables(
+    db: AsyncSession,
+    read: Callable[[list[Table]], Awaitable[T]],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> T:
+    """
+    Run ``read`` with the session tables of [start, end).
+
+    If another process dropped a listed partition in the meantime, the
+    months are read from the catalog again and ``read`` runs once more
+    without it, so the dropped month reads as empty. ``read`` must not
+    keep state from a failed attempt.
+    """
+    tables = await session_tables(db, start, end)
+    if len(tables) == 1:
+        return await read(tables)
+    try:
+        if db.bind.dialect.name == "postgresql":
+            # A failed statement would abort the whole transaction
+            async with db.begin_nested():
+                return await read(tables)
+        return await read(tables)
+    except DBAPIError as e:
+        if not is_missing_table(e):
+            raise
+        logger.info("A listed partition was dropped meanwhile; reading the catalog again")
+        forget_partitions(db.get_bind())
+        return await read(await session_tables(db, start, end))
+
+
+async def ensure_partition(db: AsyncSession, month: str) -> Table:
+    """Create a month's partition if needed; no DDL for a month already known."""
+    table = partition_table(month)
+    if month in await known_months(db):
+        return table
+
+    await db.execute(CreateTable(table, if_not_exists=True))
+    for index in table.indexes:
+        await db.execute(CreateIndex(index, if_not_exists=True))
+    db.sync_session.info.setdefault(CREATED_KEY, set()).add(month)
+    return table
+
+
+async def drop_partition(db: AsyncSession, month: str) -> None:
+    """Drop a month's partition (after its plays were archived)."""
+    await db.execute(DropTable(partition_table(month), if_exists=True))
+    db.sync_session.info.get(CREATED_KEY, set()).discard(month)
+    db.sync_session.info[CHANGED_KEY] = True
+    engine = db.get_bind()
+    for other, known in list(_known.items()):
+        if other.url == engine.url:
+            known.months.discard(month)
+
+
+async def allocate_ids(db: AsyncSession, count: int) -> int:
+    """
+    Reserve ``count`` consecutive session ids and return the first.
+
+    Ids come from this process's current block while it lasts; otherwise
+    a new block of at least ID_BLOCK_SIZE ids is reserved in the session's
+    transaction and shared with other sessions once that commits. Ids of
+    plays that turn out to be duplicates are left as gaps.
+    """
+    for block in (db.sync_session.info.get(ID_BLOCK_KEY), _id_blocks.get(db.get_bind())):
+        first = block.take(count) if block is not None else None
+        if first is not None:
+            return first
+
+    size = max(count, ID_BLOCK_SIZE)
+    stmt = (
+        update(IdSequence)
+        .where(IdSequence.name == SESSION_SEQUENCE)
+        .values(value=IdSequence.value + size)
+        .returning(IdSequence.value)
+    )
+    last = (await db.execute(stmt)).scalar_one_or_none()
+
+    if last is None:
+        # First use: continue after every id already stored
+        highest = 0
+        for table in await session_tables(db):
+            highest = max(highest, (await db.execute(select(func.max(table.c.id)))).scalar() or 0)
+        seed = dialect_insert(db, IdSequence.__table__).values(name=SESSION_SEQUENCE, value=highest)
+        await db.execute(seed.on_conflict_do_nothing())
+        last = (await db.execute(stmt)).scalar_one()
+
+    block = IdBlock(last - size + 1, last + 1)
+    db.sync_session.info[ID_BLOCK_KEY] = block
+    return block.take(count)
+
+
+async def migrate_to_partitions() -> int:
+    """Move rows from the base table into their partitions. Returns rows moved."""
+    if not settings.session_partitioning:
+        return 0
+
+    moved = 0
+    for session_maker in data_session_makers():
+        async with session_maker() as db:
+            moved += await _migrate(db)
+
+    if moved:
+        logger.info(f"Moved {moved} listening sessions into monthly partitions")
+    return moved
+
+
+async def _migrate(db: AsyncSession) -> int:
+    base = ListeningSession.__table__
+    moved = 0
+
+    # Later ids must not collide with the moved ones
+    await allocate_ids(db, 0)
+    await db.commit()
+
+    while True:
+        result = await db.execute(select(*base.c).order_by(base.c.id).limit(MIGRATE_BATCH_SIZE))
+        rows = [dict(row._mapping) for row in result]
+        if not rows:
+            break
+
+        by_month: dict[str, list[dict]] = {}
+        for row in rows:
+            by_month.setdefault(month_key(row["played_at"]), []).append(row)
+        for month, month_rows in by_month.items():
+            table = await ensure_partition(db, month)
+            await db.execute(dialect_insert(db, table).on_conflict_do_nothing(), month_rows)
+
+        await db.execute(delete(base).where(base.c.id <= rows[-1]["id"]))
+        await db.commit()
+        moved += len(rows)
+
+    return moved
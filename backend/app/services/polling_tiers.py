@@ -0,0 +1,126 @@
+"""
+Activity tiers for the tracking job.
+
+Polling every tracked user every tick mostly gets 204s back, since most
+users are idle most of the day. Users are put in one of three tiers from
+what recent polls saw and from when they usually listen:
+
+- active: seen playing on their last poll, polled every tick
+- recent: seen playing in the last ``poll_recent_minutes``, or the current
+  UTC hour is one of their usual listening hours, polled every
+  ``poll_recent_seconds``
+- dormant: everyone else, polled every ``poll_dormant_seconds``
+
+The tracking job asks active users for the currently playing track and
+everyone else for recently-played since their previous poll, which
+records the plays that started and finished in between at the cost of
+the same single call. A user seen playing, or with such plays, is active
+from that poll on. Usual hours are the
+hours holding at least ``poll_usual_hour_share`` of the user's plays over
+the last ``poll_profile_days``, read from the day sketches every
+``poll_profile_hours``. The state lives in the process running the
+scheduler; a new leader starts by polling everyone once.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from app.config import get_settings
+from app.database import data_session_makers
+from app.services.sketch_service import load_hourly_profiles
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+ACTIVE = "active"
+RECENT = "recent"
+DORMANT = "dormant"
+
+# Ticks start a little late now and then; a user due within this margin
+# is polled on this tick rather than a whole tick later
+POLL_SLACK = timedelta(seconds=5)
+
+
+def usual_hours(counts: list[int], share: float) -> frozenset[int]:
+    """Hours holding at least ``share`` of the plays in an hourly profile."""
+    total = sum(counts)
+    if total == 0:
+        return frozenset()
+    return frozenset(hour for hour, plays in enumerate(counts) if plays >= share * total)
+
+
+class PollingTiers:
+    """When each tracked user was last polled and last seen playing."""
+
+    def __init__(self):
+        self.last_polled: dict[str, datetime] = {}
+        self.last_playing: dict[str, datetime] = {}
+        self.usual_hours: dict[str, frozenset[int]] = {}
+        self.profiles_loaded_at: Optional[datetime] = None
+
+    def tier(self, user_id: str, now: datetime) -> str:
+        last_playing = self.last_playing.get(user_id)
+        if last_playing is not None:
+            if last_playing == self.last_polled.get(user_id):
+                return ACTIVE
+            if now - last_playing < timedelta(minutes=settings.poll_recent_minutes):
+                return RECENT
+        if now.hour in self.usual_hours.get(user_id, ()):
+            return RECENT
+        return DORMANT
+
+    def is_due(self, user_id: str, now: datetime) -> bool:
+        """Whether the user should be polled on the tick at ``now``."""
+        last_polled = self.last_polled.get(user_id)
+        if not settings.poll_tiers or last_polled is None:
+            return True
+
+        tier = self.tier(user_id, now)
+        if tier == ACTIVE:
+            return True
+        seconds = settings.poll_recent_seconds if tier == RECENT else settings.poll_dormant_seconds
+        return now - last_polled >= timedelta(seconds=seconds) - POLL_SLACK
+
+    def observe(self, user_id: str, playing: bool, now: datetime) -> None:
+        """Record the result of polling a user."""
+        self.last_polled[user_id] = now
+        if playing:
+            self.last_playing[user_id] = now
+
+    def retain(self, user_ids: Iterable[str]) -> None:
+        """Forget users who are no longer tracked."""
+        keep = set(user_ids)
+        for state in (self.last_polled, self.last_playing, self.usual_hours):
+            for user_id in [user_id for user_id in state if user_id not in keep]:
+                del state[user_id]
+
+    async def refresh_profiles(self, now: datetime) -> None:
+        """Reload usual listening hours once they are poll_profile_hours old."""
+        if not settings.poll_tiers:
+            return
+        if (
+            self.profiles_loaded_at is not None
+            and now - self.profiles_loaded_at < timedelta(hours=settings.poll_profile_hours)
+        ):
+            return
+
+        start_day = (now - timedelta(days=settings.poll_profile_days)).strftime("%Y-%m-%d")
+        profiles: dict[str, frozenset[int]] = {}
+        try:
+            for session_maker in data_session_makers():
+                async with session_maker() as db:
+                    for user_id, counts in (await load_hourly_profiles(db, start_day)).items():
+                        profiles[user_id] = usual_hours(counts, settings.poll_usual_hour_share)
+        except Exception as e:
+            # Keep the old profiles and try again next tick
+            logger.error(f"Failed to load listening hour profiles: {e}")
+            return
+
+        self.usual_hours = profiles
+        self.profiles_loaded_at = now
+        logger.info(f"Loaded listening hour profiles of {len(profiles)} users")
+
+
+# Tiers of the users tracked by this process's scheduler
+polling = PollingTiers()
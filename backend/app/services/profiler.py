@@ -0,0 +1,157 @@
+"""
+On-demand sampling profiler.
+
+Requests carrying ``X-Profile: <profiling_token>`` (or ``?profile=<token>``)
+are profiled, and so is the next track_all_users tick after
+POST /admin/profile/tick. While a profile runs, a thread samples the
+event loop thread's stack every ``profiling_interval_ms`` and the stacks
+are written to ``profile_dir`` in the collapsed format that flamegraph.pl,
+speedscope and inferno read ("outer;inner;leaf count" per line).
+
+Samples cover everything the loop runs meanwhile, including other
+requests, and not the folds sent to the process pool. One profile runs at
+a time. Without a token, profiling is off and costs one settings lookup.
+"""
+
+import functools
+import logging
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+from fastapi import Request, Response
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_SUFFIX = ".folded"
+
+_running = threading.Lock()
+_tick_requested = False
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Collects collapsed stacks of one thread from a sampling thread."""
+
+    def __init__(self, thread_id: int, interval_ms: int):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            if labels:
+                self.stacks[";".join(reversed(labels))] += 1
+                self.samples += 1
+
+    def write(self, path: Path) -> None:
+        """Write the stacks in collapsed format, most frequent first."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profile(name: str):
+    """
+    Profile the event loop thread while the block runs.
+
+    Yields the path the profile will be written to, or None when another
+    profile is already running.
+    """
+    if not _running.acquire(blocking=False):
+        yield None
+        return
+
+    stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S-%f")
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", name).strip("-") or "profile"
+    path = Path(settings.profile_dir) / f"{stamp}-{slug}{PROFILE_SUFFIX}"
+    profiler = SamplingProfiler(threading.get_ident(), settings.profiling_interval_ms)
+    started = time.monotonic()
+    profiler.start()
+    try:
+        yield path
+    finally:
+        profiler.stop()
+        profiler.write(path)
+        _running.release()
+        logger.info(
+            f"Profiled {name}: {profiler.samples} samples in "
+            f"{time.monotonic() - started:.2f}s written to {path}"
+        )
+
+
+def is_authorized(token: Optional[str]) -> bool:
+    """Whether a request's token switches profiling on."""
+    expected = settings.profiling_token
+    # Bytes, since compare_digest refuses non-ASCII str
+    return bool(expected and token) and secrets.compare_digest(token.encode(), expected.encode())
+
+
+async def profiling_middleware(request: Request, call_next) -> Response:
+    """Profile requests that carry the profiling token."""
+    if not settings.profiling_token:
+        return await call_next(request)
+
+    token = request.headers.get(PROFILE_HEADER) or request.query_params.get("profile")
+    if not is_authorized(token):
+        return await call_next(request)
+
+    with profile(f"{request.method} {request.url.path}") as path:
+        response = await call_next(request)
+    if path is not None:
+        response.headers[PROFILE_HEADER] = path.name
+    return response
+
+
+def request_tick_profile() -> None:
+    """Profile the next run of a job wrapped with profiled_tick."""
+    global _tick_requested
+    _tick_requested = True
+
+
+def profiled_tick(job: Callable) -> Callable:
+    """Wrap a scheduler job so a requested run is profiled."""
+
+    @functools.wraps(job)
+    async def wrapper(*args, **kwargs):
+        global _tick_requested
+        if not _tick_requested:
+            return await job(*args, **kwargs)
+
+        _tick_requested = False
+        with profile(job.__name__):
+            return await job(*args, **kwargs)
+
+    return wrapper
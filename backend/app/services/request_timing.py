@@ -0,0 +1,156 @@
+"""
+Per-request phase timings.
+
+The middleware gives every request a RequestTiming in a context variable
+that code on the way adds to:
+
+- spotify: Spotify API calls (spans in SpotifyService and the auth router)
+- sql: statement execution on any engine (with the query count) and
+  streamed row fetches
+- aggregate: fold functions (run_fold), inline or in the process pool
+- serialize: building the response from the endpoint's return value
+  (routes using TimedRoute)
+- app: whatever is left of the total
+
+The result goes out as a Server-Timing header and one JSON log line per
+request. Outside a request (scheduler jobs) spans cost a context variable
+lookup.
+"""
+
+import functools
+import inspect
+import json
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Callable, Optional
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Phases in header order; "app" is the remainder of the total
+PHASES = ("spotify", "sql", "aggregate", "serialize")
+
+_current: ContextVar[Optional["RequestTiming"]] = ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    """Time spent per phase while handling one request."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.phases: dict[str, float] = {}  # phase -> seconds
+        self.sql_queries = 0
+        self.endpoint_done: Optional[float] = None
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def breakdown(self, total: float) -> dict[str, float]:
+        """Milliseconds per phase, with the remainder as app and the total."""
+        durations = {phase: self.phases.get(phase, 0.0) * 1000 for phase in PHASES}
+        # Concurrent queries can add up to more than the wall time
+        durations["app"] = max(total * 1000 - sum(durations.values()), 0.0)
+        durations["total"] = total * 1000
+        return durations
+
+    def header(self, total: float) -> str:
+        """Server-Timing header value."""
+        entries = []
+        for phase, ms in self.breakdown(total).items():
+            entry = f"{phase};dur={ms:.1f}"
+            if phase == "sql":
+                entry += f';desc="{self.sql_queries} queries"'
+            entries.append(entry)
+        return ", ".join(entries)
+
+
+@contextmanager
+def span(phase: str):
+    """Add the time spent in the block to a phase of the current request."""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(phase, perf_counter() - started)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current.get() is not None:
+        context._timing_started = perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timing = _current.get()
+    started = getattr(context, "_timing_started", None)
+    if timing is None or started is None:
+        return
+    timing.add("sql", perf_counter() - started)
+    timing.sql_queries += 1
+
+
+class TimedRoute(APIRoute):
+    """API route that times response serialization as its own phase."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            endpoint = _mark_done(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request) -> Response:
+            response = await handler(request)
+            timing = _current.get()
+            if timing is not None and timing.endpoint_done is not None:
+                timing.add("serialize", perf_counter() - timing.endpoint_done)
+            return response
+
+        return timed_handler
+
+
+def _mark_done(endpoint: Callable) -> Callable:
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        result = await endpoint(*args, **kwargs)
+        timing = _current.get()
+        if timing is not None:
+            timing.endpoint_done = perf_counter()
+        return result
+
+    return wrapper
+
+
+async def server_timing_middleware(request: Request, call_next) -> Response:
+    """Time the request's phases into a Server-Timing header and a log line."""
+    timing = RequestTiming()
+    token = _current.set(timing)
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+
+    total = perf_counter() - timing.started
+    response.headers["Server-Timing"] = timing.header(total)
+
+    record = {
+        "method": request.method,
+        "path": request.url.path,
+        "status": response.status_code,
+        **{f"{phase}_ms": round(ms, 1) for phase, ms in timing.breakdown(total).items()},
+        "sql_queries": timing.sql_queries,
+    }
+    logger.info(json.dumps(record))
+    return response
@@ -1,20 +1,35 @@
 """Background scheduler for automatic tracking."""
 
 import asyncio
+import functools
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 import httpx
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.date import DateTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import async_session_maker
+from app.database import async_session_maker, lease_session_maker, user_session_maker
 from app.models.user_token import UserToken
 from app.models.listening_session import ListeningSession
 from app.config import get_settings
+from app.schemas.tracking import RecordPlayBatchItem
+from app.services.tracking_service import TrackingService, insert_play_if_new, update_rollups
+from app.services.archive_service import run_archival
+from app.services.backup_service import run_backups
+from app.services.leader import LeaderElection
+from app.services.live_feed import live_feed, track_summary
+from app.services.maintenance import run_optimize, run_wal_checkpoints
+from app.services.partitions import migrate_to_partitions
+from app.services.shards import migrate_to_shards
+from app.services.polling_tiers import ACTIVE, polling
+from app.services.profiler import profiled_tick
+from app.services.sketch_service import backfill_day_sketches
+from app.services.summary_service import backfill_entity_summaries
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -22,6 +37,35 @@ settings = get_settings()
 # Global scheduler instance
 scheduler: Optional[AsyncIOScheduler] = None
 
+# Election of the process running the scheduler (with leader_election)
+election: Optional[LeaderElection] = None
+
+# Job runs in progress, cancelled when the scheduler stops
+_running: set[asyncio.Task] = set()
+
+# Delay before prepare_data runs again after a failed step
+PREPARE_RETRY_SECONDS = 60
+
+
+def runs_jobs() -> bool:
+    """Whether this process runs the background jobs (holds the lease, with leader_election)."""
+    return scheduler is not None
+
+
+def cancellable(job):
+    """Wrap a scheduler job so that stopping the scheduler cancels its runs."""
+
+    @functools.wraps(job)
+    async def wrapper(*args, **kwargs):
+        task = asyncio.current_task()
+        _running.add(task)
+        try:
+            return await job(*args, **kwargs)
+        finally:
+            _running.discard(task)
+
+    return wrapper
+
 
 async def refresh_access_token(user_token: UserToken, db: AsyncSession) -> Optional[str]:
     """Refresh the access token using refresh token."""
@@ -87,28 +131,58 @@ async def get_currently_playing(access_token: str) -> Optional[dict]:
             return None
 
 
+async def get_recently_played(access_token: str, after: datetime) -> list[dict]:
+    """Fetch plays finished after a time (naive UTC) from Spotify API."""
+    async with httpx.AsyncClient() as client:
+        try:
+            response = await client.get(
+                f"{settings.spotify_api_base_url}/me/player/recently-played",
+                params={
+                    "limit": 50,
+                    "after": int(after.replace(tzinfo=timezone.utc).timestamp() * 1000),
+                },
+                headers={"Authorization": f"Bearer {access_token}"},
+            )
+            
+            if response.status_code == 200:
+                return response.json().get("items", [])
+            
+            return []
+            
+        except Exception as e:
+            logger.debug(f"Error fetching recently played: {e}")
+            return []
+
+
+async def record_recent_plays(db: AsyncSession, user_id: str, items: list[dict]) -> int:
+    """Record recently-played items, skipping duplicates. Returns plays recorded."""
+    plays = []
+    for item in items:
+        track = item["track"]
+        plays.append(RecordPlayBatchItem(
+            track_id=track["id"],
+            track_name=track.get("name", "Unknown"),
+            artist_name=", ".join(a["name"] for a in track.get("artists", [])) or "Unknown",
+            album_name=track.get("album", {}).get("name", "Unknown"),
+            duration_ms=track.get("duration_ms", 0),
+            played_at=datetime.fromisoformat(item["played_at"].replace("Z", "+00:00")),
+        ))
+    
+    if not plays:
+        return 0
+    
+    result = await TrackingService(db, user_id).record_plays(plays)
+    if result.recorded:
+        logger.info(f"Recorded {result.recorded} plays finished between polls for user {user_id}")
+    return result.recorded
+
+
 async def record_play_if_new(
     db: AsyncSession,
     user_id: str,
     track: dict,
-) -> bool:
-    """Record a play if it's not a duplicate (same track in last 3 minutes)."""
-    track_id = track["id"]
-    three_minutes_ago = datetime.utcnow() - timedelta(minutes=3)
-    
-    # Check for recent duplicate
-    query = select(ListeningSession).where(
-        ListeningSession.user_id == user_id,
-        ListeningSession.track_id == track_id,
-        ListeningSession.played_at >= three_minutes_ago,
-    )
-    
-    result = await db.execute(query)
-    existing = result.scalar_one_or_none()
-    
-    if existing:
-        return False  # Duplicate, skip
-    
+) -> Optional[ListeningSession]:
+    """Record a play if it's not a duplicate (same track in last 3 minutes). Returns the new play."""
     # Extract track info
     artists = ", ".join(a["name"] for a in track.get("artists", []))
     album = track.get("album", {})
@@ -116,35 +190,62 @@ async def record_play_if_new(
     # Create new session
     session = ListeningSession(
         user_id=user_id,
-        track_id=track_id,
+        track_id=track["id"],
         track_name=track.get("name", "Unknown"),
         artist_name=artists or "Unknown",
         album_name=album.get("name", "Unknown"),
         duration_ms=track.get("duration_ms", 0),
+        played_at=datetime.utcnow(),
     )
     
-    db.add(session)
+    if await insert_play_if_new(db, session) is None:
+        return None  # Duplicate, skip
+    
+    await update_rollups(db, [session])
     await db.commit()
     
     logger.info(f"Recorded: {track.get('name')} by {artists} for user {user_id}")
-    return True
+    return session
 
 
-async def track_all_users():
-    """Main tracking job - check all users' currently playing tracks."""
+@profiled_tick
+async def track_all_users(now: Optional[datetime] = None):
+    """
+    Main tracking job - check users' currently playing tracks.
+    
+    Only users due in their activity tier are polled (see polling_tiers).
+    Active users are asked what is playing; the others for the plays
+    finished since their last poll.
+    ``now`` stands in for the tick's start time, e.g. in load tests.
+    """
     logger.debug("Running tracking job...")
+    now = now or datetime.utcnow()
     
     async with async_session_maker() as db:
         # Get all users with tracking enabled
         query = select(UserToken).where(UserToken.tracking_enabled == True)
         result = await db.execute(query)
         users = result.scalars().all()
+        # End the read so the (single) writer connection isn't held while
+        # waiting on Spotify or recording plays through another session
+        await db.commit()
         
         if not users:
             logger.debug("No users to track")
             return
         
-        for user_token in users:
+        polling.retain(user.user_id for user in users)
+        await polling.refresh_profiles(now)
+        due = [user for user in users if polling.is_due(user.user_id, now)]
+        logger.debug(f"Polling {len(due)} of {len(users)} users")
+        
+        # Live statuses published by an earlier scheduler process
+        await live_feed.load(db, [user.user_id for user in due])
+        await db.commit()
+        
+        for user_token in due:
+            # Readable in the except block even if the session failed
+            user_id = user_token.user_id
             try:
                 # Check if token needs refresh
                 access_token = user_token.access_token
@@ -154,22 +255,141 @@ async def track_all_users():
                     if not access_token:
                         continue  # Skip this user if refresh failed
                 
-                # Get currently playing
-                track = await get_currently_playing(access_token)
-                
-                if track:
-                    await record_play_if_new(db, user_token.user_id, track)
+                if settings.poll_tiers and polling.tier(user_token.user_id, now) != ACTIVE:
+                    # One call that also catches the plays that started and
+                    # finished since the last poll; any play promotes the user
+                    after = (
+                        polling.last_polled.get(user_token.user_id)
+                        or user_token.last_tracked_at
+                        or now - timedelta(seconds=settings.poll_dormant_seconds)
+                    )
+                    recent = await get_recently_played(access_token, after)
+                    polling.observe(user_token.user_id, bool(recent), now)
+                    recorded = 0
+                    if recent:
+                        async with user_session_maker(user_token.user_id)() as user_db:
+                            recorded = await record_recent_plays(user_db, user_token.user_id, recent)
+                    if recorded:
+                        # Newest first; played_at is when it finished
+                        played_at = datetime.fromisoformat(recent[0]["played_at"].replace("Z", "+00:00"))
+                        live_feed.publish(
+                            user_token.user_id,
+                            now_playing=None,
+                            last_play={
+                                **track_summary(recent[0]["track"]),
+                                "played_at": played_at.replace(tzinfo=None).isoformat() + "Z",
+                            },
+                        )
+                    else:
+                        live_feed.publish(user_token.user_id, now_playing=None)
+                else:
+                    track = await get_currently_playing(access_token)
+                    polling.observe(user_token.user_id, track is not None, now)
+                    play = None
+                    if track:
+                        async with user_session_maker(user_token.user_id)() as user_db:
+                            play = await record_play_if_new(user_db, user_token.user_id, track)
+                    
+                    if play is not None:
+                        live_feed.publish(
+                            user_token.user_id,
+                            now_playing=track,
+                            last_play={**track_summary(track), "played_at": play.played_at.isoformat() + "Z"},
+                        )
+                    else:
+                        live_feed.publish(user_token.user_id, now_playing=track)
                 
-                # Update last tracked timestamp
+                # Update last tracked timestamp (and the live status)
                 user_token.last_tracked_at = datetime.utcnow()
+                await live_feed.flush(db)
                 await db.commit()
                 
             except Exception as e:
-                logger.error(f"Error tracking user {user_token.user_id}: {e}")
+                logger.error(f"Error tracking user {user_id}: {e}")
+                # A failed flush or commit keeps the transaction (and the
+                # single writer connection) open until rolled back
+                await db.rollback()
+                # The rollback expired the remaining users; reload them
+                await db.execute(query)
+                await db.commit()
                 continue
 
 
 def start_scheduler():
+    """
+    Start the background jobs, or campaign for them.
+    
+    With leader election only the process holding the scheduler lease runs
+    the jobs; the others take over if it stops renewing the lease.
+    """
+    global election
+    
+    if not settings.leader_election:
+        _start_jobs()
+        return
+    
+    if election is not None:
+        logger.warning("Leader election already running")
+        return
+    
+    election = LeaderElection(lease_session_maker, on_elected=_start_jobs, on_deposed=_stop_jobs)
+    election.start()
+    logger.info(f"Campaigning for the scheduler lease as {election.holder}")
+
+
+async def stop_scheduler():
+    """Stop the background jobs and hand the scheduler lease over."""
+    global election
+    
+    running = list(_running)
+    if election is not None:
+        await election.stop()
+        election = None
+    _stop_jobs()
+    # Let the cancelled runs roll back before the engines are disposed
+    await asyncio.gather(*running, return_exceptions=True)
+
+
+async def prepare_data():
+    """
+    First job of the scheduler: bring stored data to the current layout.
+    
+    Moves users' rows into their shards and monthly partitions and builds
+    missing sketches and summaries, then starts the periodic jobs; if a
+    step fails, the periodic jobs wait and the whole job runs again after
+    PREPARE_RETRY_SECONDS. Only the process running the scheduler does
+    this, so other workers start serving right away. Each step finds
+    nothing to do once it has run, so a later leader repeats them cheaply.
+    """
+    current = scheduler
+    try:
+        await migrate_to_shards()
+        await migrate_to_partitions()
+        await backfill_day_sketches()
+        await backfill_entity_summaries()
+    except Exception as e:
+        logger.error(f"Preparing stored data failed, retrying in {PREPARE_RETRY_SECONDS} s: {e}")
+        if current is not None and current is scheduler:
+            _add_prepare_job(current, datetime.now(timezone.utc) + timedelta(seconds=PREPARE_RETRY_SECONDS))
+        return
+    
+    # Not if the scheduler was stopped meanwhile
+    if current is not None and current is scheduler:
+        _add_periodic_jobs(current)
+
+
+def _add_prepare_job(scheduler: AsyncIOScheduler, run_date: Optional[datetime] = None):
+    """Add prepare_data as a one-off job (right away without a run_date)."""
+    scheduler.add_job(
+        cancellable(prepare_data),
+        trigger=DateTrigger(run_date=run_date) if run_date else None,
+        id="prepare_data",
+        name="Migrate and backfill stored data",
+        replace_existing=True,
+    )
+
+
+def _start_jobs():
     """Start the background scheduler."""
     global scheduler
     
@@ -179,24 +399,73 @@ def start_scheduler():
     
     scheduler = AsyncIOScheduler()
     
+    # Runs once, right away; it adds the periodic jobs when done
+    _add_prepare_job(scheduler)
+    
+    scheduler.start()
+    logger.info("🎵 Background tracking scheduler started (every 30s)")
+
+
+def _add_periodic_jobs(scheduler: AsyncIOScheduler):
+    """Add the tracking, archival and upkeep jobs."""
     # Run tracking every 30 seconds
     scheduler.add_job(
-        track_all_users,
+        cancellable(track_all_users),
         trigger=IntervalTrigger(seconds=30),
         id="track_all_users",
         name="Track all users' currently playing",
         replace_existing=True,
     )
     
-    scheduler.start()
-    logger.info("🎵 Background tracking scheduler started (every 30s)")
+    # Move old plays to the archive once a day
+    scheduler.add_job(
+        cancellable(run_archival),
+        trigger=IntervalTrigger(hours=24),
+        id="run_archival",
+        name="Archive old listening sessions",
+        replace_existing=True,
+    )
+    
+    # SQLite upkeep: keep the WAL short and planner statistics fresh
+    if settings.sqlite_tuning:
+        scheduler.add_job(
+            cancellable(run_wal_checkpoints),
+            trigger=IntervalTrigger(minutes=settings.sqlite_checkpoint_minutes),
+            id="run_wal_checkpoints",
+            name="Checkpoint SQLite WAL files",
+            replace_existing=True,
+        )
+        scheduler.add_job(
+            cancellable(run_optimize),
+            trigger=IntervalTrigger(hours=settings.sqlite_optimize_hours),
+            id="run_optimize",
+            name="Refresh SQLite planner statistics",
+            replace_existing=True,
+        )
+    
+    if settings.backup_interval_hours > 0:
+        scheduler.add_job(
+            cancellable(run_backups),
+            trigger=IntervalTrigger(hours=settings.backup_interval_hours),
+            id="run_backups",
+            name="Back up SQLite databases",
+            replace_existing=True,
+        )
 
 
-def stop_scheduler():
-    """Stop the background scheduler."""
+def _stop_jobs():
+    """
+    Stop the background scheduler and cancel the job runs in progress.
+    
+    A deposed leader must not keep writing next to the new one; a job
+    cancelled mid-transaction is rolled back, and the jobs pick up where
+    they left off on their next run.
+    """
     global scheduler
     
     if scheduler:
         scheduler.shutdown(wait=False)
         scheduler = None
+        for task in list(_running):
+            task.cancel()
         logger.info("Background tracking scheduler stopped")
@@ -0,0 +1,198 @@
+"""
+Columnar segment files for archived listening sessions.
+
+One segment holds one user's plays for one month, sorted by
+(played_at, id). Layout::
+
+    b"LSEG" | u32 header length | JSON header | column blocks
+
+Each column is a separate zlib block, so a reader only inflates the columns
+it asks for. Integer columns (ids, durations, microsecond timestamps,
+buckets) are little-endian int64 arrays; string columns are dictionary
+encoded as a JSON list of distinct values plus a little-endian uint32
+code per row.
+Segments are immutable: adding plays to a month rewrites its file and
+atomically replaces the old one.
+"""
+
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Sequence
+
+MAGIC = b"LSEG"
+VERSION = 1
+
+# Stored columns, in row tuple order
+COLUMNS = (
+    "id",
+    "track_id",
+    "track_name",
+    "artist_name",
+    "album_name",
+    "duration_ms",
+    "played_at",
+    "played_bucket",
+)
+INT_COLUMNS = {"id", "duration_ms", "played_at", "played_bucket"}
+
+_EPOCH = datetime(1970, 1, 1)
+_NULL = -1  # played_bucket of pre-index duplicates
+
+
+def _to_micros(value: datetime) -> int:
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+
+def _int_bytes(values: Sequence[int], typecode: str = "q") -> bytes:
+    data = array(typecode, values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tobytes()
+
+
+def _int_array(data: bytes, typecode: str = "q") -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def write_segment(path: Path, rows: Sequence[tuple]) -> None:
+    """
+    Write rows (tuples in COLUMNS order) as a segment file.
+
+    Rows are sorted by (played_at, id) here. The file is written next to
+    the target and renamed over it, so readers never see a partial segment.
+    """
+    rows = sorted(rows, key=lambda row: (row[6], row[0]))
+    header = {
+        "version": VERSION,
+        "rows": len(rows),
+        "min_played_at": rows[0][6].isoformat() if rows else None,
+        "max_played_at": rows[-1][6].isoformat() if rows else None,
+        "columns": {},
+    }
+    blocks = []
+    offset = 0
+
+    def add_block(data: bytes) -> dict:
+        nonlocal offset
+        compressed = zlib.compress(data, 6)
+        blocks.append(compressed)
+        block = {"offset": offset, "length": len(compressed)}
+        offset += len(compressed)
+        return block
+
+    for position, name in enumerate(COLUMNS):
+        values = [row[position] for row in rows]
+        if name == "played_at":
+            values = [_to_micros(value) for value in values]
+        elif name == "played_bucket":
+            values = [_NULL if value is None else value for value in values]
+
+        if name in INT_COLUMNS:
+            header["columns"][name] = {"values": add_block(_int_bytes(values))}
+        else:
+            dictionary = list(dict.fromkeys(values))
+            codes = {value: code for code, value in enumerate(dictionary)}
+            header["columns"][name] = {
+                "dictionary": add_block(json.dumps(dictionary).encode()),
+                "codes": add_block(_int_bytes([codes[value] for value in values], "I")),
+            }
+
+    header_bytes = json.dumps(header).encode()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(struct.pack("<I", len(header_bytes)))
+        file.write(header_bytes)
+        for block in blocks:
+            file.write(block)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+class Segment:
+    """
+    A memory-mapped segment file; columns are inflated on first use.
+
+    With ``mapped=False`` the file is read into memory instead, so nothing
+    keeps it open (Windows cannot replace a file that is mapped).
+    """
+
+    def __init__(self, path: Path, mapped: bool = True):
+        self.path = path
+        with open(path, "rb") as file:
+            self._mm = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if mapped else file.read()
+
+        if self._mm[:4] != MAGIC:
+            raise ValueError(f"Not a segment file: {path}")
+        (header_length,) = struct.unpack_from("<I", self._mm, 4)
+        self.header = json.loads(self._mm[8:8 + header_length])
+        self._data_start = 8 + header_length
+        self.rows = self.header["rows"]
+        self._columns: dict[str, list] = {}
+
+    def close(self) -> None:
+        self._columns.clear()
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+
+    def _block(self, block: dict) -> bytes:
+        start = self._data_start + block["offset"]
+        return zlib.decompress(memoryview(self._mm)[start:start + block["length"]])
+
+    def column(self, name: str) -> Sequence:
+        """Raw column values (played_at as microseconds since the epoch)."""
+        values = self._columns.get(name)
+        if values is None:
+            spec = self.header["columns"][name]
+            if name in INT_COLUMNS:
+                values = _int_array(self._block(spec["values"]))
+            else:
+                dictionary = json.loads(self._block(spec["dictionary"]))
+                values = [dictionary[code] for code in _int_array(self._block(spec["codes"]), "I")]
+            self._columns[name] = values
+        return values
+
+    def _decoded(self, name: str, lo: int, hi: int) -> list:
+        values = self.column(name)[lo:hi]
+        if name == "played_at":
+            return [_from_micros(value) for value in values]
+        if name == "played_bucket":
+            return [None if value == _NULL else value for value in values]
+        return list(values)
+
+    def bounds(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> tuple[int, int]:
+        """Row range with start <= played_at < end."""
+        played_at = self.column("played_at")
+        lo = bisect.bisect_left(played_at, _to_micros(start)) if start else 0
+        hi = bisect.bisect_left(played_at, _to_micros(end)) if end else self.rows
+        return lo, hi
+
+    def select(
+        self,
+        columns: Sequence[str],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> list[tuple]:
+        """Rows with start <= played_at < end as tuples of the given columns."""
+        lo, hi = self.bounds(start, end)
+        if lo >= hi:
+            return []
+        return list(zip(*(self._decoded(name, lo, hi) for name in columns)))
@@ -0,0 +1,119 @@
+"""
+Rebalancing listening data into the shards.
+
+With ``shard_count`` set, each user's sessions, day sketches and entity
+summaries live in the shard file picked by ``shard_for``. Data written
+before sharding was enabled stays in the main database, and changing
+``shard_count`` routes users to other files; ``migrate_to_shards`` moves
+such users' sessions to their shard and rebuilds their sketches and
+summaries there. Shard files beyond ``shard_count`` are drained but left
+in place.
+"""
+
+import logging
+from typing import Optional
+
+from sqlalchemy import and_, delete, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import get_settings
+from app.database import async_session_maker, dialect_insert, shard_for, shard_session_maker, stored_shards
+from app.models.day_sketch import ListeningDaySketch
+from app.models.entity_summary import ListeningEntitySummary
+from app.models.listening_session import ListeningSession
+from app.services.partitions import MIGRATE_BATCH_SIZE, allocate_ids, ensure_partition, month_key, session_tables
+from app.services.sketch_service import rebuild_day_sketches
+from app.services.summary_service import rebuild_entity_summaries
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+async def migrate_to_shards() -> int:
+    """Move sessions of users stored outside their shard into it. Returns rows moved."""
+    if settings.shard_count <= 0:
+        return 0
+
+    sources: list[tuple[Optional[int], async_sessionmaker]] = [(None, async_session_maker)]
+    for shard in sorted(set(range(settings.shard_count)) | set(stored_shards())):
+        sources.append((shard, shard_session_maker(shard)))
+
+    moved = 0
+    for shard, session_maker in sources:
+        async with session_maker() as db:
+            moved += await _drain(db, shard)
+
+    if moved:
+        logger.info(f"Moved {moved} listening sessions into their shards")
+    return moved
+
+
+async def _drain(source: AsyncSession, shard: Optional[int]) -> int:
+    """Move the users of one database that belong to another shard."""
+    moved = 0
+    users: set[str] = set()
+    for table in await session_tables(source):
+        result = await source.execute(select(table.c.user_id).distinct())
+        misplaced = sorted(user_id for user_id in result.scalars() if shard_for(user_id) != shard)
+        users.update(misplaced)
+
+        for user_id in misplaced:
+            async with shard_session_maker(shard_for(user_id))() as target:
+                moved += await _move_user(source, target, table, user_id)
+
+    for model in (ListeningDaySketch, ListeningEntitySummary):
+        result = await source.execute(select(model.user_id).distinct())
+        users.update(user_id for user_id in result.scalars() if shard_for(user_id) != shard)
+
+    # Sketches and summaries are rebuilt from the moved sessions
+    for user_id in sorted(users):
+        await source.execute(delete(ListeningDaySketch).where(ListeningDaySketch.user_id == user_id))
+        await source.execute(delete(ListeningEntitySummary).where(ListeningEntitySummary.user_id == user_id))
+        await source.commit()
+        async with shard_session_maker(shard_for(user_id))() as target:
+            await rebuild_day_sketches(target, user_id)
+            await rebuild_entity_summaries(target, user_id)
+    return moved
+
+
+async def _move_user(source: AsyncSession, target: AsyncSession, table, user_id: str) -> int:
+    moved = 0
+    while True:
+        result = await source.execute(
+            select(*table.c)
+            .where(table.c.user_id == user_id)
+            .order_by(table.c.id)
+            .limit(MIGRATE_BATCH_SIZE)
+        )
+        rows = [dict(row._mapping) for row in result]
+        if not rows:
+            return moved
+
+        last_id = rows[-1]["id"]
+        # Written first: a batch interrupted before the delete is copied
+        # again and skipped by the dedup index
+        await _insert(target, rows)
+        await target.commit()
+        await source.execute(
+            delete(table).where(and_(table.c.user_id == user_id, table.c.id <= last_id))
+        )
+        await source.commit()
+        moved += len(rows)
+
+
+async def _insert(db: AsyncSession, rows: list[dict]) -> None:
+    """Insert sessions with new ids of the target database."""
+    if not settings.session_partitioning:
+        for row in rows:
+            del row["id"]
+        await db.execute(dialect_insert(db, ListeningSession.__table__).on_conflict_do_nothing(), rows)
+        return
+
+    first = await allocate_ids(db, len(rows))
+    by_month: dict[str, list[dict]] = {}
+    for offset, row in enumerate(rows):
+        row["id"] = first + offset
+        by_month.setdefault(month_key(row["played_at"]), []).append(row)
+    for month, month_rows in by_month.items():
+        table = await ensure_partition(db, month)
+        await db.execute(dialect_insert(db, table).on_conflict_do_nothing(), month_rows)
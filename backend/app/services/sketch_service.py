@@ -0,0 +1,277 @@
+"""Maintenance and querying of per-day listening sketches."""
+
+import json
+import logging
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from sqlalchemy import select, delete, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import data_session_makers, dialect_insert, holds_user
+from app.models.day_sketch import ListeningDaySketch
+from app.services.archive_service import get_archive
+from app.services.partitions import session_tables, sessions_source
+from app.services.sketches import HyperLogLog, SpaceSaving
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+class DaySketchWindow:
+    """Sketches of several days merged into one window."""
+
+    def __init__(self):
+        self.days: dict[str, tuple[int, int]] = {}  # day -> (plays, time_ms)
+        self.hourly = [[0, 0] for _ in range(24)]
+        self.tracks_hll = HyperLogLog()
+        self.artists_hll = HyperLogLog()
+        self.albums_hll = HyperLogLog()
+        self._top_tracks: list[SpaceSaving] = []
+        self._top_artists: list[SpaceSaving] = []
+        self._top_albums: list[SpaceSaving] = []
+
+    @property
+    def top_tracks(self) -> SpaceSaving:
+        return SpaceSaving.merge_all(self._top_tracks)
+
+    @property
+    def top_artists(self) -> SpaceSaving:
+        return SpaceSaving.merge_all(self._top_artists)
+
+    @property
+    def top_albums(self) -> SpaceSaving:
+        return SpaceSaving.merge_all(self._top_albums)
+
+    @property
+    def plays(self) -> int:
+        return sum(plays for plays, _ in self.days.values())
+
+    @property
+    def time_ms(self) -> int:
+        return sum(time_ms for _, time_ms in self.days.values())
+
+    def add_row(self, row: ListeningDaySketch) -> None:
+        """Merge one stored day into the window."""
+        self.days[row.day] = (row.plays, row.time_ms)
+
+        if row.hourly:
+            for hour, (plays, time_ms) in enumerate(json.loads(row.hourly)):
+                self.hourly[hour][0] += plays
+                self.hourly[hour][1] += time_ms
+
+        for sketch, data in (
+            (self.tracks_hll, row.tracks_hll),
+            (self.artists_hll, row.artists_hll),
+            (self.albums_hll, row.albums_hll),
+        ):
+            if data:
+                sketch.merge_bytes(data)
+
+        # Top-K summaries are merged in one pass when first read
+        self._top_tracks.append(SpaceSaving.from_json(row.top_tracks))
+        self._top_artists.append(SpaceSaving.from_json(row.top_artists))
+        self._top_albums.append(SpaceSaving.from_json(row.top_albums))
+
+
+def _fold_into_row(row: ListeningDaySketch, sessions: list) -> None:
+    """Add sessions (all from the row's user and day) to a stored day."""
+    hourly = json.loads(row.hourly) if row.hourly else [[0, 0] for _ in range(24)]
+    tracks_hll = HyperLogLog.from_bytes(row.tracks_hll)
+    artists_hll = HyperLogLog.from_bytes(row.artists_hll)
+    albums_hll = HyperLogLog.from_bytes(row.albums_hll)
+    top_tracks = SpaceSaving.from_json(row.top_tracks)
+    top_artists = SpaceSaving.from_json(row.top_artists)
+    top_albums = SpaceSaving.from_json(row.top_albums)
+
+    plays = row.plays or 0
+    time_ms = row.time_ms or 0
+
+    for s in sessions:
+        plays += 1
+        time_ms += s.duration_ms
+        hourly[s.played_at.hour][0] += 1
+        hourly[s.played_at.hour][1] += s.duration_ms
+
+        tracks_hll.add(s.track_id)
+        artists_hll.add(s.artist_name)
+        albums_hll.add(s.album_name)
+
+        top_tracks.add(s.track_id, s.duration_ms, [s.track_name, s.artist_name, s.album_name])
+        top_artists.add(s.artist_name, s.duration_ms)
+        top_albums.add(s.album_name, s.duration_ms, s.artist_name)
+
+    row.plays = plays
+    row.time_ms = time_ms
+    row.hourly = json.dumps(hourly)
+    row.tracks_hll = tracks_hll.to_bytes()
+    row.artists_hll = artists_hll.to_bytes()
+    row.albums_hll = albums_hll.to_bytes()
+    row.top_tracks = top_tracks.to_json()
+    row.top_artists = top_artists.to_json()
+    row.top_albums = top_albums.to_json()
+
+
+async def update_day_sketches(db: AsyncSession, sessions: Iterable) -> None:
+    """
+    Fold newly recorded sessions into their day sketches.
+
+    Accepts ORM objects or rows with the ListeningSession columns. The
+    caller is responsible for committing.
+
+    Rows are read with FOR UPDATE, and missing days are created with
+    INSERT ... ON CONFLICT DO NOTHING and read again, so concurrent writers
+    of the same day (scheduler, /record, an import) queue on the row
+    instead of losing an update or failing on the unique index. SQLite has
+    no row locks; there the play inserted before this holds the database
+    write lock.
+    """
+    groups: dict[str, dict[str, list]] = defaultdict(lambda: defaultdict(list))
+    for s in sessions:
+        groups[s.user_id][s.played_at.strftime("%Y-%m-%d")].append(s)
+
+    table = ListeningDaySketch.__table__
+    for user_id, by_day in groups.items():
+        rows = await _lock_day_sketches(db, user_id, list(by_day))
+        missing = [day for day in by_day if day not in rows]
+        if missing:
+            await db.execute(
+                dialect_insert(db, table)
+                .values([{"user_id": user_id, "day": day, "plays": 0, "time_ms": 0} for day in missing])
+                .on_conflict_do_nothing(index_elements=["user_id", "day"])
+            )
+            rows.update(await _lock_day_sketches(db, user_id, missing))
+
+        for day, row in rows.items():
+            _fold_into_row(row, by_day[day])
+
+
+async def _lock_day_sketches(db: AsyncSession, user_id: str, days: list[str]) -> dict[str, ListeningDaySketch]:
+    query = (
+        select(ListeningDaySketch)
+        .where(
+            and_(
+                ListeningDaySketch.user_id == user_id,
+                ListeningDaySketch.day.in_(days),
+            )
+        )
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    result = await db.execute(query)
+    return {row.day: row for row in result.scalars().all()}
+
+
+async def load_sketch_window(
+    db: AsyncSession,
+    user_id: str,
+    start_day: Optional[str] = None,
+) -> DaySketchWindow:
+    """Merge all stored days from start_day (inclusive, YYYY-MM-DD) onwards."""
+    conditions = [ListeningDaySketch.user_id == user_id]
+    if start_day:
+        conditions.append(ListeningDaySketch.day >= start_day)
+
+    query = select(ListeningDaySketch).where(and_(*conditions)).order_by(ListeningDaySketch.day)
+    result = await db.execute(query)
+
+    window = DaySketchWindow()
+    for row in result.scalars().all():
+        window.add_row(row)
+    return window
+
+
+async def load_day_totals(
+    db: AsyncSession,
+    user_id: str,
+    start_day: str,
+    end_day: str,
+) -> int:
+    """Sum listening time over days in [start_day, end_day)."""
+    query = select(ListeningDaySketch.time_ms).where(
+        and_(
+            ListeningDaySketch.user_id == user_id,
+            ListeningDaySketch.day >= start_day,
+            ListeningDaySketch.day < end_day,
+        )
+    )
+    result = await db.execute(query)
+    return sum(row[0] for row in result.fetchall())
+
+
+async def rebuild_day_sketches(db: AsyncSession, user_id: Optional[str] = None) -> int:
+    """Rebuild day sketches from listening_sessions and the archive. Returns sessions folded."""
+    if user_id:
+        await db.execute(delete(ListeningDaySketch).where(ListeningDaySketch.user_id == user_id))
+    else:
+        await db.execute(delete(ListeningDaySketch))
+
+    folded = 0
+    for table in await session_tables(db):
+        last_id = 0
+        while True:
+            conditions = [table.c.id > last_id]
+            if user_id:
+                conditions.append(table.c.user_id == user_id)
+
+            query = (
+                select(*table.c)
+                .where(and_(*conditions))
+                .order_by(table.c.id)
+                .limit(BACKFILL_BATCH_SIZE)
+            )
+            result = await db.execute(query)
+            batch = result.all()
+            if not batch:
+                break
+
+            await update_day_sketches(db, batch)
+            await db.commit()
+
+            folded += len(batch)
+            last_id = batch[-1].id
+
+    archive = get_archive()
+    for archived_user in [user_id] if user_id else [u for u in archive.users() if holds_user(db, u)]:
+        for plays in archive.plays(archived_user):
+            await update_day_sketches(db, plays)
+            await db.commit()
+            folded += len(plays)
+
+    return folded
+
+
+async def backfill_day_sketches() -> None:
+    """Build sketches for existing history if none have been stored yet."""
+    for session_maker in data_session_makers():
+        async with session_maker() as db:
+            has_sketches = await db.execute(select(ListeningDaySketch.id).limit(1))
+            if has_sketches.first() is not None:
+                continue
+
+            sessions = await sessions_source(db)
+            has_sessions = await db.execute(select(sessions.c.id).limit(1))
+            if has_sessions.first() is None:
+                continue
+
+            folded = await rebuild_day_sketches(db)
+            logger.info(f"Built day sketches from {folded} existing sessions")
+
+
+async def load_hourly_profiles(db: AsyncSession, start_day: str) -> dict[str, list[int]]:
+    """Plays per UTC hour of every user with sketches from start_day onwards."""
+    query = select(ListeningDaySketch.user_id, ListeningDaySketch.hourly).where(
+        and_(
+            ListeningDaySketch.day >= start_day,
+            ListeningDaySketch.hourly.is_not(None),
+        )
+    )
+    result = await db.stream(query.execution_options(yield_per=BACKFILL_BATCH_SIZE))
+
+    profiles: dict[str, list[int]] = defaultdict(lambda: [0] * 24)
+    async for user_id, hourly in result:
+        counts = profiles[user_id]
+        for hour, (plays, _) in enumerate(json.loads(hourly)):
+            counts[hour] += plays
+    return dict(profiles)
@@ -0,0 +1,198 @@
+"""
+Mergeable sketches for approximate listening statistics.
+
+Two structures are kept per user and per day and merged on demand for any
+window of days:
+
+HyperLogLog (distinct counts)
+    ``HLL_PRECISION`` = 11 gives m = 2048 one-byte registers. The relative
+    standard error of the estimate is 1.04 / sqrt(m) ~= 2.3%, so ~95% of
+    estimates are within +-4.6% of the true distinct count. Small
+    cardinalities (below 2.5 * m) use linear counting and are practically
+    exact. Merging is a register-wise max and loses no accuracy.
+
+Space-Saving (top-K)
+    Each summary monitors at most ``capacity`` keys. For every reported key
+    ``count`` is an upper bound and ``count - error`` a lower bound of the
+    true count. Any key that is not reported has a true count of at most
+    ``floor``. A single day's summary has ``floor = error = 0`` (exact) as
+    long as the day has no more than ``capacity`` distinct keys; otherwise
+    ``floor <= plays / capacity``. Merging sums the bounds, so for a window
+    ``floor <= N / capacity`` plus whatever was truncated at merge time.
+"""
+
+import hashlib
+import json
+import math
+import struct
+import zlib
+from typing import Any, Optional
+
+HLL_PRECISION = 11
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+TOP_K_CAPACITY = 200
+
+_DENSE = b"D"
+_SPARSE = b"S"
+
+
+def _hash64(value: str) -> int:
+    """Stable 64-bit hash of a string (Python's hash() is salted per process)."""
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter with a compact serialized form."""
+
+    def __init__(self, registers: Optional[bytearray] = None):
+        self.registers = registers if registers is not None else bytearray(HLL_REGISTERS)
+
+    def add(self, value: str) -> None:
+        """Add a value to the sketch."""
+        x = _hash64(value)
+        index = x >> (64 - HLL_PRECISION)
+        rest = x & ((1 << (64 - HLL_PRECISION)) - 1)
+        rank = (64 - HLL_PRECISION) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        """Merge another sketch into this one."""
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def merge_bytes(self, data: bytes) -> None:
+        """Merge a serialized sketch without materializing it first."""
+        raw = zlib.decompress(data)
+        if raw[:1] == _SPARSE:
+            registers = self.registers
+            for index, rank in struct.iter_unpack(">HB", raw[1:]):
+                if rank > registers[index]:
+                    registers[index] = rank
+        else:
+            self.registers = bytearray(map(max, self.registers, raw[1:]))
+
+    def estimate(self) -> int:
+        """Estimate the number of distinct values added."""
+        m = HLL_REGISTERS
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is much more accurate for small cardinalities
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+    def to_bytes(self) -> bytes:
+        """Serialize, using a sparse encoding while few registers are set."""
+        used = [(i, r) for i, r in enumerate(self.registers) if r]
+        if len(used) * 3 < HLL_REGISTERS:
+            raw = _SPARSE + b"".join(struct.pack(">HB", i, r) for i, r in used)
+        else:
+            raw = _DENSE + bytes(self.registers)
+        return zlib.compress(raw)
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> "HyperLogLog":
+        """Deserialize a sketch produced by to_bytes."""
+        sketch = cls()
+        if data:
+            sketch.merge_bytes(data)
+        return sketch
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-K summary.
+
+    Each monitored key maps to ``[count, error, weight, label]`` where
+    ``weight`` accumulates listening time and ``label`` holds display data
+    (track/artist names) for the key.
+    """
+
+    def __init__(self, capacity: int = TOP_K_CAPACITY):
+        self.capacity = capacity
+        self.items: dict[str, list] = {}
+        self.floor = 0
+
+    def add(self, key: str, weight: int = 0, label: Any = None) -> None:
+        """Count one occurrence of a key."""
+        entry = self.items.get(key)
+        if entry is not None:
+            entry[0] += 1
+            entry[2] += weight
+            entry[3] = label
+            return
+
+        if len(self.items) < self.capacity:
+            self.items[key] = [1, 0, weight, label]
+            return
+
+        # Replace the least frequent key; the newcomer inherits its count
+        victim = min(self.items, key=lambda k: self.items[k][0])
+        min_count = self.items.pop(victim)[0]
+        self.items[key] = [min_count + 1, min_count, weight, label]
+        self.floor = min_count + 1
+
+    def merge(self, other: "SpaceSaving") -> None:
+        """Merge another summary into this one, keeping ``capacity`` keys."""
+        merged = SpaceSaving.merge_all([self, other], self.capacity)
+        self.items = merged.items
+        self.floor = merged.floor
+
+    @classmethod
+    def merge_all(cls, summaries: list["SpaceSaving"], capacity: int = TOP_K_CAPACITY) -> "SpaceSaving":
+        """
+        Merge many summaries at once.
+
+        A key missing from a summary may still have up to that summary's
+        ``floor`` occurrences there, which is added to both its count and
+        its error. Truncation to ``capacity`` happens once, at the end.
+        """
+        combined: dict[str, list] = {}
+        total_floor = 0
+        for summary in summaries:
+            total_floor += summary.floor
+            for key, (count, error, weight, label) in summary.items.items():
+                entry = combined.get(key)
+                if entry is None:
+                    # [count, error, weight, label, floors of summaries holding the key]
+                    combined[key] = [count, error, weight, label, summary.floor]
+                else:
+                    entry[0] += count
+                    entry[1] += error
+                    entry[2] += weight
+                    entry[3] = label if label is not None else entry[3]
+                    entry[4] += summary.floor
+
+        result = cls(capacity)
+        result.floor = total_floor
+        for key, (count, error, weight, label, present_floor) in combined.items():
+            missing_floor = total_floor - present_floor
+            result.items[key] = [count + missing_floor, error + missing_floor, weight, label]
+
+        if len(result.items) > capacity:
+            ranked = sorted(result.items.items(), key=lambda kv: kv[1][0], reverse=True)
+            result.floor = max(result.floor, ranked[capacity][1][0])
+            result.items = dict(ranked[:capacity])
+
+        return result
+
+    def top(self, k: int) -> list[tuple[str, list]]:
+        """Return the k keys with the highest estimated counts."""
+        return sorted(self.items.items(), key=lambda kv: kv[1][0], reverse=True)[:k]
+
+    def to_json(self) -> str:
+        """Serialize to a JSON string."""
+        return json.dumps({"capacity": self.capacity, "floor": self.floor, "items": self.items})
+
+    @classmethod
+    def from_json(cls, data: Optional[str]) -> "SpaceSaving":
+        """Deserialize a summary produced by to_json."""
+        if not data:
+            return cls()
+        raw = json.loads(data)
+        summary = cls(raw["capacity"])
+        summary.floor = raw["floor"]
+        summary.items = raw["items"]
+        return summary
@@ -5,6 +5,7 @@ from collections import Counter
 import httpx
 
 from app.config import get_settings
+from app.services.request_timing import span
 from app.schemas.spotify import (
     SpotifyUser,
     SpotifyArtist,
@@ -32,14 +33,15 @@ class SpotifyService:
     
     async def _get(self, endpoint: str, params: Optional[dict] = None) -> dict:
         """Make GET request to Spotify API."""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.base_url}/{endpoint}",
-                headers=self.headers,
-                params=params,
-            )
-            response.raise_for_status()
-            return response.json()
+        with span("spotify"):
+            async with httpx.AsyncClient() as client:
+                response = await client.get(
+                    f"{self.base_url}/{endpoint}",
+                    headers=self.headers,
+                    params=params,
+                )
+        response.raise_for_status()
+        return response.json()
     
     async def get_current_user(self) -> SpotifyUser:
         """Get current user profile."""
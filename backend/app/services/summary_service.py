@@ -0,0 +1,150 @@
+"""Maintenance of per-user lifetime entity summaries."""
+
+import logging
+from typing import Iterable, Optional
+
+from sqlalchemy import select, case, func, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import data_session_makers, dialect_insert, holds_user
+from app.models.entity_summary import ListeningEntitySummary
+from app.services.archive_service import get_archive
+from app.services.partitions import sessions_source
+
+logger = logging.getLogger(__name__)
+
+
+def _entity_fields(s) -> list[tuple[str, str, str, object]]:
+    """(entity_type, entity_key, name, artist_name) for each entity of a session."""
+    return [
+        ("track", s.track_id, s.track_name, s.artist_name),
+        ("artist", s.artist_name, s.artist_name, None),
+        ("album", s.album_name, s.album_name, s.artist_name),
+    ]
+
+
+async def update_entity_summaries(db: AsyncSession, sessions: Iterable) -> None:
+    """
+    Fold newly recorded sessions into the lifetime summaries.
+
+    Sessions are pre-aggregated per entity, then written with one upsert
+    statement. Accepts ORM objects or rows with the ListeningSession
+    columns. The caller is responsible for committing.
+    """
+    totals: dict[tuple, dict] = {}
+    for s in sessions:
+        for entity_type, key, name, artist_name in _entity_fields(s):
+            entry = totals.get((s.user_id, entity_type, key))
+            if entry is None:
+                totals[(s.user_id, entity_type, key)] = {
+                    "user_id": s.user_id,
+                    "entity_type": entity_type,
+                    "entity_key": key,
+                    "name": name,
+                    "artist_name": artist_name,
+                    "first_played_at": s.played_at,
+                    "last_played_at": s.played_at,
+                    "play_count": 1,
+                    "total_ms": s.duration_ms,
+                }
+                continue
+            entry["first_played_at"] = min(entry["first_played_at"], s.played_at)
+            entry["last_played_at"] = max(entry["last_played_at"], s.played_at)
+            entry["play_count"] += 1
+            entry["total_ms"] += s.duration_ms
+
+    if not totals:
+        return
+
+    table = ListeningEntitySummary.__table__
+    stmt = dialect_insert(db, table)
+    excluded = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.entity_type, table.c.entity_key],
+        set_={
+            "name": excluded.name,
+            "artist_name": excluded.artist_name,
+            "first_played_at": case(
+                (excluded.first_played_at < table.c.first_played_at, excluded.first_played_at),
+                else_=table.c.first_played_at,
+            ),
+            "last_played_at": case(
+                (excluded.last_played_at > table.c.last_played_at, excluded.last_played_at),
+                else_=table.c.last_played_at,
+            ),
+            "play_count": table.c.play_count + excluded.play_count,
+            "total_ms": table.c.total_ms + excluded.total_ms,
+        },
+    )
+    await db.execute(stmt, list(totals.values()))
+
+
+async def rebuild_entity_summaries(db: AsyncSession, user_id: Optional[str] = None) -> None:
+    """Rebuild all (or one user's) summaries from listening_sessions (in SQL) and the archive."""
+    summaries = ListeningEntitySummary.__table__
+    if user_id:
+        await db.execute(summaries.delete().where(summaries.c.user_id == user_id))
+    else:
+        await db.execute(summaries.delete())
+
+    sessions = await sessions_source(db)
+    columns = {
+        "track": (sessions.c.track_id, sessions.c.track_name, sessions.c.artist_name),
+        "artist": (sessions.c.artist_name, sessions.c.artist_name, None),
+        "album": (sessions.c.album_name, sessions.c.album_name, sessions.c.artist_name),
+    }
+
+    for entity_type, (key, name, artist_name) in columns.items():
+        source = select(
+            sessions.c.user_id,
+            literal(entity_type),
+            key,
+            func.max(name),
+            func.max(artist_name) if artist_name is not None else literal(None),
+            func.min(sessions.c.played_at),
+            func.max(sessions.c.played_at),
+            func.count(),
+            func.sum(sessions.c.duration_ms),
+        ).group_by(sessions.c.user_id, key)
+        if user_id:
+            source = source.where(sessions.c.user_id == user_id)
+
+        stmt = summaries.insert().from_select(
+            [
+                "user_id",
+                "entity_type",
+                "entity_key",
+                "name",
+                "artist_name",
+                "first_played_at",
+                "last_played_at",
+                "play_count",
+                "total_ms",
+            ],
+            source,
+        )
+        await db.execute(stmt)
+
+    archive = get_archive()
+    for archived_user in [user_id] if user_id else [u for u in archive.users() if holds_user(db, u)]:
+        for plays in archive.plays(archived_user):
+            await update_entity_summaries(db, plays)
+
+    await db.commit()
+
+
+async def backfill_entity_summaries() -> None:
+    """Build summaries for existing history if none have been stored yet."""
+    for session_maker in data_session_makers():
+        async with session_maker() as db:
+            has_summaries = await db.execute(select(ListeningEntitySummary.id).limit(1))
+            if has_summaries.first() is not None:
+                continue
+
+            sessions = await sessions_source(db)
+            has_sessions = await db.execute(select(sessions.c.id).limit(1))
+            if has_sessions.first() is None:
+                continue
+
+            await rebuild_entity_summaries(db)
+            logger.info("Built entity summaries from existing sessions")
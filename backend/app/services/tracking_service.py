@@ -1,15 +1,24 @@
 """Tracking service for custom listening statistics."""
 
-from datetime import datetime, timedelta
-from typing import Optional
-from collections import Counter, defaultdict
-from sqlalchemy import select, func, and_
-from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import base64
+import bisect
+import heapq
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+from sqlalchemy import select, func, and_, exists, literal, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from app.models.listening_session import ListeningSession
+from app.config import get_settings
+from app.database import dialect_insert
+from app.models.listening_session import ListeningSession, play_bucket
+from app.models.entity_summary import ListeningEntitySummary
 from app.schemas.tracking import (
     RecordPlayRequest,
     RecordPlayResponse,
+    RecordPlayBatchItem,
+    RecordPlayBatchResponse,
     TrackingStats,
     TrackingHistory,
     ListeningSessionResponse,
@@ -24,44 +33,237 @@ from app.schemas.tracking import (
     ListeningTrend,
     ArtistDiscovery,
     MonthlyComparison,
+    ForgottenFavorite,
 )
+from app.services.sketch_service import (
+    update_day_sketches,
+    load_sketch_window,
+    load_day_totals,
+)
+from app.services.summary_service import update_entity_summaries
+from app.services.aggregation import (
+    DayRuns,
+    run_fold,
+    stream_fold,
+    fold_stats,
+    fold_analytics,
+    fold_analytics_hours,
+    fold_month,
+    fold_months,
+)
+from app.services.archive_service import get_archive
+from app.services.partitions import allocate_ids, ensure_partition, month_key, read_session_tables, union_source
+
+settings = get_settings()
+
+WEEKDAY_NAMES = ["Poniedziałek", "Wtorek", "Środa", "Czwartek", "Piątek", "Sobota", "Niedziela"]
+
+
+# The same track again within this window counts as the same play
+DUPLICATE_WINDOW = timedelta(minutes=3)
+
+# Columns a play provides; played_bucket is derived from played_at
+PLAY_COLUMNS = ("user_id", "track_id", "track_name", "artist_name", "album_name", "duration_ms", "played_at")
+
+
+async def update_rollups(db: AsyncSession, sessions: list) -> None:
+    """Fold newly recorded sessions into day sketches and entity summaries."""
+    await update_day_sketches(db, sessions)
+    await update_entity_summaries(db, sessions)
+
+
+async def find_duplicate_plays(db: AsyncSession, user_id: str, plays: list) -> list[bool]:
+    """
+    Flag plays that repeat a stored play, or an earlier play in the list.
+    
+    Plays are anything with track_id and played_at. All stored plays around
+    the list are fetched with one range query, so the cost doesn't grow
+    with the number of plays checked. Returns one flag per play, in order.
+    """
+    if not plays:
+        return []
+    
+    order = sorted(range(len(plays)), key=lambda i: plays[i].played_at)
+    first = plays[order[0]].played_at
+    last = plays[order[-1]].played_at
+    
+    async def read_stored(tables):
+        source = union_source(tables)
+        query = select(source.c.track_id, source.c.played_at).where(
+            and_(
+                source.c.user_id == user_id,
+                source.c.played_at >= first - DUPLICATE_WINDOW,
+                source.c.played_at <= last + DUPLICATE_WINDOW,
+            )
+        )
+        return (await db.execute(query)).all()
+    
+    rows = await read_session_tables(
+        db, read_stored, first - DUPLICATE_WINDOW, last + DUPLICATE_WINDOW + timedelta(microseconds=1)
+    )
+    seen: dict[str, list[datetime]] = defaultdict(list)
+    for track_id, played_at in rows:
+        seen[track_id].append(played_at)
+    # Imports of old history can overlap archived months
+    for rows in get_archive().read(
+        user_id,
+        ("track_id", "played_at"),
+        first - DUPLICATE_WINDOW,
+        last + DUPLICATE_WINDOW + timedelta(microseconds=1),
+    ):
+        for track_id, played_at in rows:
+            seen[track_id].append(played_at)
+    for times in seen.values():
+        times.sort()
+    
+    duplicates = [False] * len(plays)
+    for i in order:
+        play = plays[i]
+        times = seen[play.track_id]
+        j = bisect.bisect_left(times, play.played_at - DUPLICATE_WINDOW)
+        if j < len(times) and times[j] <= play.played_at + DUPLICATE_WINDOW:
+            duplicates[i] = True
+        else:
+            bisect.insort(times, play.played_at)
+    
+    return duplicates
+
+
+async def insert_play_if_new(db: AsyncSession, play: ListeningSession) -> Optional[int]:
+    """
+    Insert a play unless the same track was recorded within 3 minutes.
+    
+    The duplicate check and the insert are one INSERT ... SELECT ... WHERE
+    NOT EXISTS statement, and the unique (user, track, 3-minute bucket) index
+    makes concurrent writers of the same play (frontend and scheduler)
+    resolve to a single row via ON CONFLICT DO NOTHING. Returns the new id
+    (also set on ``play``), or None for a duplicate. The caller commits.
+    
+    With session partitioning the play goes to its month's table, and the
+    check also covers the neighbouring month near a boundary.
+    """
+    table = ListeningSession.__table__
+    play.played_bucket = play_bucket(play.played_at)
+    columns = PLAY_COLUMNS + ("played_bucket",)
+    values = [getattr(play, name) for name in columns]
+    
+    if settings.session_partitioning:
+        table = await ensure_partition(db, month_key(play.played_at))
+        columns = ("id",) + columns
+        values = [await allocate_ids(db, 1)] + values
+    
+    async def insert(tables):
+        stored = union_source(tables)
+        recent = select(stored.c.id).where(
+            and_(
+                stored.c.user_id == play.user_id,
+                stored.c.track_id == play.track_id,
+                stored.c.played_at >= play.played_at - DUPLICATE_WINDOW,
+                stored.c.played_at <= play.played_at + DUPLICATE_WINDOW,
+            )
+        )
+        source = select(
+            *(literal(value, type_=table.c[name].type) for name, value in zip(columns, values))
+        ).where(~exists(recent))
+        
+        stmt = (
+            dialect_insert(db, table)
+            .from_select(columns, source)
+            .on_conflict_do_nothing(index_elements=[table.c.user_id, table.c.track_id, table.c.played_bucket])
+            .returning(table.c.id)
+        )
+        return (await db.execute(stmt)).scalar_one_or_none()
+    
+    play.id = await read_session_tables(
+        db,
+        insert,
+        play.played_at - DUPLICATE_WINDOW,
+        play.played_at + DUPLICATE_WINDOW + timedelta(microseconds=1),
+    )
+    return play.id
+
+
+async def insert_new_plays(db: AsyncSession, plays: list) -> list[Optional[int]]:
+    """
+    Bulk insert plays that were already checked with find_duplicate_plays.
+    
+    A play that another writer stored in the meantime hits the unique
+    bucket index and is skipped. Returns the new id of each play, or None
+    for skipped ones. The caller commits.
+    
+    With session partitioning each month's plays go to its own table, with
+    ids reserved up front.
+    """
+    if not plays:
+        return []
+    
+    rows = [
+        {**{name: getattr(play, name) for name in PLAY_COLUMNS}, "played_bucket": play_bucket(play.played_at)}
+        for play in plays
+    ]
+    groups = {None: rows}
+    if settings.session_partitioning:
+        first_id = await allocate_ids(db, len(rows))
+        groups = defaultdict(list)
+        for i, row in enumerate(rows):
+            row["id"] = first_id + i
+            groups[month_key(row["played_at"])].append(row)
+    
+    ids = {}
+    for month, group in groups.items():
+        table = ListeningSession.__table__ if month is None else await ensure_partition(db, month)
+        stmt = (
+            dialect_insert(db, table)
+            .on_conflict_do_nothing(index_elements=[table.c.user_id, table.c.track_id, table.c.played_bucket])
+            .returning(table.c.id, table.c.user_id, table.c.track_id, table.c.played_bucket)
+        )
+        result = await db.execute(stmt, group)
+        ids.update({(user_id, track_id, bucket): id_ for id_, user_id, track_id, bucket in result})
+    
+    return [ids.get((row["user_id"], row["track_id"], row["played_bucket"])) for row in rows]
 
 
 class TrackingService:
     """Service for tracking and analyzing listening history."""
     
-    def __init__(self, db: AsyncSession, user_id: str):
+    def __init__(
+        self,
+        db: AsyncSession,
+        user_id: str,
+        session_factory: Optional[async_sessionmaker] = None,
+    ):
         self.db = db
         self.user_id = user_id
+        # Optional factory for extra read-only sessions, used to run
+        # independent queries concurrently on separate pooled connections
+        self.session_factory = session_factory
     
-    async def record_play(self, request: RecordPlayRequest) -> RecordPlayResponse:
+    async def _gather(self, *queries: Callable[[AsyncSession], Awaitable]) -> list:
         """
-        Record a play session.
+        Run independent read queries and return their results in order.
         
-        Prevents duplicates by checking if the same track was played
-        in the last 3 minutes.
+        With a session factory every query gets its own session (and pooled
+        connection) and all of them run at the same time, so the total wait
+        is about the slowest query. Each session reads its own snapshot, which
+        is fine for these independent aggregates. Without a factory the
+        queries share self.db one after another.
         """
-        # Check for recent duplicate
-        three_minutes_ago = datetime.utcnow() - timedelta(minutes=3)
+        if self.session_factory is None:
+            return [await query(self.db) for query in queries]
         
-        query = select(ListeningSession).where(
-            and_(
-                ListeningSession.user_id == self.user_id,
-                ListeningSession.track_id == request.track_id,
-                ListeningSession.played_at >= three_minutes_ago,
-            )
-        )
+        async def run(query):
+            async with self.session_factory() as db:
+                return await query(db)
         
-        result = await self.db.execute(query)
-        existing = result.scalar_one_or_none()
-        
-        if existing:
-            return RecordPlayResponse(
-                message="Duplicate play detected, skipped",
-                recorded=False,
-            )
+        return list(await asyncio.gather(*(run(query) for query in queries)))
+    
+    async def record_play(self, request: RecordPlayRequest) -> RecordPlayResponse:
+        """
+        Record a play session.
         
-        # Create new session
+        Prevents duplicates by checking if the same track was played
+        in the last 3 minutes, atomically with the insert.
+        """
         session = ListeningSession(
             user_id=self.user_id,
             track_id=request.track_id,
@@ -69,11 +271,17 @@ class TrackingService:
             artist_name=request.artist_name,
             album_name=request.album_name,
             duration_ms=request.duration_ms,
+            played_at=datetime.utcnow(),
         )
         
-        self.db.add(session)
+        if await insert_play_if_new(self.db, session) is None:
+            return RecordPlayResponse(
+                message="Duplicate play detected, skipped",
+                recorded=False,
+            )
+        
+        await update_rollups(self.db, [session])
         await self.db.commit()
-        await self.db.refresh(session)
         
         return RecordPlayResponse(
             id=session.id,
@@ -81,115 +289,123 @@ class TrackingService:
             recorded=True,
         )
     
-    async def get_stats(self, days: int = 30) -> TrackingStats:
-        """Get listening statistics for a given period."""
-        if days > 0:
-            start_date = datetime.utcnow() - timedelta(days=days)
-            date_filter = ListeningSession.played_at >= start_date
-        else:
-            date_filter = True  # No filter - all time
+    async def record_plays(self, items: list[RecordPlayBatchItem]) -> RecordPlayBatchResponse:
+        """
+        Record plays queued by a client.
         
-        # Base query for user's sessions
-        base_query = select(ListeningSession).where(
-            and_(
-                ListeningSession.user_id == self.user_id,
-                date_filter,
+        Duplicates (same track within 3 minutes of a stored or earlier play)
+        are found with one query and the rest are inserted in one
+        transaction.
+        """
+        plays = [
+            ListeningSession(
+                user_id=self.user_id,
+                track_id=item.track_id,
+                track_name=item.track_name,
+                artist_name=item.artist_name,
+                album_name=item.album_name,
+                duration_ms=item.duration_ms,
+                played_at=self._to_utc(item.played_at),
             )
+            for item in items
+        ]
+        duplicates = await find_duplicate_plays(self.db, self.user_id, plays)
+        new_plays = [play for play, duplicate in zip(plays, duplicates) if not duplicate]
+        
+        ids = iter(await insert_new_plays(self.db, new_plays))
+        results = []
+        for play, duplicate in zip(plays, duplicates):
+            play.id = None if duplicate else next(ids)
+            if play.id is None:
+                results.append(RecordPlayResponse(message="Duplicate play detected, skipped", recorded=False))
+            else:
+                results.append(RecordPlayResponse(id=play.id, message="Listening session recorded", recorded=True))
+        
+        recorded = [play for play in plays if play.id is not None]
+        if recorded:
+            await update_rollups(self.db, recorded)
+            await self.db.commit()
+        
+        return RecordPlayBatchResponse(
+            results=results,
+            recorded=len(recorded),
+            duplicates=len(plays) - len(recorded),
         )
+    
+    @staticmethod
+    def _to_utc(value: datetime) -> datetime:
+        """Convert to the naive UTC datetimes stored in the database."""
+        if value.tzinfo is None:
+            return value
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    async def get_stats(self, days: int = 30, approx: bool = False) -> TrackingStats:
+        """
+        Get listening statistics for a given period.
         
-        result = await self.db.execute(base_query)
-        sessions = result.scalars().all()
-        
-        if not sessions:
-            return TrackingStats(
-                period_days=days,
-                total_plays=0,
-                total_time_ms=0,
-                total_time_formatted="0m",
-                unique_tracks=0,
-                unique_artists=0,
-                unique_albums=0,
-                average_daily_time_ms=0,
-                average_daily_time_formatted="0m",
-                top_tracks=[],
-                top_artists=[],
-                top_albums=[],
-            )
+        With ``approx`` the result is merged from per-day sketches instead of
+        scanning every session (see app.services.sketches for error bounds).
+        """
+        if approx:
+            return await self._get_approx_stats(days)
+        
+        start_date = datetime.utcnow() - timedelta(days=days) if days > 0 else None
+        
+        partial = await self._fold_window(
+            self.db,
+            fold_stats,
+            ("track_id", "track_name", "artist_name", "album_name", "duration_ms", "played_at"),
+            start_date,
+        )
+        
+        if not partial.plays:
+            return self._empty_stats(days)
         
         # Calculate statistics
-        total_plays = len(sessions)
-        total_time_ms = sum(s.duration_ms for s in sessions)
+        total_plays = partial.plays
+        total_time_ms = partial.time_ms
         
-        unique_tracks = len(set(s.track_id for s in sessions))
-        unique_artists = len(set(s.artist_name for s in sessions))
-        unique_albums = len(set(s.album_name for s in sessions))
+        unique_tracks = len(partial.tracks)
+        unique_artists = len(partial.artists)
+        unique_albums = len(partial.albums)
         
         # Average daily time
-        actual_days = max(days, 1) if days > 0 else max((datetime.utcnow() - min(s.played_at for s in sessions)).days, 1)
+        actual_days = max(days, 1) if days > 0 else max((datetime.utcnow() - partial.first_played_at).days, 1)
         average_daily_time_ms = total_time_ms // actual_days
         
-        # Top tracks
-        track_counts: Counter = Counter()
-        track_times: dict[str, int] = {}
-        track_info: dict[str, dict] = {}
-        
-        for s in sessions:
-            track_counts[s.track_id] += 1
-            track_times[s.track_id] = track_times.get(s.track_id, 0) + s.duration_ms
-            if s.track_id not in track_info:
-                track_info[s.track_id] = {
-                    "track_id": s.track_id,
-                    "track_name": s.track_name,
-                    "artist_name": s.artist_name,
-                    "album_name": s.album_name,
-                }
-        
         top_tracks = [
             TrackPlayCount(
-                **track_info[track_id],
+                track_id=track_id,
+                track_name=track_name,
+                artist_name=artist_name,
+                album_name=album_name,
                 play_count=count,
-                total_time_ms=track_times[track_id],
+                total_time_ms=time_ms,
             )
-            for track_id, count in track_counts.most_common(10)
+            for track_id, (count, time_ms, track_name, artist_name, album_name) in self._most_played(partial.tracks)
         ]
         
-        # Top artists
-        artist_counts: Counter = Counter()
-        artist_times: dict[str, int] = {}
-        
-        for s in sessions:
-            artist_counts[s.artist_name] += 1
-            artist_times[s.artist_name] = artist_times.get(s.artist_name, 0) + s.duration_ms
-        
         top_artists = [
             ArtistPlayCount(
                 artist_name=artist,
                 play_count=count,
-                total_time_ms=artist_times[artist],
+                total_time_ms=time_ms,
             )
-            for artist, count in artist_counts.most_common(10)
+            for artist, (count, time_ms) in self._most_played(partial.artists)
         ]
         
-        # Top albums
-        album_counts: Counter = Counter()
-        album_times: dict[str, int] = {}
-        album_artist: dict[str, str] = {}
-        
-        for s in sessions:
-            album_counts[s.album_name] += 1
-            album_times[s.album_name] = album_times.get(s.album_name, 0) + s.duration_ms
-            album_artist[s.album_name] = s.artist_name
-        
         top_albums = [
             AlbumPlayCount(
                 album_name=album,
-                artist_name=album_artist[album],
+                artist_name=artist,
                 play_count=count,
-                total_time_ms=album_times[album],
+                total_time_ms=time_ms,
             )
-            for album, count in album_counts.most_common(10)
+            for album, (count, time_ms, artist) in self._most_played(partial.albums)
         ]
         
+        await self._add_first_listens(top_tracks, top_artists)
+        
         return TrackingStats(
             period_days=days,
             total_plays=total_plays,
@@ -205,45 +421,204 @@ class TrackingService:
             top_albums=top_albums,
         )
     
+    @staticmethod
+    def _most_played(counts: dict[str, list], n: int = 10) -> list[tuple[str, list]]:
+        """Top n entries of a {key: [count, ...]} mapping, ties in first-seen order."""
+        return heapq.nlargest(n, counts.items(), key=lambda kv: kv[1][0])
+    
+    async def _get_approx_stats(self, days: int) -> TrackingStats:
+        """Get listening statistics from merged day sketches."""
+        window = await load_sketch_window(self.db, self.user_id, self._start_day(days))
+        
+        total_plays = window.plays
+        if not total_plays:
+            return self._empty_stats(days, approximate=True)
+        
+        total_time_ms = window.time_ms
+        
+        # Average daily time
+        if days > 0:
+            actual_days = days
+        else:
+            first_day = date.fromisoformat(min(window.days))
+            actual_days = max((datetime.utcnow().date() - first_day).days, 1)
+        average_daily_time_ms = total_time_ms // actual_days
+        
+        top_tracks = [
+            TrackPlayCount(
+                track_id=track_id,
+                track_name=label[0],
+                artist_name=label[1],
+                album_name=label[2],
+                play_count=count,
+                total_time_ms=time_ms,
+            )
+            for track_id, (count, _, time_ms, label) in window.top_tracks.top(10)
+        ]
+        
+        top_artists = [
+            ArtistPlayCount(
+                artist_name=artist,
+                play_count=count,
+                total_time_ms=time_ms,
+            )
+            for artist, (count, _, time_ms, _) in window.top_artists.top(10)
+        ]
+        
+        top_albums = [
+            AlbumPlayCount(
+                album_name=album,
+                artist_name=artist,
+                play_count=count,
+                total_time_ms=time_ms,
+            )
+            for album, (count, _, time_ms, artist) in window.top_albums.top(10)
+        ]
+        
+        await self._add_first_listens(top_tracks, top_artists)
+        
+        return TrackingStats(
+            period_days=days,
+            total_plays=total_plays,
+            total_time_ms=total_time_ms,
+            total_time_formatted=self._format_time(total_time_ms),
+            unique_tracks=window.tracks_hll.estimate(),
+            unique_artists=window.artists_hll.estimate(),
+            unique_albums=window.albums_hll.estimate(),
+            average_daily_time_ms=average_daily_time_ms,
+            average_daily_time_formatted=self._format_time(average_daily_time_ms),
+            top_tracks=top_tracks,
+            top_artists=top_artists,
+            top_albums=top_albums,
+            approximate=True,
+        )
+    
+    def _empty_stats(self, days: int, approximate: bool = False) -> TrackingStats:
+        """Return empty statistics when no data."""
+        return TrackingStats(
+            period_days=days,
+            total_plays=0,
+            total_time_ms=0,
+            total_time_formatted="0m",
+            unique_tracks=0,
+            unique_artists=0,
+            unique_albums=0,
+            average_daily_time_ms=0,
+            average_daily_time_formatted="0m",
+            top_tracks=[],
+            top_artists=[],
+            top_albums=[],
+            approximate=approximate,
+        )
+    
+    @staticmethod
+    def _start_day(days: int) -> Optional[str]:
+        """First UTC day (YYYY-MM-DD) covered by a sketch window, None for all time."""
+        if days <= 0:
+            return None
+        return (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d")
+    
     async def get_history(
         self,
         days: int = 30,
         limit: int = 100,
         offset: int = 0,
+        cursor: Optional[str] = None,
+        include_total: Optional[bool] = None,
     ) -> TrackingHistory:
-        """Get listening history."""
-        if days > 0:
-            start_date = datetime.utcnow() - timedelta(days=days)
-            date_filter = ListeningSession.played_at >= start_date
-        else:
-            date_filter = True
+        """
+        Get listening history.
         
-        # Count total
-        count_query = select(func.count()).select_from(ListeningSession).where(
-            and_(
-                ListeningSession.user_id == self.user_id,
-                date_filter,
-            )
-        )
-        total_result = await self.db.execute(count_query)
-        total = total_result.scalar() or 0
+        Pages are ordered by (played_at, id) descending. Passing the
+        ``next_cursor`` of the previous page continues right after its last
+        row (keyset pagination on ``idx_user_played``), so deep pages cost
+        the same as the first one. ``offset`` is kept for older clients.
+        The exact total is only counted when ``include_total`` is set; by
+        default only for the first page, not for cursor pages.
         
-        # Get items
-        query = (
-            select(ListeningSession)
-            .where(
-                and_(
-                    ListeningSession.user_id == self.user_id,
-                    date_filter,
+        Archived plays are merged with the live ones by (played_at, id), as
+        imported plays can land in months that were already archived.
+        """
+        start_date = datetime.utcnow() - timedelta(days=days) if days > 0 else None
+        cursor_key = None
+        if cursor:
+            cursor_key = self._decode_cursor(cursor)
+            offset = 0
+        if include_total is None:
+            include_total = cursor is None
+        
+        def conditions_for(table) -> list:
+            conditions = [table.c.user_id == self.user_id]
+            if start_date:
+                conditions.append(table.c.played_at >= start_date)
+            return conditions
+        
+        async def count_live(tables) -> int:
+            count = 0
+            for table in tables:
+                count_query = select(func.count()).select_from(table).where(and_(*conditions_for(table)))
+                count += (await self.db.execute(count_query)).scalar() or 0
+            return count
+        
+        total = None
+        if include_total:
+            total = get_archive().count(self.user_id, start_date)
+            total += await read_session_tables(self.db, count_live, start_date)
+        
+        # Get one extra row to know whether another page exists
+        archive = get_archive()
+        archived = []
+        wanted = limit + 1
+        skip_live = offset
+        if archive.months(self.user_id):
+            # Take the first offset + limit + 1 rows of both streams and
+            # apply the offset after merging them
+            wanted = offset + limit + 1
+            skip_live = 0
+            archived = archive.latest(self.user_id, wanted, cursor_key, start_date)
+        
+        async def read_page(tables) -> list:
+            # Newest partition first; without partitioning this is one table
+            tables = list(reversed(tables))
+            sessions = []
+            skip = skip_live
+            for table in tables:
+                conditions = conditions_for(table)
+                if cursor_key:
+                    # The index on (user_id, played_at) also carries the rowid, so the
+                    # row-value comparison is a range seek rather than a scan.
+                    conditions.append(tuple_(table.c.played_at, table.c.id) < tuple_(*cursor_key))
+                
+                if skip and len(tables) > 1:
+                    # Whole partitions before the offset are skipped by count
+                    count_query = select(func.count()).select_from(table).where(and_(*conditions))
+                    count = (await self.db.execute(count_query)).scalar() or 0
+                    if count <= skip:
+                        skip -= count
+                        continue
+                
+                query = (
+                    select(*table.c)
+                    .where(and_(*conditions))
+                    .order_by(table.c.played_at.desc(), table.c.id.desc())
+                    .offset(skip)
+                    .limit(wanted - len(sessions))
                 )
-            )
-            .order_by(ListeningSession.played_at.desc())
-            .offset(offset)
-            .limit(limit)
-        )
+                skip = 0
+                result = await self.db.execute(query)
+                sessions += result.all()
+                if len(sessions) >= wanted:
+                    break
+            return sessions
         
-        result = await self.db.execute(query)
-        sessions = result.scalars().all()
+        sessions = await read_session_tables(self.db, read_page, start_date)
+        
+        if archived:
+            merged = heapq.merge(sessions, archived, key=lambda s: (s.played_at, s.id), reverse=True)
+            sessions = list(merged)[offset:offset + limit + 1]
+        
+        has_more = len(sessions) > limit
+        sessions = sessions[:limit]
         
         items = [
             ListeningSessionResponse(
@@ -258,13 +633,35 @@ class TrackingService:
             for s in sessions
         ]
         
+        next_cursor = None
+        if has_more and sessions:
+            next_cursor = self._encode_cursor(sessions[-1].played_at, sessions[-1].id)
+        
         return TrackingHistory(
             items=items,
             total=total,
             limit=limit,
             offset=offset,
+            next_cursor=next_cursor,
         )
     
+    @staticmethod
+    def _encode_cursor(played_at: datetime, session_id: int) -> str:
+        """Encode a history position as an opaque cursor."""
+        raw = f"{played_at.isoformat()}|{session_id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+    
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+        """Decode a cursor produced by _encode_cursor. Raises ValueError if invalid."""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode()).decode()
+            played_at, session_id = raw.split("|")
+            return datetime.fromisoformat(played_at), int(session_id)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError("Invalid history cursor") from e
+    
     @staticmethod
     def _format_time(ms: int) -> str:
         """Format milliseconds to human readable string."""
@@ -276,130 +673,62 @@ class TrackingService:
             return f"{hours}h {minutes}m"
         return f"{minutes}m"
     
-    async def get_advanced_analytics(self, days: int = 30) -> AdvancedAnalytics:
-        """Get advanced analytics for a given period."""
+    async def get_advanced_analytics(self, days: int = 30, approx: bool = False) -> AdvancedAnalytics:
+        """
+        Get advanced analytics for a given period.
+        
+        With ``approx`` the result is merged from per-day sketches instead of
+        scanning every session (see app.services.sketches for error bounds).
+        """
+        if approx:
+            return await self._get_approx_analytics(days)
+        
         if days > 0:
             start_date = datetime.utcnow() - timedelta(days=days)
-            date_filter = ListeningSession.played_at >= start_date
+            previous_start = start_date - timedelta(days=days)
         else:
             start_date = None
-            date_filter = True
-        
-        # Get all sessions for period
-        query = select(ListeningSession).where(
-            and_(
-                ListeningSession.user_id == self.user_id,
-                date_filter,
-            )
-        ).order_by(ListeningSession.played_at)
-        
-        result = await self.db.execute(query)
-        sessions = result.scalars().all()
+            previous_start = None
+        
+        # The window scan, both trend sums and the discovery lookups don't
+        # depend on each other
+        partial, current_ms, previous_ms, new_artists, new_tracks_count = await self._gather(
+            lambda db: self._fold_analytics_window(db, start_date),
+            lambda db: self._sum_listening_ms(db, start_date),
+            lambda db: self._sum_listening_ms(db, previous_start, start_date),
+            lambda db: self._get_new_artists(db, days),
+            lambda db: self._count_new_tracks(db, days),
+        )
         
-        if not sessions:
+        # Daily, hourly and weekday buckets, day runs, unique artists and
+        # totals, all folded in one pass over the window
+        total_plays = partial.plays
+        if not total_plays:
             return self._empty_analytics()
         
-        # Daily listening
-        daily_data: dict[str, dict] = defaultdict(lambda: {"plays": 0, "time_ms": 0})
-        hourly_data: dict[int, dict] = defaultdict(lambda: {"plays": 0, "time_ms": 0})
-        weekday_data: dict[int, dict] = defaultdict(lambda: {"plays": 0, "time_ms": 0})
-        
-        all_dates = set()
-        track_first_seen: dict[str, datetime] = {}
-        artist_first_seen: dict[str, datetime] = {}
-        
-        for s in sessions:
-            date_str = s.played_at.strftime("%Y-%m-%d")
-            hour = s.played_at.hour
-            weekday = s.played_at.weekday()
-            
-            daily_data[date_str]["plays"] += 1
-            daily_data[date_str]["time_ms"] += s.duration_ms
-            
-            hourly_data[hour]["plays"] += 1
-            hourly_data[hour]["time_ms"] += s.duration_ms
-            
-            weekday_data[weekday]["plays"] += 1
-            weekday_data[weekday]["time_ms"] += s.duration_ms
-            
-            all_dates.add(s.played_at.date())
-            
-            # Track first seen dates
-            if s.track_id not in track_first_seen:
-                track_first_seen[s.track_id] = s.played_at
-            if s.artist_name not in artist_first_seen:
-                artist_first_seen[s.artist_name] = s.played_at
-        
         # Build daily listening list
-        daily_listening = []
-        if start_date:
-            current = start_date.date()
-            end = datetime.utcnow().date()
-        else:
-            current = min(s.played_at.date() for s in sessions)
-            end = datetime.utcnow().date()
-        
-        while current <= end:
-            date_str = current.strftime("%Y-%m-%d")
-            data = daily_data.get(date_str, {"plays": 0, "time_ms": 0})
-            daily_listening.append(DailyListening(
-                date=date_str,
-                plays=data["plays"],
-                time_ms=data["time_ms"],
-                time_formatted=self._format_time(data["time_ms"]),
-            ))
-            current += timedelta(days=1)
-        
-        # Hourly distribution
-        total_plays = len(sessions)
-        hourly_distribution = []
-        for hour in range(24):
-            data = hourly_data.get(hour, {"plays": 0, "time_ms": 0})
-            hourly_distribution.append(HourlyDistribution(
-                hour=hour,
-                plays=data["plays"],
-                time_ms=data["time_ms"],
-                percentage=round(data["plays"] / total_plays * 100, 1) if total_plays > 0 else 0,
-            ))
+        first_date = start_date.date() if start_date else partial.first_date
+        daily_listening = self._build_daily_listening(partial.daily, first_date)
         
-        # Weekday distribution
-        weekday_names = ["Poniedziałek", "Wtorek", "Środa", "Czwartek", "Piątek", "Sobota", "Niedziela"]
-        weekday_distribution = []
-        for day_num in range(7):
-            data = weekday_data.get(day_num, {"plays": 0, "time_ms": 0})
-            weekday_distribution.append(WeekdayDistribution(
-                day=weekday_names[day_num],
-                day_number=day_num,
-                plays=data["plays"],
-                time_ms=data["time_ms"],
-                percentage=round(data["plays"] / total_plays * 100, 1) if total_plays > 0 else 0,
-            ))
+        # Hourly and weekday distribution
+        hourly_distribution = self._build_hourly_distribution(partial.hourly, total_plays)
+        weekday_distribution = self._build_weekday_distribution(partial.weekday, total_plays)
         
         # Listening streak
-        streak = self._calculate_streak(all_dates)
+        streak = self._calculate_streak(partial.runs)
         
         # Trend (compare with previous period)
-        trend = await self._calculate_trend(days)
-        
-        # New artists discovered in this period
-        new_artists = await self._get_new_artists(sessions, days)
-        
-        # New tracks count
-        if start_date:
-            new_tracks_count = sum(1 for d in track_first_seen.values() if d >= start_date)
-        else:
-            new_tracks_count = len(track_first_seen)
+        trend = self._build_trend(current_ms, previous_ms)
         
         # Fun stats
-        most_played_hour = max(hourly_data.keys(), key=lambda h: hourly_data[h]["plays"]) if hourly_data else 0
-        most_played_day_num = max(weekday_data.keys(), key=lambda d: weekday_data[d]["plays"]) if weekday_data else 0
+        most_played_hour = self._busiest(partial.hourly)
+        most_played_day_num = self._busiest(partial.weekday)
         
-        total_time_ms = sum(s.duration_ms for s in sessions)
-        average_track_length_ms = total_time_ms // len(sessions) if sessions else 0
+        average_track_length_ms = partial.time_ms // total_plays
         
         # Variety score (based on unique artists / total plays ratio)
-        unique_artists = len(set(s.artist_name for s in sessions))
-        variety_score = min(100, round(unique_artists / len(sessions) * 100 * 5, 1)) if sessions else 0
+        unique_artists = len(partial.artists)
+        variety_score = min(100, round(unique_artists / total_plays * 100 * 5, 1))
         
         return AdvancedAnalytics(
             daily_listening=daily_listening,
@@ -410,86 +739,253 @@ class TrackingService:
             new_artists=new_artists,
             new_tracks_count=new_tracks_count,
             most_played_hour=most_played_hour,
-            most_played_day=weekday_names[most_played_day_num],
+            most_played_day=WEEKDAY_NAMES[most_played_day_num],
             average_track_length_ms=average_track_length_ms,
             listening_variety_score=variety_score,
         )
     
-    def _calculate_streak(self, dates: set) -> ListeningStreak:
-        """Calculate listening streak."""
-        if not dates:
-            return ListeningStreak(current_streak=0, longest_streak=0, last_listen_date=None)
+    async def _get_approx_analytics(self, days: int) -> AdvancedAnalytics:
+        """Get advanced analytics from merged day sketches."""
+        start_day = self._start_day(days)
+        
+        async def previous_period_ms(db: AsyncSession) -> int:
+            # Trend from whole days, like the window itself
+            if not start_day:
+                return 0
+            previous_start_day = (date.fromisoformat(start_day) - timedelta(days=days)).strftime("%Y-%m-%d")
+            return await load_day_totals(db, self.user_id, previous_start_day, start_day)
+        
+        window, previous_ms, new_artists, new_tracks_count = await self._gather(
+            lambda db: load_sketch_window(db, self.user_id, start_day),
+            previous_period_ms,
+            lambda db: self._get_new_artists(db, days),
+            lambda db: self._count_new_tracks(db, days),
+        )
         
-        sorted_dates = sorted(dates)
-        last_date = sorted_dates[-1]
-        today = datetime.utcnow().date()
+        total_plays = window.plays
+        if not total_plays:
+            return self._empty_analytics(approximate=True)
         
-        # Current streak (counting from today backwards)
-        current_streak = 0
-        check_date = today
-        while check_date in dates or check_date == today:
-            if check_date in dates:
-                current_streak += 1
-            check_date -= timedelta(days=1)
-            if check_date < sorted_dates[0]:
-                break
-        
-        # Longest streak
-        longest_streak = 0
-        current_run = 0
-        prev_date = None
-        
-        for d in sorted_dates:
-            if prev_date is None or (d - prev_date).days == 1:
-                current_run += 1
-            else:
-                longest_streak = max(longest_streak, current_run)
-                current_run = 1
-            prev_date = d
+        weekday = [[0, 0] for _ in range(7)]
+        runs = DayRuns()
         
-        longest_streak = max(longest_streak, current_run)
+        for day, (plays, time_ms) in sorted(window.days.items()):
+            if plays:
+                d = date.fromisoformat(day)
+                runs.add(d)
+                weekday[d.weekday()][0] += plays
+                weekday[d.weekday()][1] += time_ms
         
-        return ListeningStreak(
-            current_streak=current_streak,
-            longest_streak=longest_streak,
-            last_listen_date=last_date.strftime("%Y-%m-%d"),
+        first_date = date.fromisoformat(start_day or min(window.days))
+        daily_listening = self._build_daily_listening(window.days, first_date)
+        hourly_distribution = self._build_hourly_distribution(window.hourly, total_plays)
+        weekday_distribution = self._build_weekday_distribution(weekday, total_plays)
+        
+        streak = self._calculate_streak(runs)
+        
+        trend = self._build_trend(window.time_ms if start_day else 0, previous_ms)
+        
+        unique_artists = window.artists_hll.estimate()
+        variety_score = min(100, round(unique_artists / total_plays * 100 * 5, 1))
+        
+        return AdvancedAnalytics(
+            daily_listening=daily_listening,
+            hourly_distribution=hourly_distribution,
+            weekday_distribution=weekday_distribution,
+            streak=streak,
+            trend=trend,
+            new_artists=new_artists,
+            new_tracks_count=new_tracks_count,
+            most_played_hour=self._busiest(window.hourly),
+            most_played_day=WEEKDAY_NAMES[self._busiest(weekday)],
+            average_track_length_ms=window.time_ms // total_plays,
+            listening_variety_score=variety_score,
+            approximate=True,
         )
     
-    async def _calculate_trend(self, days: int) -> ListeningTrend:
-        """Calculate trend comparing current vs previous period."""
-        if days <= 0:
-            return ListeningTrend(
-                current_period_ms=0,
-                previous_period_ms=0,
-                change_percentage=0,
-                trend="stable",
-            )
+    def _build_daily_listening(self, daily_data: dict, first_date: date) -> list[DailyListening]:
+        """Build one entry per day from first_date until today.
         
-        now = datetime.utcnow()
-        current_start = now - timedelta(days=days)
-        previous_start = current_start - timedelta(days=days)
+        daily_data maps YYYY-MM-DD to (plays, time_ms).
+        """
+        daily_listening = []
+        current = first_date
+        end = datetime.utcnow().date()
         
-        # Current period
-        current_query = select(func.sum(ListeningSession.duration_ms)).where(
-            and_(
-                ListeningSession.user_id == self.user_id,
-                ListeningSession.played_at >= current_start,
+        while current <= end:
+            date_str = current.strftime("%Y-%m-%d")
+            plays, time_ms = daily_data.get(date_str, (0, 0))
+            daily_listening.append(DailyListening(
+                date=date_str,
+                plays=plays,
+                time_ms=time_ms,
+                time_formatted=self._format_time(time_ms),
+            ))
+            current += timedelta(days=1)
+        
+        return daily_listening
+    
+    @staticmethod
+    def _build_hourly_distribution(hourly: list, total_plays: int) -> list[HourlyDistribution]:
+        """Build the 24-hour distribution from 24 (plays, time_ms) buckets."""
+        return [
+            HourlyDistribution(
+                hour=hour,
+                plays=plays,
+                time_ms=time_ms,
+                percentage=round(plays / total_plays * 100, 1) if total_plays > 0 else 0,
+            )
+            for hour, (plays, time_ms) in enumerate(hourly)
+        ]
+    
+    @staticmethod
+    def _build_weekday_distribution(weekday: list, total_plays: int) -> list[WeekdayDistribution]:
+        """Build the Monday-Sunday distribution from 7 (plays, time_ms) buckets."""
+        return [
+            WeekdayDistribution(
+                day=WEEKDAY_NAMES[day_num],
+                day_number=day_num,
+                plays=plays,
+                time_ms=time_ms,
+                percentage=round(plays / total_plays * 100, 1) if total_plays > 0 else 0,
             )
+            for day_num, (plays, time_ms) in enumerate(weekday)
+        ]
+    
+    @staticmethod
+    def _busiest(buckets: list) -> int:
+        """Index of the (plays, time_ms) bucket with the most plays."""
+        return max(range(len(buckets)), key=lambda i: buckets[i][0])
+    
+    @staticmethod
+    def _calculate_streak(runs: DayRuns) -> ListeningStreak:
+        """Calculate listening streak from runs of listening days."""
+        if runs.last is None:
+            return ListeningStreak(current_streak=0, longest_streak=0, last_listen_date=None)
+        
+        # Current streak counts back from today, or from yesterday if
+        # nothing has been played yet today
+        today = datetime.utcnow().date()
+        current_streak = runs.trailing if runs.last >= today - timedelta(days=1) else 0
+        
+        return ListeningStreak(
+            current_streak=current_streak,
+            longest_streak=runs.longest,
+            last_listen_date=runs.last.strftime("%Y-%m-%d"),
         )
-        result = await self.db.execute(current_query)
-        current_ms = result.scalar() or 0
+    
+    async def _fold_window(
+        self,
+        db: AsyncSession,
+        fold: Callable,
+        columns: tuple[str, ...],
+        start: Optional[datetime],
+        end: Optional[datetime] = None,
+    ):
+        """
+        Fold the user's plays in [start, end) (all time without a start).
         
-        # Previous period
-        previous_query = select(func.sum(ListeningSession.duration_ms)).where(
-            and_(
-                ListeningSession.user_id == self.user_id,
-                ListeningSession.played_at >= previous_start,
-                ListeningSession.played_at < current_start,
-            )
+        Archived months are folded first, then the live table (or each
+        overlapping monthly partition in turn) is streamed, so rows arrive
+        in played_at order. Plain columns are much cheaper
+        to load than ORM objects and can be shipped to the process pool.
+        """
+        partial = fold([])
+        for rows in get_archive().read(self.user_id, columns, start, end):
+            partial.merge(await run_fold(fold, rows))
+        
+        async def fold_live(tables):
+            live = fold([])
+            for table in tables:
+                conditions = [table.c.user_id == self.user_id]
+                if start:
+                    conditions.append(table.c.played_at >= start)
+                if end:
+                    conditions.append(table.c.played_at < end)
+                
+                query = (
+                    select(*(table.c[name] for name in columns))
+                    .where(and_(*conditions))
+                    .order_by(table.c.played_at)
+                )
+                live.merge(await stream_fold(db, query, fold))
+            return live
+        
+        # Only the partitions overlapping the window are read
+        partial.merge(await read_session_tables(db, fold_live, start, end))
+        return partial
+    
+    async def _fold_analytics_window(self, db: AsyncSession, start: Optional[datetime]):
+        """
+        Fold the analytics window.
+        
+        PostgreSQL groups the plays per hour and artist with date_trunc, so
+        only those groups cross the network; other databases stream the
+        plays themselves.
+        """
+        if db.bind.dialect.name != "postgresql":
+            return await self._fold_window(db, fold_analytics, ("played_at", "duration_ms", "artist_name"), start)
+        
+        partial = fold_analytics([])
+        for rows in get_archive().read(self.user_id, ("played_at", "duration_ms", "artist_name"), start):
+            partial.merge(await run_fold(fold_analytics, rows))
+        
+        async def fold_live(tables):
+            live = fold_analytics([])
+            for table in tables:
+                conditions = [table.c.user_id == self.user_id]
+                if start:
+                    conditions.append(table.c.played_at >= start)
+                
+                hour = func.date_trunc("hour", table.c.played_at).label("hour")
+                query = (
+                    select(hour, func.count(), func.sum(table.c.duration_ms), table.c.artist_name)
+                    .where(and_(*conditions))
+                    .group_by(hour, table.c.artist_name)
+                    .order_by(hour)
+                )
+                live.merge(await stream_fold(db, query, fold_analytics_hours))
+            return live
+        
+        partial.merge(await read_session_tables(db, fold_live, start))
+        return partial
+    
+    async def _sum_listening_ms(
+        self,
+        db: AsyncSession,
+        start: Optional[datetime],
+        end: Optional[datetime] = None,
+    ) -> int:
+        """Total listening time in [start, end); 0 without a start."""
+        if start is None:
+            return 0
+        
+        total = sum(
+            duration_ms
+            for rows in get_archive().read(self.user_id, ("duration_ms",), start, end)
+            for (duration_ms,) in rows
         )
-        result = await self.db.execute(previous_query)
-        previous_ms = result.scalar() or 0
         
+        async def sum_live(tables) -> int:
+            live = 0
+            for table in tables:
+                conditions = [
+                    table.c.user_id == self.user_id,
+                    table.c.played_at >= start,
+                ]
+                if end is not None:
+                    conditions.append(table.c.played_at < end)
+                
+                query = select(func.sum(table.c.duration_ms)).where(and_(*conditions))
+                result = await db.execute(query)
+                live += result.scalar() or 0
+            return live
+        
+        return total + await read_session_tables(db, sum_live, start, end)
+    
+    @staticmethod
+    def _build_trend(current_ms: int, previous_ms: int) -> ListeningTrend:
+        """Compare listening time of the current and previous period."""
         # Calculate change
         if previous_ms > 0:
             change = ((current_ms - previous_ms) / previous_ms) * 100
@@ -512,61 +1008,128 @@ class TrackingService:
             trend=trend,
         )
     
-    async def _get_new_artists(self, sessions: list, days: int) -> list[ArtistDiscovery]:
-        """Get artists discovered in this period."""
-        if not sessions or days <= 0:
+    async def _get_new_artists(self, db: AsyncSession, days: int) -> list[ArtistDiscovery]:
+        """Get artists first heard in this period."""
+        if days <= 0:
             return []
         
         start_date = datetime.utcnow() - timedelta(days=days)
         
-        # Get all artists user ever listened to before this period
-        old_query = select(ListeningSession.artist_name).where(
-            and_(
-                ListeningSession.user_id == self.user_id,
-                ListeningSession.played_at < start_date,
+        # An artist first heard in the window has all its plays in it,
+        # so lifetime totals are the totals for the period.
+        query = (
+            select(ListeningEntitySummary)
+            .where(
+                and_(
+                    ListeningEntitySummary.user_id == self.user_id,
+                    ListeningEntitySummary.entity_type == "artist",
+                    ListeningEntitySummary.first_played_at >= start_date,
+                )
             )
-        ).distinct()
-        
-        result = await self.db.execute(old_query)
-        old_artists = set(row[0] for row in result.fetchall())
-        
-        # Find new artists in current period
-        new_artist_data: dict[str, dict] = {}
-        
-        for s in sessions:
-            if s.artist_name not in old_artists:
-                if s.artist_name not in new_artist_data:
-                    new_artist_data[s.artist_name] = {
-                        "first_listen": s.played_at,
-                        "plays": 0,
-                        "time_ms": 0,
-                    }
-                new_artist_data[s.artist_name]["plays"] += 1
-                new_artist_data[s.artist_name]["time_ms"] += s.duration_ms
-        
-        # Sort by plays and return top 10
-        sorted_artists = sorted(
-            new_artist_data.items(),
-            key=lambda x: x[1]["plays"],
-            reverse=True,
-        )[:10]
+            .order_by(ListeningEntitySummary.play_count.desc())
+            .limit(10)
+        )
+        
+        result = await db.execute(query)
         
         return [
             ArtistDiscovery(
-                artist_name=name,
-                first_listen=data["first_listen"],
-                total_plays=data["plays"],
-                total_time_ms=data["time_ms"],
+                artist_name=summary.name,
+                first_listen=summary.first_played_at,
+                total_plays=summary.play_count,
+                total_time_ms=summary.total_ms,
             )
-            for name, data in sorted_artists
+            for summary in result.scalars().all()
         ]
     
-    async def get_monthly_comparison(self, months: int = 6) -> list[MonthlyComparison]:
-        """Get month over month comparison."""
-        comparisons = []
+    async def _count_new_tracks(self, db: AsyncSession, days: int) -> int:
+        """Count tracks first heard in this period (all tracks for all time)."""
+        conditions = [
+            ListeningEntitySummary.user_id == self.user_id,
+            ListeningEntitySummary.entity_type == "track",
+        ]
+        if days > 0:
+            start_date = datetime.utcnow() - timedelta(days=days)
+            conditions.append(ListeningEntitySummary.first_played_at >= start_date)
         
+        query = select(func.count()).select_from(ListeningEntitySummary).where(and_(*conditions))
+        result = await db.execute(query)
+        return result.scalar() or 0
+    
+    async def _first_listens(self, entity_type: str, keys: list[str]) -> dict[str, datetime]:
+        """Look up first-listen dates for a few entities."""
+        if not keys:
+            return {}
+        
+        query = select(
+            ListeningEntitySummary.entity_key,
+            ListeningEntitySummary.first_played_at,
+        ).where(
+            and_(
+                ListeningEntitySummary.user_id == self.user_id,
+                ListeningEntitySummary.entity_type == entity_type,
+                ListeningEntitySummary.entity_key.in_(keys),
+            )
+        )
+        result = await self.db.execute(query)
+        return dict(result.all())
+    
+    async def _add_first_listens(
+        self,
+        top_tracks: list[TrackPlayCount],
+        top_artists: list[ArtistPlayCount],
+    ) -> None:
+        """Fill in lifetime first-listen dates for top lists."""
+        track_firsts = await self._first_listens("track", [t.track_id for t in top_tracks])
+        artist_firsts = await self._first_listens("artist", [a.artist_name for a in top_artists])
+        
+        for track in top_tracks:
+            track.first_played_at = track_firsts.get(track.track_id)
+        for artist in top_artists:
+            artist.first_played_at = artist_firsts.get(artist.artist_name)
+    
+    async def get_forgotten_favorites(
+        self,
+        entity_type: str = "artist",
+        inactive_days: int = 90,
+        limit: int = 10,
+    ) -> list[ForgottenFavorite]:
+        """Get the most played tracks/artists/albums not heard for inactive_days."""
+        cutoff = datetime.utcnow() - timedelta(days=inactive_days)
+        
+        query = (
+            select(ListeningEntitySummary)
+            .where(
+                and_(
+                    ListeningEntitySummary.user_id == self.user_id,
+                    ListeningEntitySummary.entity_type == entity_type,
+                    ListeningEntitySummary.last_played_at < cutoff,
+                )
+            )
+            .order_by(ListeningEntitySummary.play_count.desc())
+            .limit(limit)
+        )
+        
+        result = await self.db.execute(query)
+        
+        return [
+            ForgottenFavorite(
+                entity_type=summary.entity_type,
+                name=summary.name,
+                artist_name=summary.artist_name,
+                play_count=summary.play_count,
+                total_time_ms=summary.total_ms,
+                first_played_at=summary.first_played_at,
+                last_played_at=summary.last_played_at,
+            )
+            for summary in result.scalars().all()
+        ]
+    
+    async def get_monthly_comparison(self, months: int = 6) -> list[MonthlyComparison]:
+        """Get month over month comparison (one scan over all the months)."""
         now = datetime.utcnow()
         
+        bounds = []
         for i in range(months):
             # Calculate month boundaries
             if now.month - i > 0:
@@ -581,58 +1144,49 @@ class TrackingService:
                 end_date = datetime(year + 1, 1, 1)
             else:
                 end_date = datetime(year, month + 1, 1)
+            bounds.append((start_date, end_date))
+        
+        if not bounds:
+            return []
+        
+        monthly = await self._fold_window(
+            self.db,
+            fold_months,
+            ("track_id", "track_name", "artist_name", "duration_ms", "played_at"),
+            bounds[-1][0],
+            bounds[0][1],
+        )
+        
+        comparisons = []
+        for start_date, _ in bounds:
+            key = start_date.strftime("%Y-%m")
+            partial = monthly.months.get(key) or fold_month([])
             
-            # Query for this month
-            query = select(ListeningSession).where(
-                and_(
-                    ListeningSession.user_id == self.user_id,
-                    ListeningSession.played_at >= start_date,
-                    ListeningSession.played_at < end_date,
-                )
-            )
-            
-            result = await self.db.execute(query)
-            sessions = result.scalars().all()
-            
-            if sessions:
-                total_time_ms = sum(s.duration_ms for s in sessions)
-                unique_artists = set(s.artist_name for s in sessions)
-                unique_tracks = set(s.track_id for s in sessions)
-                
-                # Top artist and track
-                artist_counts = Counter(s.artist_name for s in sessions)
-                track_counts = Counter((s.track_id, s.track_name) for s in sessions)
-                
-                top_artist = artist_counts.most_common(1)[0][0] if artist_counts else None
-                top_track = track_counts.most_common(1)[0][0][1] if track_counts else None
-            else:
-                total_time_ms = 0
-                unique_artists = set()
-                unique_tracks = set()
-                top_artist = None
-                top_track = None
+            # Top artist and track
+            top_artist = max(partial.artists, key=partial.artists.get) if partial.artists else None
+            top_track = max(partial.tracks.values(), key=lambda entry: entry[0])[1] if partial.tracks else None
             
             comparisons.append(MonthlyComparison(
-                month=f"{year}-{month:02d}",
-                total_plays=len(sessions),
-                total_time_ms=total_time_ms,
-                total_time_formatted=self._format_time(total_time_ms),
-                unique_artists=len(unique_artists),
-                unique_tracks=len(unique_tracks),
+                month=key,
+                total_plays=partial.plays,
+                total_time_ms=partial.time_ms,
+                total_time_formatted=self._format_time(partial.time_ms),
+                unique_artists=len(partial.artists),
+                unique_tracks=len(partial.tracks),
                 top_artist=top_artist,
                 top_track=top_track,
             ))
         
         return comparisons
     
-    def _empty_analytics(self) -> AdvancedAnalytics:
+    def _empty_analytics(self, approximate: bool = False) -> AdvancedAnalytics:
         """Return empty analytics when no data."""
         return AdvancedAnalytics(
             daily_listening=[],
             hourly_distribution=[HourlyDistribution(hour=h, plays=0, time_ms=0, percentage=0) for h in range(24)],
             weekday_distribution=[
                 WeekdayDistribution(day=d, day_number=i, plays=0, time_ms=0, percentage=0)
-                for i, d in enumerate(["Poniedziałek", "Wtorek", "Środa", "Czwartek", "Piątek", "Sobota", "Niedziela"])
+                for i, d in enumerate(WEEKDAY_NAMES)
             ],
             streak=ListeningStreak(current_streak=0, longest_streak=0, last_listen_date=None),
             trend=ListeningTrend(current_period_ms=0, previous_period_ms=0, change_percentage=0, trend="stable"),
@@ -642,4 +1196,5 @@ class TrackingService:
             most_played_day="Brak danych",
             average_track_length_ms=0,
             listening_variety_score=0,
+            approximate=approximate,
         )
@@ -0,0 +1,368 @@
+"""
+Fake Spotify Web API and accounts server.
+
+Usage:
+    python -m benchmarks.fake_spotify --users 1000 --port 8900
+
+then point the app at it:
+    SPOTIFY_API_BASE_URL=http://127.0.0.1:8900/v1
+    SPOTIFY_TOKEN_URL=http://127.0.0.1:8900/api/token
+    SPOTIFY_AUTH_URL=http://127.0.0.1:8900/authorize
+
+Every simulated user has a scripted playback timeline: listening sessions
+of several plays separated by idle gaps, some plays skipped after a few
+seconds. Tracks are not repeated within a timeline, so each play is a
+distinct row when recorded. Responses are delayed by a log-normal latency,
+rate limited with 429s (plus random ones at --error-rate) and access
+tokens expire after --token-ttl seconds, answering 401 like Spotify.
+
+The simulated clock runs at --speed times real time from 0 and can also
+be moved by POST /_control/advance?seconds=N (the load driver runs it at
+speed 0 and advances it itself). GET /_control/stats reports the calls
+served and how many timeline plays were seen through currently-playing.
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import sys
+import time
+from collections import Counter, deque
+from typing import NamedTuple, Optional
+from urllib.parse import parse_qs, urlencode
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, RedirectResponse, Response
+
+# Tracks in the shared catalog (a prime, so every stride walks all of them)
+CATALOG_SIZE = 4999
+
+# Control endpoints skip latency, rate limiting and call counting
+CONTROL_PREFIX = "/_control"
+
+
+class FakeSpotifyConfig(NamedTuple):
+    """Behaviour of the fake server."""
+    users: int = 100
+    user_prefix: str = "fake-user-"
+    seed: int = 0
+    latency_ms: float = 50.0  # median response delay
+    latency_sigma: float = 0.5  # log-normal spread of the delay
+    error_rate: float = 0.0  # chance of a random 429
+    rate_limit: int = 0  # API calls per second before 429s (0 = unlimited)
+    token_ttl: int = 3600  # access token lifetime in seconds
+    speed: float = 1.0  # simulated seconds per real second
+
+
+class Play(NamedTuple):
+    """One play in a user's timeline (simulated seconds)."""
+    start: float
+    end: float
+    track: int
+
+
+def catalog_track(index: int) -> dict:
+    """Spotify track object of a catalog track."""
+    artist = index % 397
+    album = index % 1201
+    return {
+        "id": f"fake-track-{index}",
+        "name": f"Track {index}",
+        "duration_ms": 120_000 + (index * 7919) % 240_000,
+        "popularity": index % 100,
+        "artists": [{"id": f"fake-artist-{artist}", "name": f"Artist {artist}", "external_urls": {}}],
+        "album": {"id": f"fake-album-{album}", "name": f"Album {album}", "images": [], "external_urls": {}},
+        "external_urls": {},
+    }
+
+
+class Timeline:
+    """A user's scripted playback, generated as the clock moves on."""
+
+    def __init__(self, seed: int, index: int):
+        self.rng = random.Random(seed * 1_000_003 + index)
+        # Most users are idle most of the day; a few listen nearly all the time
+        self.mean_gap = self.rng.choice([600, 3600, 3 * 3600, 8 * 3600])
+        self.offset = self.rng.randrange(CATALOG_SIZE)
+        self.stride = 1 + self.rng.randrange(CATALOG_SIZE - 1)
+        self.plays: list[Play] = []
+        self.horizon = self.rng.expovariate(1 / self.mean_gap)
+
+    def _extend(self, until: float) -> None:
+        while self.horizon <= until:
+            start = self.horizon
+            for _ in range(self.rng.randint(1, 15)):
+                track = (self.offset + len(self.plays) * self.stride) % CATALOG_SIZE
+                length = catalog_track(track)["duration_ms"] / 1000
+                if self.rng.random() < 0.1:
+                    length = self.rng.uniform(5, 40)  # skipped
+                self.plays.append(Play(start, start + length, track))
+                start += length
+            self.horizon = start + self.rng.expovariate(1 / self.mean_gap)
+
+    def playing(self, now: float) -> Optional[tuple[int, Play]]:
+        """The play (and its number) in progress at ``now``, if any."""
+        self._extend(now)
+        for number in range(len(self.plays) - 1, -1, -1):
+            play = self.plays[number]
+            if play.start <= now < play.end:
+                return number, play
+            if play.end <= now:
+                break
+        return None
+
+    def played(self, now: float) -> int:
+        """Number of plays started by ``now``."""
+        self._extend(now)
+        return sum(1 for play in self.plays if play.start <= now)
+
+
+class FakeSpotify:
+    """State of the fake server: clock, tokens, timelines and counters."""
+
+    def __init__(self, config: FakeSpotifyConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.started = time.monotonic()
+        self.offset = 0.0
+        self.epoch = time.time()  # wall-clock time of simulated second 0
+        self.timelines: dict[int, Timeline] = {}
+        self.tokens: dict[str, tuple[int, float]] = {}  # access token -> (user, expires at)
+        self.issued = 0
+        self.calls: Counter = Counter()  # (path, status) -> count
+        self.seen: set[tuple[int, int]] = set()  # (user, play number)
+        self.recent: deque = deque()  # monotonic times of recent API calls
+
+    def now(self) -> float:
+        """Simulated seconds since the start."""
+        return self.offset + (time.monotonic() - self.started) * self.config.speed
+
+    def user_id(self, index: int) -> str:
+        return f"{self.config.user_prefix}{index}"
+
+    def timeline(self, index: int) -> Timeline:
+        timeline = self.timelines.get(index)
+        if timeline is None:
+            timeline = self.timelines[index] = Timeline(self.config.seed, index)
+        return timeline
+
+    def issue_token(self, index: int) -> dict:
+        self.issued += 1
+        access_token = f"fake-access-{index}-{self.issued}"
+        self.tokens[access_token] = (index, time.monotonic() + self.config.token_ttl)
+        return {
+            "access_token": access_token,
+            "token_type": "Bearer",
+            "expires_in": self.config.token_ttl,
+            "refresh_token": f"fake-refresh-{index}",
+            "scope": "user-read-currently-playing user-read-recently-played",
+        }
+
+    def authorized_user(self, request: Request) -> Optional[int]:
+        """User of a valid, unexpired bearer token."""
+        header = request.headers.get("authorization", "")
+        entry = self.tokens.get(header.removeprefix("Bearer "))
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    def throttled(self) -> bool:
+        """Whether this API call is answered with 429."""
+        if self.config.error_rate and self.rng.random() < self.config.error_rate:
+            return True
+        if self.config.rate_limit <= 0:
+            return False
+        moment = time.monotonic()
+        while self.recent and self.recent[0] <= moment - 1:
+            self.recent.popleft()
+        if len(self.recent) >= self.config.rate_limit:
+            return True
+        self.recent.append(moment)
+        return False
+
+    def latency(self) -> float:
+        """Seconds to delay a response."""
+        if self.config.latency_ms <= 0:
+            return 0.0
+        return self.config.latency_ms / 1000 * math.exp(self.rng.gauss(0, self.config.latency_sigma))
+
+    def stats(self) -> dict:
+        now = self.now()
+        played = sum(self.timeline(index).played(now) for index in range(self.config.users))
+        return {
+            "clock": round(now, 1),
+            "epoch": self.epoch,
+            "users": self.config.users,
+            "calls": sum(self.calls.values()),
+            "calls_by_endpoint": {f"{path} {status}": count for (path, status), count in sorted(self.calls.items())},
+            "throttled": sum(count for (_, status), count in self.calls.items() if status == 429),
+            "unauthorized": sum(count for (_, status), count in self.calls.items() if status == 401),
+            "tokens_issued": self.issued,
+            "plays": played,
+            "plays_seen": len(self.seen),
+        }
+
+
+def unauthorized() -> JSONResponse:
+    return JSONResponse({"error": {"status": 401, "message": "The access token expired"}}, status_code=401)
+
+
+def create_fake_spotify(config: FakeSpotifyConfig) -> FastAPI:
+    """Build the fake server app."""
+    app = FastAPI(title="Fake Spotify")
+    state = FakeSpotify(config)
+    app.state.fake = state
+
+    @app.middleware("http")
+    async def simulate_network(request: Request, call_next):
+        if request.url.path.startswith(CONTROL_PREFIX):
+            return await call_next(request)
+
+        await asyncio.sleep(state.latency())
+        if state.throttled():
+            response = JSONResponse(
+                {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                status_code=429,
+                headers={"Retry-After": "1"},
+            )
+        else:
+            response = await call_next(request)
+        state.calls[(request.url.path, response.status_code)] += 1
+        return response
+
+    @app.get("/authorize")
+    async def authorize(request: Request):
+        """Skip the login page and authorize ?user= (the first user by default)."""
+        params = request.query_params
+        query = urlencode({"code": f"fake-code-{params.get('user', 0)}", "state": params.get("state", "")})
+        return RedirectResponse(f"{params['redirect_uri']}?{query}")
+
+    @app.post("/api/token")
+    async def token(request: Request):
+        form = {key: values[0] for key, values in parse_qs((await request.body()).decode()).items()}
+        grant = form.get("grant_type")
+        if grant == "refresh_token":
+            secret = form.get("refresh_token", "")
+        elif grant == "authorization_code":
+            secret = form.get("code", "")
+        else:
+            return JSONResponse({"error": "unsupported_grant_type"}, status_code=400)
+
+        try:
+            index = int(secret.rsplit("-", 1)[-1])
+        except ValueError:
+            index = -1
+        if not 0 <= index < config.users:
+            return JSONResponse({"error": "invalid_grant"}, status_code=400)
+        return state.issue_token(index)
+
+    @app.get("/v1/me")
+    async def me(request: Request):
+        index = state.authorized_user(request)
+        if index is None:
+            return unauthorized()
+        return {
+            "id": state.user_id(index),
+            "display_name": f"Fake User {index}",
+            "email": f"{state.user_id(index)}@example.com",
+            "images": [],
+            "product": "premium",
+            "followers": {"total": 0},
+        }
+
+    @app.get("/v1/me/player/currently-playing")
+    async def currently_playing(request: Request):
+        index = state.authorized_user(request)
+        if index is None:
+            return unauthorized()
+
+        now = state.now()
+        current = state.timeline(index).playing(now)
+        if current is None:
+            return Response(status_code=204)
+
+        number, play = current
+        state.seen.add((index, number))
+        return {
+            "timestamp": int(now * 1000),
+            "progress_ms": int((now - play.start) * 1000),
+            "is_playing": True,
+            "currently_playing_type": "track",
+            "item": catalog_track(play.track),
+        }
+
+    @app.get("/v1/me/player/recently-played")
+    async def recently_played(request: Request, limit: int = 20, after: Optional[int] = None):
+        index = state.authorized_user(request)
+        if index is None:
+            return unauthorized()
+
+        now = state.now()
+        timeline = state.timeline(index)
+        timeline.playing(now)
+        # Like Spotify, played_at is when the play finished
+        since = -math.inf if after is None else after / 1000 - state.epoch
+        finished = [play for play in timeline.plays if since < play.end <= now][-min(limit, 50):]
+        return {
+            "items": [
+                {
+                    "track": catalog_track(play.track),
+                    "played_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(state.epoch + play.end)),
+                }
+                for play in reversed(finished)
+            ],
+        }
+
+    @app.get(f"{CONTROL_PREFIX}/stats")
+    async def stats():
+        return state.stats()
+
+    @app.post(f"{CONTROL_PREFIX}/advance")
+    async def advance(seconds: float):
+        state.offset += seconds
+        return {"clock": round(state.now(), 1)}
+
+    return app
+
+
+def serve(config: FakeSpotifyConfig, host: str = "127.0.0.1", port: int = 8900) -> None:
+    """Run the fake server (blocking)."""
+    import uvicorn
+
+    uvicorn.run(create_fake_spotify(config), host=host, port=port, log_level="warning")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    defaults = FakeSpotifyConfig()
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.fake_spotify")
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--user-prefix", default=defaults.user_prefix)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--latency-sigma", type=float, default=defaults.latency_sigma)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--rate-limit", type=int, default=defaults.rate_limit)
+    parser.add_argument("--token-ttl", type=int, default=defaults.token_ttl)
+    parser.add_argument("--speed", type=float, default=defaults.speed)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args(argv)
+
+    config = FakeSpotifyConfig(
+        users=args.users,
+        user_prefix=args.user_prefix,
+        seed=args.seed,
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        token_ttl=args.token_ttl,
+        speed=args.speed,
+    )
+    serve(config, args.host, args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Synthetic listening history for benchmarks.
+
+Plays follow the shapes real histories have: a few users listen far more
+than the rest, artists and their tracks are Zipf-distributed (with every
+user preferring different artists), listening is concentrated in daily
+and weekly rhythms, and plays often stay with one artist for a while.
+Each user's plays are at least PLAY_BUCKET_SECONDS apart, so nothing trips
+the duplicate index. Output is deterministic for a given seed.
+"""
+
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Iterator, Optional
+
+from app.models.listening_session import PLAY_BUCKET_SECONDS, play_bucket
+
+# Relative plays per hour of day, on weekdays and at weekends
+WEEKDAY_HOURS = [1.0, 0.5, 0.3, 0.2, 0.2, 0.4, 1.5, 4, 6, 5, 4, 4, 4.5, 4, 4, 4, 5, 7, 8, 8, 7, 6, 4, 2]
+WEEKEND_HOURS = [2.0, 1.2, 0.6, 0.3, 0.2, 0.2, 0.3, 0.8, 1.5, 3, 5, 6, 6, 6, 6, 6, 6, 6, 7, 7, 7, 6, 5, 3.5]
+
+# Relative plays per weekday, Monday first
+WEEKDAYS = [1.0, 1.0, 1.0, 1.05, 1.15, 1.2, 1.1]
+
+# Chance that the next play in a row is by the same artist
+STAY_WITH_ARTIST = 0.3
+
+
+def zipf_weights(count: int, exponent: float) -> list[float]:
+    """Cumulative Zipf weights of ranks 1..count."""
+    return list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def user_id(index: int) -> str:
+    """ID of the index-th synthetic user (0 listens the most)."""
+    return f"bench-user-{index:04d}"
+
+
+def default_users(rows: int) -> int:
+    """Number of users for a history size."""
+    return max(5, rows // 20_000)
+
+
+class Catalog:
+    """Artists and their tracks, with Zipf popularity at both levels."""
+
+    def __init__(self, rng: random.Random, artists: int):
+        self.artists = []  # per artist: (name, tracks, cumulative track weights)
+        for a in range(artists):
+            tracks = []
+            for t in range(rng.randint(4, 40)):
+                album = t // 10
+                tracks.append((
+                    f"a{a}t{t}",
+                    f"Track {a}-{t}",
+                    f"Album {a}-{album}",
+                    rng.randint(120_000, 360_000),
+                ))
+            self.artists.append((f"Artist {a}", tracks, zipf_weights(len(tracks), 1.0)))
+        self.weights = zipf_weights(artists, 1.1)
+
+
+def generate_history(
+    rows: int,
+    users: Optional[int] = None,
+    days: int = 1095,
+    seed: int = 0,
+    end: Optional[datetime] = None,
+) -> Iterator[dict]:
+    """
+    Yield ``rows`` listening_sessions rows for ``users`` users.
+
+    Plays span the ``days`` days before ``end`` (yesterday by default) and
+    are yielded user by user, each user's in played_at order.
+    """
+    rng = random.Random(seed)
+    users = users or default_users(rows)
+    end = (end or datetime.utcnow() - timedelta(days=1)).replace(microsecond=0)
+    start = end - timedelta(days=days)
+
+    catalog = Catalog(rng, min(20_000, max(100, rows // 500)))
+    artist_count = len(catalog.artists)
+
+    # Heavier users first: user 0 gets the biggest share
+    user_weights = [1 / (i + 1) ** 0.5 for i in range(users)]
+    total_weight = sum(user_weights)
+    shares = [int(rows * weight / total_weight) for weight in user_weights]
+    shares[0] += rows - sum(shares)
+
+    day_weights = list(accumulate(WEEKDAYS[(start + timedelta(days=d)).weekday()] for d in range(days)))
+    weekday_hours = list(accumulate(WEEKDAY_HOURS))
+    weekend_hours = list(accumulate(WEEKEND_HOURS))
+
+    for index, count in enumerate(shares):
+        # Everyone has their own favourite artists
+        taste = list(range(artist_count))
+        rng.shuffle(taste)
+
+        day_picks = rng.choices(range(days), cum_weights=day_weights, k=count)
+        times = []
+        for day in day_picks:
+            date = start + timedelta(days=day)
+            hours = weekend_hours if date.weekday() >= 5 else weekday_hours
+            hour = rng.choices(range(24), cum_weights=hours)[0]
+            times.append(date + timedelta(hours=hour, seconds=rng.randrange(3600)))
+        times.sort()
+
+        previous_at = None
+        artist = None
+        for played_at in times:
+            # Keep plays apart so each lands in its own dedup bucket
+            if previous_at is not None and played_at < previous_at + timedelta(seconds=PLAY_BUCKET_SECONDS):
+                played_at = previous_at + timedelta(seconds=PLAY_BUCKET_SECONDS)
+            previous_at = played_at
+
+            if artist is None or rng.random() >= STAY_WITH_ARTIST:
+                rank = rng.choices(range(artist_count), cum_weights=catalog.weights)[0]
+                artist = catalog.artists[taste[rank]]
+            artist_name, tracks, track_weights = artist
+            track_id, track_name, album_name, duration_ms = rng.choices(tracks, cum_weights=track_weights)[0]
+
+            yield {
+                "user_id": user_id(index),
+                "track_id": track_id,
+                "track_name": track_name,
+                "artist_name": artist_name,
+                "album_name": album_name,
+                "duration_ms": duration_ms,
+                "played_at": played_at,
+                "played_bucket": play_bucket(played_at),
+            }
@@ -0,0 +1,228 @@
+"""
+Ingestion load test: track_all_users against the fake Spotify server.
+
+Usage:
+    python -m benchmarks.load --users 100 1000 10000 --ticks 20
+
+For every user count a fake Spotify server (benchmarks.fake_spotify) is
+started in its own process and the app's Spotify URLs are pointed at it.
+Users are added to a scratch database in --data-dir with expired tokens,
+then the scheduler's tracking job runs --ticks times. After each tick the
+fake clock moves on by the polling interval, or by the tick's duration
+when the tick took longer (as the scheduler would skip runs meanwhile).
+
+The report compares the plays in the users' timelines with the plays the
+server showed through currently-playing and the plays recorded, and
+counts API calls (including token refreshes) per recorded play. Results
+are appended to --results as JSON lines. The job polls users by activity
+tier; run with POLL_TIERS=false to compare with polling everyone.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from benchmarks.fake_spotify import FakeSpotifyConfig, serve
+
+DEFAULT_RESULTS = Path(__file__).resolve().parent / "load_results.jsonl"
+
+# The scheduler polls every 30 seconds
+POLL_INTERVAL = 30
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_up(base_url: str, timeout: float = 20) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                (await client.get(f"{base_url}/_control/stats")).raise_for_status()
+                return
+            except httpx.HTTPError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+
+async def add_users(prefix: str, count: int) -> None:
+    """Register users with expired tokens, so the first tick refreshes them."""
+    from sqlalchemy import update
+
+    from app.database import async_session_maker
+    from app.models.user_token import UserToken
+
+    async with async_session_maker() as db:
+        # Users of earlier runs point at servers that are gone
+        await db.execute(update(UserToken).values(tracking_enabled=False))
+        db.add_all([
+            UserToken(
+                user_id=f"{prefix}{index}",
+                access_token="expired",
+                refresh_token=f"fake-refresh-{index}",
+                token_expires_at=datetime.utcnow() - timedelta(minutes=1),
+                tracking_enabled=True,
+            )
+            for index in range(count)
+        ])
+        await db.commit()
+
+
+async def count_recorded(prefix: str) -> int:
+    from sqlalchemy import func, select
+
+    from app.database import data_session_makers
+    from app.services.partitions import session_tables
+
+    recorded = 0
+    for session_maker in data_session_makers():
+        async with session_maker() as db:
+            for table in await session_tables(db):
+                result = await db.execute(
+                    select(func.count()).select_from(table).where(table.c.user_id.like(f"{prefix}%"))
+                )
+                recorded += result.scalar_one()
+    return recorded
+
+
+async def run_users(users: int, ticks: int, config: FakeSpotifyConfig) -> dict:
+    """Run the tracking job against a fake server with ``users`` users."""
+    from app.config import get_settings
+    from app.services.scheduler import track_all_users
+
+    settings = get_settings()
+    prefix = f"load{users}-{int(time.time())}-"
+    config = config._replace(users=users, user_prefix=prefix, speed=0.0)
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    # spawn: the server must not inherit this process's event loop or engines
+    server = multiprocessing.get_context("spawn").Process(
+        target=serve, args=(config, "127.0.0.1", port), daemon=True,
+    )
+    server.start()
+    try:
+        await wait_until_up(base_url)
+        settings.spotify_api_base_url = f"{base_url}/v1"
+        settings.spotify_token_url = f"{base_url}/api/token"
+        await add_users(prefix, users)
+
+        durations = []
+        simulated = 0.0
+        async with httpx.AsyncClient() as control:
+            # Activity tiers go by the tick's time, which follows the fake clock
+            epoch = (await control.get(f"{base_url}/_control/stats")).json()["epoch"]
+            clock_start = datetime.utcfromtimestamp(epoch)
+            for tick in range(ticks):
+                started = time.perf_counter()
+                await track_all_users(now=clock_start + timedelta(seconds=simulated))
+                duration = time.perf_counter() - started
+                durations.append(duration)
+                print(f"  tick {tick + 1}/{ticks}: {duration:.2f}s", flush=True)
+                if tick < ticks - 1:
+                    advance = max(POLL_INTERVAL, duration)
+                    await control.post(f"{base_url}/_control/advance", params={"seconds": advance})
+                    simulated += advance
+            stats = (await control.get(f"{base_url}/_control/stats")).json()
+    finally:
+        server.terminate()
+        server.join()
+
+    recorded = await count_recorded(prefix)
+    return {
+        "users": users,
+        "ticks": ticks,
+        "simulated_s": stats["clock"],
+        "tick_p50_s": round(statistics.median(durations), 3),
+        "tick_max_s": round(max(durations), 3),
+        "plays": stats["plays"],
+        "plays_seen": stats["plays_seen"],
+        "plays_recorded": recorded,
+        "plays_missed": max(stats["plays"] - recorded, 0),
+        "capture_rate": round(recorded / stats["plays"], 3) if stats["plays"] else None,
+        "api_calls": stats["calls"],
+        "api_calls_per_play": round(stats["calls"] / recorded, 1) if recorded else None,
+        "throttled": stats["throttled"],
+        "unauthorized": stats["unauthorized"],
+        "tokens_issued": stats["tokens_issued"],
+    }
+
+
+async def run(user_counts: list[int], ticks: int, config: FakeSpotifyConfig, results_path: Path) -> None:
+    from app.database import create_tables
+    from benchmarks.run import current_commit
+
+    await create_tables()
+    stamp = {"at": datetime.utcnow().isoformat(timespec="seconds"), "commit": current_commit(), "host": platform.node()}
+
+    results = []
+    for users in user_counts:
+        print(f"{users} users:", flush=True)
+        result = await run_users(users, ticks, config)
+        print(
+            f"  {result['plays_recorded']}/{result['plays']} plays recorded "
+            f"({result['plays_missed']} missed, {result['plays_seen']} seen), "
+            f"{result['api_calls_per_play']} API calls per play, {result['throttled']} throttled, "
+            f"tick p50 {result['tick_p50_s']:.2f}s max {result['tick_max_s']:.2f}s",
+            flush=True,
+        )
+        results.append(result)
+
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "a") as file:
+        for result in results:
+            file.write(json.dumps({**stamp, **result}) + "\n")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    defaults = FakeSpotifyConfig()
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load")
+    parser.add_argument("--users", type=int, nargs="+", default=[100, 1000], help="User counts to run")
+    parser.add_argument("--ticks", type=int, default=20, help="Tracking job runs per user count")
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--rate-limit", type=int, default=defaults.rate_limit)
+    parser.add_argument("--token-ttl", type=int, default=defaults.token_ttl)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--data-dir", default="./bench-data", help="Where the scratch database is kept")
+    parser.add_argument("--results", default=str(DEFAULT_RESULTS), help="JSON lines file results are appended to")
+    args = parser.parse_args(argv)
+
+    # The app reads its settings on first import, so set them up front
+    data_dir = Path(args.data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    database = data_dir / "load.db"
+    database.unlink(missing_ok=True)
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{database}"
+    os.environ.setdefault("SPOTIFY_CLIENT_ID", "load-test")
+    os.environ.setdefault("SPOTIFY_CLIENT_SECRET", "load-test")
+
+    config = FakeSpotifyConfig(
+        seed=args.seed,
+        latency_ms=args.latency_ms,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        token_ttl=args.token_ttl,
+    )
+    asyncio.run(run(args.users, args.ticks, config, Path(args.results)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
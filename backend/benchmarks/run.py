@@ -0,0 +1,263 @@
+"""
+TrackingService benchmarks over synthetic histories.
+
+Usage:
+    python -m benchmarks.run --sizes 10k 100k 1m 10m
+
+Each size gets its own SQLite file in --data-dir (generated once and
+reused), opened with the app's storage profile. Every method is timed
+over --repeat calls as the heaviest user, and run once more under
+tracemalloc for its peak Python memory. Results are appended to
+--results (JSON lines) and compared with the last run of the same size
+on the same host, so a slower commit shows up as a regression.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import get_settings
+from app.database import Base, create_engine_for
+from app.models.listening_session import ListeningSession
+from app.schemas.tracking import RecordPlayRequest
+from app.services.sketch_service import rebuild_day_sketches
+from app.services.summary_service import rebuild_entity_summaries
+from app.services.tracking_service import TrackingService
+from benchmarks.generator import generate_history, user_id
+
+INSERT_BATCH = 10_000
+
+DEFAULT_RESULTS = Path(__file__).resolve().parent / "results.jsonl"
+
+# A p50 this much slower than the previous run is reported as a regression
+REGRESSION_RATIO = 1.2
+
+
+def parse_size(text: str) -> int:
+    """Parse a row count like 10k, 1m or 250000."""
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    suffix = text[-1].lower()
+    if suffix in multipliers:
+        return int(float(text[:-1]) * multipliers[suffix])
+    return int(text)
+
+
+def size_label(rows: int) -> str:
+    for unit, suffix in ((1_000_000, "m"), (1_000, "k")):
+        if rows >= unit and rows % unit == 0:
+            return f"{rows // unit}{suffix}"
+    return str(rows)
+
+
+async def seed_database(path: Path, rows: int, seed: int) -> None:
+    """Create a database file with a synthetic history and its rollups."""
+    partial = path.with_suffix(".tmp")
+    partial.unlink(missing_ok=True)
+    engine = create_engine_for(f"sqlite+aiosqlite:///{partial}")
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        batch = []
+        async with engine.begin() as conn:
+            for row in generate_history(rows, seed=seed):
+                batch.append(row)
+                if len(batch) == INSERT_BATCH:
+                    await conn.execute(insert(ListeningSession.__table__), batch)
+                    batch = []
+            if batch:
+                await conn.execute(insert(ListeningSession.__table__), batch)
+
+        session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with session_maker() as db:
+            await rebuild_entity_summaries(db)
+            await rebuild_day_sketches(db)
+
+        async with engine.begin() as conn:
+            await conn.exec_driver_sql("ANALYZE")
+    finally:
+        await engine.dispose()
+
+    # Only complete databases get the real name, so they are safe to reuse
+    partial.rename(path)
+
+
+def benchmark_calls() -> dict[str, Callable[[TrackingService, int], Awaitable]]:
+    """Benchmarked methods, each called with a fresh service and the call number."""
+    return {
+        "get_stats": lambda service, i: service.get_stats(days=30),
+        "get_history": lambda service, i: service.get_history(days=30, limit=50),
+        "get_advanced_analytics": lambda service, i: service.get_advanced_analytics(days=30),
+        "get_monthly_comparison": lambda service, i: service.get_monthly_comparison(months=6),
+        "record_play": lambda service, i: service.record_play(RecordPlayRequest(
+            track_id=f"bench-new-{time.time_ns()}-{i}",
+            track_name="Benchmark Track",
+            artist_name="Benchmark Artist",
+            album_name="Benchmark Album",
+            duration_ms=200000,
+        )),
+    }
+
+
+async def run_size(
+    rows: int,
+    data_dir: Path,
+    repeat: int = 5,
+    seed: int = 0,
+) -> list[dict]:
+    """Benchmark every method against a history of ``rows`` plays."""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    path = data_dir / f"history-{size_label(rows)}-s{seed}.db"
+    if not path.exists():
+        started = time.perf_counter()
+        await seed_database(path, rows, seed)
+        print(f"  generated {path} in {time.perf_counter() - started:.1f}s", flush=True)
+
+    engine = create_engine_for(f"sqlite+aiosqlite:///{path}")
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def call(method, i: int) -> None:
+        async with session_maker() as db:
+            await method(TrackingService(db, user_id(0)), i)
+
+    results = []
+    try:
+        for name, method in benchmark_calls().items():
+            await call(method, 0)  # warm up caches and the process pool
+
+            latencies = []
+            for i in range(1, repeat + 1):
+                started = time.perf_counter()
+                await call(method, i)
+                latencies.append((time.perf_counter() - started) * 1000)
+
+            # Separate run: tracemalloc slows allocations down a lot
+            tracemalloc.start()
+            try:
+                await call(method, repeat + 1)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+            latencies.sort()
+            results.append({
+                "size": size_label(rows),
+                "rows": rows,
+                "method": name,
+                "repeat": repeat,
+                "p50_ms": round(statistics.median(latencies), 2),
+                "min_ms": round(latencies[0], 2),
+                "max_ms": round(latencies[-1], 2),
+                "peak_kib": round(peak / 1024),
+            })
+    finally:
+        await engine.dispose()
+    return results
+
+
+def load_previous(results_path: Path, host: str) -> dict[tuple[str, str], dict]:
+    """Latest stored result per (size, method) from the same host."""
+    previous = {}
+    if results_path.exists():
+        with open(results_path) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get("host") == host:
+                    previous[(record["size"], record["method"])] = record
+    return previous
+
+
+def find_regressions(results: list[dict], previous: dict[tuple[str, str], dict]) -> list[str]:
+    """Describe results whose p50 got more than REGRESSION_RATIO slower."""
+    regressions = []
+    for result in results:
+        before = previous.get((result["size"], result["method"]))
+        if before and result["p50_ms"] > before["p50_ms"] * REGRESSION_RATIO:
+            regressions.append(
+                f"{result['method']} @ {result['size']}: {before['p50_ms']:.1f}ms -> "
+                f"{result['p50_ms']:.1f}ms (was {before.get('commit') or 'unknown'})"
+            )
+    return regressions
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(sizes: list[int], data_dir: Path, results_path: Path, repeat: int, seed: int) -> list[str]:
+    """Run all sizes, store the results and return the regressions found."""
+    host = platform.node()
+    previous = load_previous(results_path, host)
+    stamp = {"at": datetime.utcnow().isoformat(timespec="seconds"), "commit": current_commit(), "host": host}
+
+    all_results = []
+    for rows in sizes:
+        print(f"{size_label(rows)} rows:", flush=True)
+        results = await run_size(rows, data_dir, repeat, seed)
+        for result in results:
+            before = previous.get((result["size"], result["method"]))
+            change = f" ({result['p50_ms'] / before['p50_ms'] - 1:+.0%})" if before and before["p50_ms"] else ""
+            print(
+                f"  {result['method']:<24} p50 {result['p50_ms']:9.1f}ms{change:<8} "
+                f"min {result['min_ms']:9.1f}ms  max {result['max_ms']:9.1f}ms  peak {result['peak_kib']:8d} KiB",
+                flush=True,
+            )
+        all_results.extend(results)
+
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "a") as file:
+        for result in all_results:
+            file.write(json.dumps({**stamp, **result}) + "\n")
+
+    return find_regressions(all_results, previous)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run")
+    parser.add_argument("--sizes", nargs="+", default=["10k", "100k"], help="History sizes (10k, 100k, 1m, 10m)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed calls per method")
+    parser.add_argument("--seed", type=int, default=0, help="Generator seed")
+    parser.add_argument("--data-dir", default="./bench-data", help="Where generated databases are kept")
+    parser.add_argument("--results", default=str(DEFAULT_RESULTS), help="JSON lines file results are appended to")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with 1 if anything got slower")
+    args = parser.parse_args(argv)
+
+    data_dir = Path(args.data_dir)
+    # Keep the real archive out of the measurements
+    get_settings().archive_dir = str(data_dir / "archive")
+
+    regressions = asyncio.run(run(
+        [parse_size(size) for size in args.sizes],
+        data_dir,
+        Path(args.results),
+        args.repeat,
+        args.seed,
+    ))
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-01-15 12:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_tokens",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("display_name", sa.String(), nullable=True),
+        sa.Column("email", sa.String(), nullable=True),
+        sa.Column("access_token", sa.String(), nullable=False),
+        sa.Column("refresh_token", sa.String(), nullable=False),
+        sa.Column("token_expires_at", sa.DateTime(), nullable=False),
+        sa.Column("tracking_enabled", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.Column("last_tracked_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_user_tokens_id", "user_tokens", ["id"])
+    op.create_index("ix_user_tokens_user_id", "user_tokens", ["user_id"], unique=True)
+
+    op.create_table(
+        "listening_sessions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("track_id", sa.String(), nullable=False),
+        sa.Column("track_name", sa.String(), nullable=False),
+        sa.Column("artist_name", sa.String(), nullable=False),
+        sa.Column("album_name", sa.String(), nullable=False),
+        sa.Column("duration_ms", sa.Integer(), nullable=False),
+        sa.Column("played_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.Column("played_bucket", sa.Integer(), nullable=True),
+    )
+    op.create_index("ix_listening_sessions_id", "listening_sessions", ["id"])
+    op.create_index("ix_listening_sessions_user_id", "listening_sessions", ["user_id"])
+    op.create_index("ix_listening_sessions_track_id", "listening_sessions", ["track_id"])
+    op.create_index("idx_user_played", "listening_sessions", ["user_id", "played_at"])
+    op.create_index("idx_user_track", "listening_sessions", ["user_id", "track_id"])
+    op.create_index(
+        "idx_user_track_bucket", "listening_sessions", ["user_id", "track_id", "played_bucket"], unique=True
+    )
+
+    op.create_table(
+        "listening_day_sketches",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("day", sa.String(10), nullable=False),
+        sa.Column("plays", sa.Integer(), nullable=False),
+        sa.Column("time_ms", sa.Integer(), nullable=False),
+        sa.Column("hourly", sa.Text(), nullable=True),
+        sa.Column("tracks_hll", sa.LargeBinary(), nullable=True),
+        sa.Column("artists_hll", sa.LargeBinary(), nullable=True),
+        sa.Column("albums_hll", sa.LargeBinary(), nullable=True),
+        sa.Column("top_tracks", sa.Text(), nullable=True),
+        sa.Column("top_artists", sa.Text(), nullable=True),
+        sa.Column("top_albums", sa.Text(), nullable=True),
+    )
+    op.create_index("ix_listening_day_sketches_id", "listening_day_sketches", ["id"])
+    op.create_index("idx_sketch_user_day", "listening_day_sketches", ["user_id", "day"], unique=True)
+
+    op.create_table(
+        "listening_entity_summaries",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("entity_type", sa.String(10), nullable=False),
+        sa.Column("entity_key", sa.String(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("artist_name", sa.String(), nullable=True),
+        sa.Column("first_played_at", sa.DateTime(), nullable=False),
+        sa.Column("last_played_at", sa.DateTime(), nullable=False),
+        sa.Column("play_count", sa.Integer(), nullable=False),
+        sa.Column("total_ms", sa.BigInteger(), nullable=False),
+    )
+    op.create_index("ix_listening_entity_summaries_id", "listening_entity_summaries", ["id"])
+    op.create_index(
+        "idx_summary_user_entity",
+        "listening_entity_summaries",
+        ["user_id", "entity_type", "entity_key"],
+        unique=True,
+    )
+    op.create_index(
+        "idx_summary_user_first", "listening_entity_summaries", ["user_id", "entity_type", "first_played_at"]
+    )
+    op.create_index(
+        "idx_summary_user_last", "listening_entity_summaries", ["user_id", "entity_type", "last_played_at"]
+    )
+
+    op.create_table(
+        "id_sequences",
+        sa.Column("name", sa.String(), primary_key=True),
+        sa.Column("value", sa.Integer(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("id_sequences")
+    op.drop_table("listening_entity_summaries")
+    op.drop_table("listening_day_sketches")
+    op.drop_table("listening_sessions")
+    op.drop_table("user_tokens")
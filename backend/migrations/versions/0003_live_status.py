@@ -0,0 +1,28 @@
+"""Live status
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-02-15 12:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "live_status",
+        sa.Column("user_id", sa.String(), primary_key=True),
+        sa.Column("version", sa.Float(), nullable=False),
+        sa.Column("payload", sa.Text(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("live_status")
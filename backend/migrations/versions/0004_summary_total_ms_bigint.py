@@ -0,0 +1,24 @@
+"""Summary total_ms as bigint
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-02-20 12:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Databases created by an older 0001 have int4, which overflows after ~596 hours
+    op.alter_column("listening_entity_summaries", "total_ms", type_=sa.BigInteger(), existing_nullable=False)
+
+
+def downgrade() -> None:
+    op.alter_column("listening_entity_summaries", "total_ms", type_=sa.Integer(), existing_nullable=False)
@@ -5,6 +5,16 @@ from unittest.mock import AsyncMock, MagicMock
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 
 from app.database import Base
+from app.services import archive_service
+
+
+@pytest.fixture(autouse=True)
+def archive_store(tmp_path, monkeypatch):
+    """Keep every test's archive in its own temporary directory."""
+    store = archive_service.ArchiveStore(tmp_path / "archive")
+    monkeypatch.setattr(archive_service, "_archive", store)
+    yield store
+    store.close()
 
 
 @pytest.fixture
@@ -127,6 +137,19 @@ async def test_db():
     await engine.dispose()
 
 
+@pytest.fixture
+async def test_session_factory(tmp_path):
+    """Create a file-backed database that several connections can share."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    
+    await engine.dispose()
+
+
 @pytest.fixture
 def mock_access_token():
     """Mock access token."""
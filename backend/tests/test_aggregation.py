@@ -0,0 +1,226 @@
+"""Tests for batched aggregation folds."""
+
+import asyncio
+
+import pytest
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.models.listening_session import ListeningSession
+from app.services import aggregation
+from app.services.aggregation import (
+    DayRuns,
+    fold_stats,
+    fold_analytics,
+    fold_analytics_hours,
+    fold_month,
+    fold_months,
+    run_fold,
+    stream_fold,
+)
+
+
+def make_rows(count: int) -> list[tuple]:
+    """Build (track_id, track_name, artist_name, album_name, duration_ms, played_at) rows."""
+    start = datetime(2026, 1, 1)
+    return [
+        (
+            f"track{i % 37}",
+            f"Track {i % 37}",
+            f"Artist {i % 11}",
+            f"Album {i % 13}",
+            180000 + i,
+            start + timedelta(minutes=47 * i),
+        )
+        for i in range(count)
+    ]
+
+
+class TestFolds:
+    """Tests that batch partials merge to the same result as a single fold."""
+
+    def test_stats_merge_equals_single_fold(self):
+        """Test merging stats partials from batches."""
+        rows = make_rows(1000)
+
+        merged = fold_stats(rows[:400])
+        merged.merge(fold_stats(rows[400:]))
+        single = fold_stats(rows)
+
+        assert merged.plays == single.plays
+        assert merged.time_ms == single.time_ms
+        assert merged.first_played_at == single.first_played_at
+        assert merged.tracks == single.tracks
+        assert merged.artists == single.artists
+        assert merged.albums == single.albums
+
+    def test_analytics_and_month_merge_equal_single_fold(self):
+        """Test merging analytics and monthly partials from batches."""
+        rows = make_rows(1000)
+        analytics_rows = [(played_at, ms, artist) for _, _, artist, _, ms, played_at in rows]
+        month_rows = [(track_id, name, artist, ms) for track_id, name, artist, _, ms, _ in rows]
+
+        analytics = fold_analytics(analytics_rows[:600])
+        analytics.merge(fold_analytics(analytics_rows[600:]))
+        single = fold_analytics(analytics_rows)
+
+        assert analytics.daily == single.daily
+        assert analytics.hourly == single.hourly
+        assert analytics.weekday == single.weekday
+        assert analytics.artists == single.artists
+        assert analytics.first_date == single.first_date
+
+        month = fold_month(month_rows[:1])
+        month.merge(fold_month(month_rows[1:]))
+        assert month.artists == fold_month(month_rows).artists
+        assert month.tracks == fold_month(month_rows).tracks
+
+    def test_months_split_by_played_at(self):
+        """Test that one multi-month fold matches folding each month alone."""
+        rows = [(r[0], r[1], r[2], r[4], r[5]) for r in make_rows(3000)]
+        monthly = fold_months(rows[:1000])
+        monthly.merge(fold_months(rows[1000:]))
+
+        assert sorted(monthly.months) == sorted({r[4].strftime("%Y-%m") for r in rows})
+        for key, partial in monthly.months.items():
+            single = fold_month([r[:4] for r in rows if r[4].strftime("%Y-%m") == key])
+            assert (partial.plays, partial.time_ms) == (single.plays, single.time_ms)
+            assert partial.artists == single.artists
+            assert partial.tracks == single.tracks
+
+    def test_hour_groups_equal_plays(self):
+        """Test that folding date_trunc hour groups matches folding the plays."""
+        start = datetime(2026, 1, 1)
+        rows = [(start + timedelta(minutes=7 * i), 180000 + i, f"Artist {i % 3}") for i in range(2000)]
+
+        groups: dict[tuple, list] = {}
+        for played_at, ms, artist in rows:
+            entry = groups.setdefault((played_at.replace(minute=0, second=0), artist), [0, 0])
+            entry[0] += 1
+            entry[1] += ms
+        hour_rows = [(hour, plays, ms, artist) for (hour, artist), (plays, ms) in sorted(groups.items())]
+
+        grouped = fold_analytics_hours(hour_rows)
+        single = fold_analytics(rows)
+
+        assert (grouped.plays, grouped.time_ms) == (single.plays, single.time_ms)
+        assert grouped.daily == single.daily
+        assert grouped.hourly == single.hourly
+        assert grouped.weekday == single.weekday
+        assert grouped.artists == single.artists
+        assert (grouped.runs.first, grouped.runs.last, grouped.runs.longest) == (
+            single.runs.first, single.runs.last, single.runs.longest
+        )
+
+
+@pytest.mark.asyncio
+async def test_run_fold_offloads_to_process_pool(monkeypatch):
+    """Test that offloaded batches give the same result as an inline fold."""
+    monkeypatch.setattr(aggregation.settings, "analytics_process_workers", 2)
+    monkeypatch.setattr(aggregation.settings, "analytics_offload_threshold", 100)
+    monkeypatch.setattr(aggregation.settings, "analytics_batch_size", 150)
+
+    rows = make_rows(500)
+    try:
+        offloaded = await run_fold(fold_stats, rows)
+    finally:
+        aggregation.shutdown_executor()
+
+    single = fold_stats(rows)
+    assert offloaded.plays == 500
+    assert offloaded.tracks == single.tracks
+    assert offloaded.albums == single.albums
+
+
+@pytest.mark.asyncio
+async def test_run_fold_splits_a_batch_across_workers(monkeypatch):
+    """Test that one input above the threshold becomes a job per worker."""
+    monkeypatch.setattr(aggregation.settings, "analytics_process_workers", 2)
+    monkeypatch.setattr(aggregation.settings, "analytics_offload_threshold", 100)
+    monkeypatch.setattr(aggregation.settings, "analytics_batch_size", 1000)
+
+    sizes = []
+
+    class Executor:
+        pass
+
+    async def run_in_executor(executor, fold, batch):
+        sizes.append(len(batch))
+        return fold(batch)
+
+    monkeypatch.setattr(aggregation, "get_executor", lambda: Executor())
+    monkeypatch.setattr(asyncio.get_running_loop(), "run_in_executor", run_in_executor)
+
+    rows = make_rows(301)
+    folded = await run_fold(fold_stats, rows)
+    assert sizes == [151, 150]
+    assert folded.plays == 301
+
+
+class TestDayRuns:
+    """Tests for mergeable runs of consecutive days."""
+
+    def test_merge_across_batches_matches_single_pass(self):
+        """Test that splitting ordered days anywhere gives the same runs."""
+        start = datetime(2026, 3, 1).date()
+        offsets = [0, 1, 2, 4, 5, 6, 7, 9, 12, 13, 14, 15, 16, 17, 20, 21]
+        days = [start + timedelta(days=o) for o in offsets]
+
+        single = DayRuns()
+        for day in days:
+            single.add(day)
+        assert (single.leading, single.trailing, single.longest) == (3, 2, 6)
+
+        for split in range(len(days) + 1):
+            left, right = DayRuns(), DayRuns()
+            for day in days[:split]:
+                left.add(day)
+            for day in days[split:]:
+                right.add(day)
+            left.merge(right)
+            assert (left.first, left.last) == (single.first, single.last)
+            assert (left.leading, left.trailing, left.longest) == (3, 2, 6)
+
+    def test_same_day_split_across_batches(self):
+        """Test that a day cut in half by a batch boundary isn't counted twice."""
+        day = datetime(2026, 3, 1).date()
+        left, right = DayRuns(), DayRuns()
+        left.add(day)
+        right.add(day)
+        right.add(day + timedelta(days=1))
+        left.merge(right)
+
+        assert (left.leading, left.trailing, left.longest) == (2, 2, 2)
+
+
+@pytest.mark.asyncio
+async def test_stream_fold_in_small_chunks(test_db, monkeypatch):
+    """Test that streaming in small chunks matches folding every row at once."""
+    monkeypatch.setattr(aggregation.settings, "analytics_batch_size", 7)
+
+    rows = make_rows(100)
+    for track_id, track_name, artist_name, album_name, duration_ms, played_at in rows:
+        test_db.add(ListeningSession(
+            user_id="user1",
+            track_id=track_id,
+            track_name=track_name,
+            artist_name=artist_name,
+            album_name=album_name,
+            duration_ms=duration_ms,
+            played_at=played_at,
+        ))
+    await test_db.commit()
+
+    query = select(
+        ListeningSession.played_at,
+        ListeningSession.duration_ms,
+        ListeningSession.artist_name,
+    ).order_by(ListeningSession.played_at)
+    streamed = await stream_fold(test_db, query, fold_analytics)
+    single = fold_analytics([(played_at, ms, artist) for _, _, artist, _, ms, played_at in rows])
+
+    assert streamed.plays == 100
+    assert streamed.daily == single.daily
+    assert streamed.hourly == single.hourly
+    assert (streamed.runs.trailing, streamed.runs.longest) == (single.runs.trailing, single.runs.longest)
@@ -0,0 +1,219 @@
+"""Tests for the archive tier."""
+
+import struct
+
+import pytest
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func
+
+from app.models.listening_session import ListeningSession, play_bucket
+from app.services.archive_service import archive_old_sessions
+from app.services import segments
+from app.services.segments import COLUMNS, Segment, write_segment
+from app.services.tracking_service import TrackingService
+
+
+def make_session(i: int, played_at: datetime) -> ListeningSession:
+    """Build a listening session for user123."""
+    return ListeningSession(
+        user_id="user123",
+        track_id=f"track{i % 5}",
+        track_name=f"Track {i % 5}",
+        artist_name=f"Artist {i % 3}",
+        album_name="Album",
+        duration_ms=180000 + i,
+        played_at=played_at,
+    )
+
+
+class TestSegments:
+    """Tests for the segment file format."""
+    
+    def test_roundtrip_and_range(self, tmp_path):
+        """Test that rows come back sorted and filtered by played_at."""
+        start = datetime(2024, 1, 1, 12, 0, 0, 123456)
+        rows = [
+            (i, f"t{i % 3}", f"Żółw {i % 3}", "Artist", "Album", 1000 * i, start + timedelta(hours=i), i if i % 4 else None)
+            for i in reversed(range(20))
+        ]
+        path = tmp_path / "2024-01.seg"
+        write_segment(path, rows)
+        
+        segment = Segment(path)
+        try:
+            assert segment.select(COLUMNS) == sorted(rows, key=lambda row: row[6])
+            
+            window = segment.select(("id", "track_name"), start + timedelta(hours=5), start + timedelta(hours=8))
+            assert window == [(5, "Żółw 2"), (6, "Żółw 0"), (7, "Żółw 1")]
+        finally:
+            segment.close()
+
+    def test_codes_are_little_endian(self, tmp_path):
+        """Test that dictionary codes are stored in the documented byte order."""
+        start = datetime(2024, 1, 1)
+        rows = [(i, f"t{i % 3}", "Track", "Artist", "Album", 1000, start + timedelta(hours=i), i) for i in range(6)]
+        path = tmp_path / "2024-01.seg"
+        write_segment(path, rows)
+
+        segment = Segment(path, mapped=False)
+        try:
+            data = segment._block(segment.header["columns"]["track_id"]["codes"])
+        finally:
+            segment.close()
+        assert struct.unpack("<6I", data) == (0, 1, 2, 0, 1, 2)
+
+
+class TestArchival:
+    """Tests for moving plays to the archive."""
+    
+    @pytest.mark.asyncio
+    async def test_archived_plays_still_counted(self, test_db, archive_store):
+        """Test that statistics, analytics and history look the same after archiving."""
+        now = datetime.utcnow()
+        for i in range(40):
+            test_db.add(make_session(i, now - timedelta(days=i * 3)))
+        await test_db.commit()
+        
+        service = TrackingService(test_db, "user123")
+        before_stats = await service.get_stats(days=0)
+        before_analytics = await service.get_advanced_analytics(days=90)
+        before_history = await service.get_history(days=0, limit=15)
+        
+        cutoff = datetime(now.year, now.month, 1) - timedelta(days=40)
+        moved = await archive_old_sessions(test_db, cutoff)
+        
+        remaining = await test_db.scalar(select(func.count()).select_from(ListeningSession))
+        assert moved > 0
+        assert remaining == 40 - moved
+        assert archive_store.months("user123")
+        
+        assert await service.get_stats(days=0) == before_stats
+        assert await service.get_advanced_analytics(days=90) == before_analytics
+        
+        # Cursor pages continue from the live table into the archive
+        history = await service.get_history(days=0, limit=15)
+        assert history.total == 40
+        ids = [item.id for item in history.items]
+        cursor = history.next_cursor
+        while cursor:
+            page = await service.get_history(days=0, limit=15, cursor=cursor, include_total=False)
+            ids += [item.id for item in page.items]
+            cursor = page.next_cursor
+        assert len(ids) == len(set(ids)) == 40
+        assert history.items == before_history.items
+    
+    @pytest.mark.asyncio
+    async def test_interrupted_archival_is_not_duplicated(self, test_db, archive_store):
+        """Test that rows archived twice (crash before delete) are stored once."""
+        played_at = datetime(2020, 5, 10, 12, 0)
+        session = make_session(1, played_at)
+        session.played_bucket = play_bucket(played_at)
+        test_db.add(session)
+        await test_db.commit()
+        
+        row = (session.id, session.track_id, session.track_name, session.artist_name,
+               session.album_name, session.duration_ms, session.played_at, session.played_bucket)
+        archive_store.add("user123", "2020-05", [row])
+        
+        await archive_old_sessions(test_db, datetime(2021, 1, 1))
+        
+        assert archive_store.count("user123") == 1
+    
+    @pytest.mark.asyncio
+    async def test_history_merges_imports_into_archived_months(self, test_db, archive_store):
+        """Test that live plays inside archived months are listed in order."""
+        start = datetime(2020, 5, 1)
+        for i in range(0, 20, 2):
+            test_db.add(make_session(i, start + timedelta(hours=i)))
+        await test_db.commit()
+        await archive_old_sessions(test_db, datetime(2021, 1, 1))
+        
+        # An import adds the odd hours back to the live table
+        for i in range(1, 20, 2):
+            test_db.add(make_session(i, start + timedelta(hours=i)))
+        await test_db.commit()
+        
+        service = TrackingService(test_db, "user123")
+        expected = [start + timedelta(hours=i) for i in reversed(range(20))]
+        
+        played = []
+        cursor = None
+        while True:
+            page = await service.get_history(days=0, limit=6, cursor=cursor)
+            played += [item.played_at for item in page.items]
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        assert played == expected
+        
+        page = await service.get_history(days=0, limit=6, offset=6)
+        assert [item.played_at for item in page.items] == expected[6:12]
+        assert page.total == 20
+    
+    @pytest.mark.asyncio
+    async def test_each_month_is_deleted_once_written(self, test_db, archive_store, monkeypatch):
+        """Test that a month leaves the table before the next month is read."""
+        for month in (3, 4, 5):
+            for day in (1, 15):
+                test_db.add(make_session(month * 100 + day, datetime(2020, month, day, 12, 0)))
+        await test_db.commit()
+        
+        add = archive_store.add
+        written = []
+        
+        def add_month(user_id, month, rows):
+            if month == "2020-05":
+                raise OSError("disk full")
+            written.append((month, len(rows)))
+            add(user_id, month, rows)
+        
+        monkeypatch.setattr(archive_store, "add", add_month)
+        with pytest.raises(OSError):
+            await archive_old_sessions(test_db, datetime(2021, 1, 1))
+        
+        assert written == [("2020-03", 2), ("2020-04", 2)]
+        result = await test_db.execute(select(ListeningSession.played_at))
+        assert sorted(played_at.month for played_at in result.scalars()) == [5, 5]
+    
+    @pytest.mark.asyncio
+    async def test_rewrite_does_not_replace_a_mapped_segment(self, archive_store, monkeypatch):
+        """Test that a cached mapping is closed before its file is replaced."""
+        played_at = datetime(2020, 5, 10, 12, 0)
+        row = (1, "t", "Track", "Artist", "Album", 1000, played_at, None)
+        archive_store.add("user123", "2020-05", [row])
+        mapped = archive_store.segment("user123", "2020-05")
+        
+        replace = segments.os.replace
+        seen = []
+        
+        def checked_replace(src, dst):
+            # A read during the rewrite gets a copy, not a new mapping
+            assert archive_store.count("user123") == 1
+            seen.append(any(segment.path == dst for _, segment in archive_store._open.values()))
+            replace(src, dst)
+        
+        monkeypatch.setattr(segments.os, "replace", checked_replace)
+        await archive_store.add_in_thread("user123", "2020-05", [(2, *row[1:6], played_at + timedelta(hours=1), None)])
+        
+        assert seen == [False]
+        assert mapped._mm.closed
+        assert archive_store.count("user123") == 2
+    
+    @pytest.mark.asyncio
+    async def test_streak_with_live_play_inside_archived_run(self, test_db, archive_store):
+        """Test that a live play dated inside an archived run keeps the streaks right."""
+        today = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+        for i in range(41, 51):
+            test_db.add(make_session(i, today - timedelta(days=i)))
+        await test_db.commit()
+        await archive_old_sessions(test_db, today - timedelta(days=30))
+        
+        # Imported later into the archived days
+        test_db.add(make_session(99, today - timedelta(days=45, hours=3)))
+        await test_db.commit()
+        
+        analytics = await TrackingService(test_db, "user123").get_advanced_analytics(days=90)
+        assert analytics.streak.longest_streak == 10
+        assert analytics.streak.last_listen_date == (today - timedelta(days=41)).strftime("%Y-%m-%d")
+        assert sum(day.plays for day in analytics.daily_listening) == 11
@@ -0,0 +1,86 @@
+"""Tests for online database backups."""
+
+import asyncio
+import gzip
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services import backup_service
+from app.services.backup_service import backup_database
+
+
+def make_database(path, rows: int) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE plays (id INTEGER PRIMARY KEY, payload TEXT)")
+    conn.executemany("INSERT INTO plays (payload) VALUES (?)", [("x" * 200,) for _ in range(rows)])
+    conn.commit()
+    conn.close()
+
+
+class TestBackup:
+    """Tests for snapshots and rotation."""
+
+    def test_snapshot_is_restorable(self, tmp_path):
+        """Test that a gzip snapshot holds a complete copy of the database."""
+        source = tmp_path / "live.db"
+        make_database(source, 5000)
+
+        result = backup_database(source, tmp_path / "backups", keep=3, step_pages=16)
+
+        restored = tmp_path / "restored.db"
+        with gzip.open(result.snapshot, "rb") as compressed:
+            restored.write_bytes(compressed.read())
+        conn = sqlite3.connect(restored)
+        assert conn.execute("SELECT COUNT(*) FROM plays").fetchone()[0] == 5000
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+        conn.close()
+
+        assert result.pages > 16
+        assert result.pages_per_second > 0
+
+    def test_old_snapshots_are_rotated(self, tmp_path):
+        """Test that only the newest snapshots are kept."""
+        source = tmp_path / "live.db"
+        make_database(source, 10)
+        now = datetime(2024, 1, 15)
+
+        for day in range(4):
+            backup_database(source, tmp_path / "backups", keep=2, step_pages=16, now=now + timedelta(days=day))
+
+        names = sorted(path.name for path in (tmp_path / "backups").iterdir())
+        assert names == ["live-20240117-000000.db.gz", "live-20240118-000000.db.gz"]
+
+    def test_pauses_between_steps(self, tmp_path, monkeypatch):
+        """Test that the copy sleeps after every step but the last."""
+        source = tmp_path / "live.db"
+        make_database(source, 5000)
+        pauses = []
+        monkeypatch.setattr(backup_service.time, "sleep", pauses.append)
+
+        result = backup_database(source, tmp_path / "backups", keep=3, step_pages=16, pause_s=0.01)
+
+        assert pauses == [0.01] * (-(-result.pages // 16) - 1)
+
+    @pytest.mark.asyncio
+    async def test_writer_continues_during_backup(self, tmp_path):
+        """Test that another connection can commit while a backup is running."""
+        source = tmp_path / "live.db"
+        make_database(source, 20000)
+        writer = sqlite3.connect(source, timeout=5, check_same_thread=False)
+
+        backup = asyncio.create_task(asyncio.to_thread(
+            backup_database, source, tmp_path / "backups", 2, 8
+        ))
+        commits = 0
+        while not backup.done():
+            await asyncio.to_thread(writer.execute, "INSERT INTO plays (payload) VALUES ('live')")
+            await asyncio.to_thread(writer.commit)
+            commits += 1
+        result = await backup
+        writer.close()
+
+        assert commits > 0
+        assert result.size_bytes > 0
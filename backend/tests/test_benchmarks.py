@@ -0,0 +1,78 @@
+"""Tests for the synthetic history generator and benchmark runner."""
+
+import json
+from collections import Counter
+from datetime import datetime
+
+import pytest
+
+from app.models.listening_session import PLAY_BUCKET_SECONDS
+from benchmarks.generator import generate_history, user_id
+from benchmarks.run import find_regressions, load_previous, parse_size, run_size, size_label
+
+
+class TestGenerator:
+    """Tests for the shape of generated histories."""
+
+    def test_rows_users_and_spacing(self):
+        """Test the row count, the user skew and the gap between a user's plays."""
+        rows = list(generate_history(5000, users=5, seed=1))
+        assert len(rows) == 5000
+
+        per_user = Counter(row["user_id"] for row in rows)
+        assert per_user.most_common(1)[0][0] == user_id(0)
+        assert per_user[user_id(0)] > 2 * per_user[user_id(4)]
+
+        for previous, row in zip(rows, rows[1:]):
+            if previous["user_id"] == row["user_id"]:
+                assert (row["played_at"] - previous["played_at"]).total_seconds() >= PLAY_BUCKET_SECONDS
+
+    def test_zipf_popularity_and_daily_rhythm(self):
+        """Test that a few artists dominate and nights are quiet."""
+        rows = list(generate_history(20000, users=5, seed=2))
+
+        artists = Counter(row["artist_name"] for row in rows)
+        top_ten = sum(count for _, count in artists.most_common(10))
+        assert top_ten > len(rows) * 0.3
+
+        hours = Counter(row["played_at"].hour for row in rows)
+        assert hours[19] > 5 * hours[4]
+
+    def test_deterministic(self):
+        """Test that a seed always produces the same history."""
+        end = datetime(2026, 1, 1)
+        assert list(generate_history(500, seed=3, end=end)) == list(generate_history(500, seed=3, end=end))
+        assert list(generate_history(500, seed=3, end=end)) != list(generate_history(500, seed=4, end=end))
+
+
+class TestRunner:
+    """Tests for benchmark runs and regression detection."""
+
+    def test_sizes(self):
+        """Test parsing and labelling history sizes."""
+        assert parse_size("10k") == 10_000
+        assert parse_size("1m") == 1_000_000
+        assert parse_size("2500") == 2500
+        assert size_label(10_000_000) == "10m"
+        assert size_label(2500) == "2500"
+
+    @pytest.mark.asyncio
+    async def test_run_size(self, tmp_path):
+        """Test a small end-to-end run."""
+        results = await run_size(2000, tmp_path, repeat=1)
+        assert [r["method"] for r in results] == [
+            "get_stats", "get_history", "get_advanced_analytics", "get_monthly_comparison", "record_play",
+        ]
+        assert all(r["p50_ms"] > 0 and r["peak_kib"] >= 0 for r in results)
+        assert list(tmp_path.glob("*.db")) == [tmp_path / "history-2k-s0.db"]
+
+    def test_regressions_against_same_host(self, tmp_path):
+        """Test that only slower results from the same host count."""
+        path = tmp_path / "results.jsonl"
+        with open(path, "w") as file:
+            for host, p50 in (("a", 10.0), ("b", 1.0)):
+                file.write(json.dumps({"host": host, "size": "10k", "method": "get_stats", "p50_ms": p50}) + "\n")
+
+        previous = load_previous(path, "a")
+        assert find_regressions([{"size": "10k", "method": "get_stats", "p50_ms": 11.0}], previous) == []
+        assert len(find_regressions([{"size": "10k", "method": "get_stats", "p50_ms": 13.0}], previous)) == 1
@@ -0,0 +1,63 @@
+"""Tests for the read and write engines."""
+
+import pytest
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.database import Base, create_engine_for
+
+
+@pytest.fixture
+async def engines(tmp_path):
+    """Write and read engines on one SQLite file."""
+    url = f"sqlite+aiosqlite:///{tmp_path / 'split.db'}"
+    writer = create_engine_for(url)
+    reader = create_engine_for(url, read_only=True)
+    async with writer.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield writer, reader
+    await reader.dispose()
+    await writer.dispose()
+
+
+def insert_play(track_id: str):
+    return text(
+        "INSERT INTO listening_sessions (user_id, track_id, track_name, artist_name, "
+        f"album_name, duration_ms, played_at) VALUES ('u', '{track_id}', 'T', 'A', 'B', 1, '2024-01-01')"
+    )
+
+
+class TestEngines:
+    """Tests for routing reads and writes to separate pools."""
+
+    def test_sqlite_writer_has_one_connection(self, engines):
+        """Test that SQLite writes are serialized through a single connection."""
+        writer, reader = engines
+        assert writer.pool.size() == 1
+        assert reader.pool is not writer.pool
+
+    @pytest.mark.asyncio
+    async def test_read_engine_rejects_writes(self, engines):
+        """Test that read connections are query-only."""
+        _, reader = engines
+        async with reader.connect() as conn:
+            with pytest.raises(OperationalError):
+                await conn.execute(insert_play("t1"))
+
+    @pytest.mark.asyncio
+    async def test_reads_run_during_open_write(self, engines):
+        """Test that a read isn't blocked by an uncommitted write."""
+        writer, reader = engines
+        async with writer.connect() as write_conn:
+            await write_conn.execute(insert_play("t1"))
+
+            async with reader.connect() as read_conn:
+                count = (await read_conn.execute(text("SELECT COUNT(*) FROM listening_sessions"))).scalar()
+            assert count == 0
+
+            await write_conn.commit()
+
+        async with reader.connect() as read_conn:
+            count = (await read_conn.execute(text("SELECT COUNT(*) FROM listening_sessions"))).scalar()
+        assert count == 1
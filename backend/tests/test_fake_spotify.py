@@ -0,0 +1,72 @@
+"""Tests for the fake Spotify server used by the load driver."""
+
+import httpx
+import pytest
+
+from benchmarks.fake_spotify import FakeSpotifyConfig, create_fake_spotify
+
+
+def fake_client(**overrides) -> httpx.AsyncClient:
+    config = FakeSpotifyConfig(users=20, latency_ms=0, speed=0, **overrides)
+    app = create_fake_spotify(config)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fake")
+
+
+async def access_token(client: httpx.AsyncClient, user: int = 0) -> str:
+    response = await client.post(
+        "/api/token",
+        data={"grant_type": "refresh_token", "refresh_token": f"fake-refresh-{user}"},
+    )
+    assert response.status_code == 200
+    return response.json()["access_token"]
+
+
+class TestFakeSpotify:
+    """Tests for tokens, timelines and throttling."""
+
+    @pytest.mark.asyncio
+    async def test_tokens(self):
+        """Test that refreshed tokens work and unknown or expired ones get 401."""
+        async with fake_client() as client:
+            token = await access_token(client, 3)
+            me = await client.get("/v1/me", headers={"Authorization": f"Bearer {token}"})
+            assert me.json()["id"] == "fake-user-3"
+
+            unknown = await client.get("/v1/me", headers={"Authorization": "Bearer nope"})
+            assert unknown.status_code == 401
+
+        async with fake_client(token_ttl=0) as client:
+            token = await access_token(client)
+            expired = await client.get("/v1/me", headers={"Authorization": f"Bearer {token}"})
+            assert expired.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_currently_playing_follows_timeline(self):
+        """Test that polling sees the scripted plays and 204 while idle."""
+        async with fake_client() as client:
+            headers = {"Authorization": f"Bearer {await access_token(client)}"}
+            statuses = set()
+            for _ in range(400):
+                response = await client.get("/v1/me/player/currently-playing", headers=headers)
+                statuses.add(response.status_code)
+                if response.status_code == 200:
+                    assert response.json()["item"]["id"].startswith("fake-track-")
+                await client.post("/_control/advance", params={"seconds": 60})
+
+            assert statuses == {200, 204}
+            stats = (await client.get("/_control/stats")).json()
+            assert 0 < stats["plays_seen"] <= stats["plays"]
+            assert stats["calls_by_endpoint"]["/api/token 200"] == 1
+
+    @pytest.mark.asyncio
+    async def test_throttling(self):
+        """Test rate limiting and random 429s."""
+        async with fake_client(rate_limit=2) as client:
+            statuses = [(await client.post("/api/token", data={"grant_type": "x"})).status_code for _ in range(3)]
+            assert statuses == [400, 400, 429]
+
+        async with fake_client(error_rate=1.0) as client:
+            response = await client.get("/v1/me")
+            assert response.status_code == 429
+            assert response.headers["Retry-After"] == "1"
+            assert (await client.get("/_control/stats")).json()["throttled"] == 1
@@ -0,0 +1,93 @@
+"""Tests for the streaming history importer."""
+
+import io
+import json
+import pytest
+from datetime import datetime
+
+from sqlalchemy import select, func
+
+from app.models.day_sketch import ListeningDaySketch
+from app.models.listening_session import ListeningSession
+from app.services.import_service import JsonArrayParser, parse_entry, import_file
+
+
+def make_entry(ts: str, track: str = "abc", ms_played: int = 200000) -> dict:
+    """Build an extended streaming history entry."""
+    return {
+        "ts": ts,
+        "ms_played": ms_played,
+        "master_metadata_track_name": f"Track {track}",
+        "master_metadata_album_artist_name": "Artist",
+        "master_metadata_album_album_name": "Album",
+        "spotify_track_uri": f"spotify:track:{track}",
+        "episode_name": None,
+    }
+
+
+class TestParser:
+    """Tests for parsing export files."""
+
+    def test_parser_handles_any_chunk_boundaries(self):
+        """Test that elements split across chunks (even mid-character) parse."""
+        entries = [make_entry(f"2024-01-0{i}T10:00:00Z", track=f"zażółć{i}") for i in range(1, 8)]
+        data = json.dumps(entries, indent=2, ensure_ascii=False).encode()
+
+        for chunk_size in (1, 7, 64, len(data)):
+            parser = JsonArrayParser()
+            parsed = []
+            for i in range(0, len(data), chunk_size):
+                parsed.extend(parser.feed(data[i:i + chunk_size]))
+            parsed.extend(parser.close())
+            assert parsed == entries
+
+    def test_parser_rejects_truncated_file(self):
+        """Test that an incomplete array is an error."""
+        parser = JsonArrayParser()
+        parser.feed(b'[{"ts": "2024-01-01T10:00:00Z"}, {"ts": ')
+        with pytest.raises(ValueError):
+            parser.close()
+
+    def test_parse_entry(self):
+        """Test mapping entries, skipping podcasts and short plays."""
+        play = parse_entry(make_entry("2024-01-15T14:33:20Z", ms_played=200000), "user123")
+
+        assert play.track_id == "abc"
+        assert play.duration_ms == 200000
+        # ts is when playback ended
+        assert play.played_at == datetime(2024, 1, 15, 14, 30, 0)
+
+        podcast = make_entry("2024-01-15T14:33:20Z")
+        podcast["spotify_track_uri"] = None
+        assert parse_entry(podcast, "user123") is None
+        assert parse_entry(make_entry("2024-01-15T14:33:20Z", ms_played=5000), "user123") is None
+
+
+class TestImport:
+    """Tests for importing into the database."""
+
+    @pytest.mark.asyncio
+    async def test_import_dedups_and_updates_rollups(self, test_db):
+        """Test that a re-import adds nothing and sketches are kept in sync."""
+        entries = [
+            make_entry("2024-01-15T10:00:00Z", track="a"),
+            make_entry("2024-01-15T10:01:00Z", track="a"),  # Same track within 3 minutes
+            make_entry("2024-01-15T10:05:00Z", track="b"),
+            make_entry("2024-01-16T10:00:00Z", track="a", ms_played=1000),
+        ]
+        data = json.dumps(entries).encode()
+
+        progress = []
+        summary = await import_file(test_db, "user123", io.BytesIO(data), on_progress=progress.append)
+
+        assert (summary.parsed, summary.imported, summary.duplicates, summary.skipped) == (4, 2, 1, 1)
+        assert progress
+
+        again = await import_file(test_db, "user123", io.BytesIO(data))
+        assert (again.imported, again.duplicates) == (0, 3)
+
+        count = await test_db.scalar(select(func.count()).select_from(ListeningSession))
+        assert count == 2
+
+        sketch = await test_db.scalar(select(ListeningDaySketch).where(ListeningDaySketch.day == "2024-01-15"))
+        assert sketch.plays == 2
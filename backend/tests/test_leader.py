@@ -0,0 +1,185 @@
+"""Tests for lease-based leader election of the scheduler."""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app import database
+from app.database import Base, create_engine_for
+from app.services import scheduler
+from app.services.leader import LeaderElection, release, try_acquire
+
+
+class TestLease:
+    """Tests for taking, renewing and releasing the lease."""
+
+    @pytest.mark.asyncio
+    async def test_one_holder_until_expiry(self, test_db):
+        """Test that only the holder renews and others wait for expiry."""
+        now = datetime(2024, 1, 1, 12, 0)
+        assert await try_acquire(test_db, "jobs", "a", 15, now=now)
+        assert not await try_acquire(test_db, "jobs", "b", 15, now=now + timedelta(seconds=5))
+        assert await try_acquire(test_db, "jobs", "a", 15, now=now + timedelta(seconds=10))
+
+        # a renewed until 12:00:25, then stopped renewing
+        assert not await try_acquire(test_db, "jobs", "b", 15, now=now + timedelta(seconds=24))
+        assert await try_acquire(test_db, "jobs", "b", 15, now=now + timedelta(seconds=26))
+        assert not await try_acquire(test_db, "jobs", "a", 15, now=now + timedelta(seconds=27))
+
+    @pytest.mark.asyncio
+    async def test_release_hands_over(self, test_db):
+        """Test that a released lease can be taken right away."""
+        assert await try_acquire(test_db, "jobs", "a", 15)
+        await release(test_db, "jobs", "a")
+        assert await try_acquire(test_db, "jobs", "b", 15)
+
+
+class TestLeaderElection:
+    """Tests for workers campaigning for the scheduler."""
+
+    @pytest.mark.asyncio
+    async def test_takeover_after_leader_dies(self, test_session_factory):
+        """Test that exactly one worker leads and another takes over when it dies."""
+        events = []
+
+        def worker(name: str) -> LeaderElection:
+            return LeaderElection(
+                test_session_factory,
+                on_elected=lambda: events.append((name, "elected")),
+                on_deposed=lambda: events.append((name, "deposed")),
+                holder=name,
+                lease_seconds=1,
+                heartbeat_seconds=0.1,
+            )
+
+        a, b = worker("a"), worker("b")
+        a.start()
+        await asyncio.sleep(0.2)
+        b.start()
+        await asyncio.sleep(0.3)
+        assert (a.leading, b.leading) == (True, False)
+
+        # a crashes: its heartbeats stop without releasing the lease
+        a._task.cancel()
+        await asyncio.sleep(1.5)
+        assert b.leading
+        await b.stop()
+
+        assert events == [("a", "elected"), ("b", "elected"), ("b", "deposed")]
+
+    @pytest.mark.asyncio
+    async def test_clean_stop_releases(self, test_session_factory):
+        """Test that a stopping leader lets the next heartbeat of another worker win."""
+        a = LeaderElection(test_session_factory, lambda: None, lambda: None, holder="a", lease_seconds=60)
+        b = LeaderElection(test_session_factory, lambda: None, lambda: None, holder="b", lease_seconds=60)
+
+        assert await a.heartbeat()
+        assert not await b.heartbeat()
+        await a.stop()
+        assert await b.heartbeat()
+
+    @pytest.mark.asyncio
+    async def test_heartbeat_does_not_wait_for_the_writer(self, tmp_path, monkeypatch):
+        """Test that the lease renews while a job holds the only write connection."""
+        monkeypatch.setattr(database.settings, "sqlite_single_writer", True)
+        url = f"sqlite+aiosqlite:///{tmp_path / 'main.db'}"
+        writer = create_engine_for(url)
+        lease = create_engine_for(url, pooled=False)
+        async with writer.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        writer_maker = async_sessionmaker(writer, class_=AsyncSession)
+        election = LeaderElection(
+            async_sessionmaker(lease, class_=AsyncSession), lambda: None, lambda: None, holder="a"
+        )
+        try:
+            async with writer_maker() as job:
+                await job.execute(select(1))
+                assert await asyncio.wait_for(election.heartbeat(), 2)
+                assert await asyncio.wait_for(election.heartbeat(), 2)
+        finally:
+            await writer.dispose()
+            await lease.dispose()
+
+
+class TestSchedulerJobs:
+    """Tests for the jobs started by the lease holder."""
+
+    @pytest.mark.asyncio
+    async def test_data_is_prepared_before_periodic_jobs(self, monkeypatch):
+        """Test that the leader migrates and backfills, then schedules the jobs."""
+        steps = []
+
+        def step(name):
+            async def run():
+                assert scheduler.scheduler.get_job("track_all_users") is None
+                steps.append(name)
+            return run
+
+        for name in ("migrate_to_partitions", "backfill_day_sketches", "backfill_entity_summaries"):
+            monkeypatch.setattr(scheduler, name, step(name))
+
+        scheduler._start_jobs()
+        try:
+            for _ in range(100):
+                if scheduler.scheduler.get_job("track_all_users"):
+                    break
+                await asyncio.sleep(0.01)
+            assert scheduler.scheduler.get_job("track_all_users") is not None
+        finally:
+            scheduler._stop_jobs()
+        assert steps == ["migrate_to_partitions", "backfill_day_sketches", "backfill_entity_summaries"]
+
+    @pytest.mark.asyncio
+    async def test_failed_preparation_is_retried_first(self, monkeypatch):
+        """Test that the periodic jobs wait until every preparation step succeeded."""
+        attempts = []
+
+        async def flaky_backfill():
+            attempts.append(scheduler.scheduler.get_job("track_all_users"))
+            if len(attempts) == 1:
+                raise RuntimeError("database is locked")
+
+        async def done():
+            pass
+
+        for name in ("migrate_to_shards", "migrate_to_partitions", "backfill_entity_summaries"):
+            monkeypatch.setattr(scheduler, name, done)
+        monkeypatch.setattr(scheduler, "backfill_day_sketches", flaky_backfill)
+        monkeypatch.setattr(scheduler, "PREPARE_RETRY_SECONDS", 0.2)
+
+        scheduler._start_jobs()
+        try:
+            for _ in range(200):
+                if scheduler.scheduler.get_job("track_all_users"):
+                    break
+                await asyncio.sleep(0.01)
+            assert scheduler.scheduler.get_job("track_all_users") is not None
+        finally:
+            scheduler._stop_jobs()
+        assert attempts == [None, None]
+
+    @pytest.mark.asyncio
+    async def test_deposed_leader_cancels_running_jobs(self, monkeypatch):
+        """Test that losing the lease stops a job that is still running."""
+        started = asyncio.Event()
+        finished = []
+
+        async def slow_job():
+            started.set()
+            await asyncio.sleep(10)
+            finished.append(True)
+
+        monkeypatch.setattr(scheduler, "prepare_data", slow_job)
+        scheduler._start_jobs()
+        await asyncio.wait_for(started.wait(), 2)
+        run = next(iter(scheduler._running))
+
+        scheduler._stop_jobs()
+        await asyncio.wait_for(asyncio.gather(run, return_exceptions=True), 2)
+        assert run.done()
+        assert not finished
+        assert not scheduler._running
@@ -0,0 +1,216 @@
+"""Tests for the live now-playing feed."""
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.models.live_status import LiveStatus
+from app.models.user_token import UserToken
+from app.routers import live
+from app.services import live_feed as live_feed_module, scheduler
+from app.services.live_feed import FeedFull, LiveFeed
+from app.services.polling_tiers import PollingTiers
+
+
+def track(track_id: str) -> dict:
+    return {
+        "id": track_id,
+        "name": f"Song {track_id}",
+        "duration_ms": 200000,
+        "artists": [{"name": "Artist"}],
+        "album": {"name": "Album", "images": [{"url": f"https://img/{track_id}"}]},
+    }
+
+
+class TestLiveFeed:
+    """Tests for publishing, coalescing and subscriber limits."""
+
+    @pytest.mark.asyncio
+    async def test_updates_are_coalesced(self, test_db):
+        """Test that a subscriber gets the latest status, not every change."""
+        feed = LiveFeed()
+        subscription = await feed.subscribe(test_db, "u")
+        first = await subscription.next(1)
+        assert first["now_playing"] is None
+        assert first["updated_at"] is None
+
+        assert feed.publish("u", now_playing=track("a"))
+        assert not feed.publish("u", now_playing=track("a"))
+        assert feed.publish("u", now_playing=track("b"))
+        assert feed.publish("u", now_playing=None)
+        assert feed.publish("u", now_playing=track("c"))
+
+        latest = await subscription.next(1)
+        assert latest["now_playing"]["track_id"] == "c"
+        assert latest["now_playing"]["album_image_url"] == "https://img/c"
+        assert await subscription.next(0.05) is None
+
+    @pytest.mark.asyncio
+    async def test_waiting_subscriber_wakes_on_publish(self, test_db):
+        """Test that a publish wakes subscribers waiting for a change."""
+        feed = LiveFeed()
+        subscriptions = [await feed.subscribe(test_db, "u") for _ in range(3)]
+        for subscription in subscriptions:
+            await subscription.next(1)
+
+        waiting = [asyncio.create_task(s.next(5)) for s in subscriptions]
+        await asyncio.sleep(0.01)
+        feed.publish("u", now_playing=track("a"))
+        statuses = await asyncio.gather(*waiting)
+        assert [s["now_playing"]["track_id"] for s in statuses] == ["a", "a", "a"]
+
+    @pytest.mark.asyncio
+    async def test_subscriber_limits(self, test_db, monkeypatch):
+        """Test that streams beyond the limits are refused until one closes."""
+        monkeypatch.setattr(live_feed_module.settings, "live_max_subscribers_per_user", 2)
+        monkeypatch.setattr(live_feed_module.settings, "live_max_subscribers", 3)
+        feed = LiveFeed()
+
+        a1 = await feed.subscribe(test_db, "a")
+        await feed.subscribe(test_db, "a")
+        with pytest.raises(FeedFull):
+            await feed.subscribe(test_db, "a")
+
+        await feed.subscribe(test_db, "b")
+        with pytest.raises(FeedFull):
+            await feed.subscribe(test_db, "c")
+
+        a1.close()
+        a1.close()
+        assert feed.subscribers == 2
+        await feed.subscribe(test_db, "c")
+
+    @pytest.mark.asyncio
+    async def test_other_process_syncs_from_table(self, test_db):
+        """Test that statuses reach another process's feed through live_status."""
+        scheduler_feed, web_feed = LiveFeed(), LiveFeed()
+        subscription = await web_feed.subscribe(test_db, "u")
+        await subscription.next(1)
+
+        scheduler_feed.publish("u", now_playing=track("a"))
+        scheduler_feed.publish("u", last_play={"track_id": "a", "played_at": "2024-01-01T12:00:00Z"})
+        scheduler_feed.publish("other", now_playing=track("x"))
+        await scheduler_feed.flush(test_db)
+        await test_db.commit()
+
+        assert await web_feed.sync(test_db) == 1
+        status = await subscription.next(1)
+        assert status["now_playing"]["track_id"] == "a"
+        assert status["last_play"]["track_id"] == "a"
+        assert "other" not in web_feed.channels
+
+        # Nothing newer: no update
+        assert await web_feed.sync(test_db) == 0
+
+        # A new scheduler process starts from the stored statuses
+        next_feed = LiveFeed()
+        await next_feed.load(test_db, ["u", "new"])
+        assert not next_feed.publish("u", now_playing=track("a"))
+        assert next_feed.channels["new"].version == 0
+
+
+class TestLiveStream:
+    """Tests for the server-sent events endpoint."""
+
+    @pytest.fixture
+    def feed(self, test_session_factory, monkeypatch):
+        feed = LiveFeed()
+        monkeypatch.setattr(live, "live_feed", feed)
+        monkeypatch.setattr(live, "read_session_maker", test_session_factory)
+        return feed
+
+    @pytest.mark.asyncio
+    async def test_stream_sends_status_events(self, feed):
+        """Test the event format, and that closing the stream unsubscribes."""
+        response = await live.stream(user_id="u")
+        assert response.media_type == "text/event-stream"
+        body = response.body_iterator
+
+        first = await anext(body)
+        assert first.startswith("event: status\n")
+        feed.publish("u", now_playing=track("a"))
+        event = await anext(body)
+        data = json.loads(event.split("data: ", 1)[1])
+        assert data["now_playing"]["track_name"] == "Song a"
+        assert f"id: {data['version']}\n" in event
+        assert feed.subscribers == 1
+
+        await body.aclose()
+        assert feed.subscribers == 0
+
+    @pytest.mark.asyncio
+    async def test_full_feed_is_refused(self, feed, monkeypatch):
+        """Test that opening a stream over the limit answers 503."""
+        monkeypatch.setattr(live_feed_module.settings, "live_max_subscribers", 0)
+        with pytest.raises(HTTPException) as error:
+            await live.stream(user_id="u")
+        assert error.value.status_code == 503
+
+    @pytest.mark.asyncio
+    async def test_stored_token_needs_no_spotify_call(self, feed, test_session_factory):
+        """Test that tracked users' stored tokens identify them locally."""
+        async with test_session_factory() as db:
+            db.add(UserToken(
+                user_id="u",
+                access_token="stored",
+                refresh_token="refresh",
+                token_expires_at=datetime.utcnow() + timedelta(hours=1),
+            ))
+            await db.commit()
+
+        assert await live.get_stream_user_id(access_token="stored", authorization=None) == "u"
+        assert await live.get_stream_user_id(access_token=None, authorization="Bearer stored") == "u"
+        with pytest.raises(HTTPException) as error:
+            await live.get_stream_user_id(access_token=None, authorization=None)
+        assert error.value.status_code == 401
+
+
+class TestSchedulerPublishes:
+    """Tests for the tracking job feeding the live status."""
+
+    @pytest.mark.asyncio
+    async def test_polls_update_live_status(self, test_session_factory, monkeypatch):
+        """Test that polls publish now playing and recorded plays to live_status."""
+        async with test_session_factory() as db:
+            db.add(UserToken(
+                user_id="u",
+                access_token="token",
+                refresh_token="refresh",
+                token_expires_at=datetime.utcnow() + timedelta(hours=1),
+                tracking_enabled=True,
+            ))
+            await db.commit()
+
+        playing = [track("a"), None]
+
+        async def currently_playing(access_token):
+            return playing.pop(0)
+
+        feed = LiveFeed()
+        monkeypatch.setattr(scheduler, "async_session_maker", test_session_factory)
+        monkeypatch.setattr(scheduler, "user_session_maker", lambda user_id: test_session_factory)
+        # Seen playing on the last poll, so asked what is playing
+        tiers = PollingTiers()
+        tiers.observe("u", True, datetime.utcnow())
+        monkeypatch.setattr(scheduler, "polling", tiers)
+        monkeypatch.setattr(scheduler, "get_currently_playing", currently_playing)
+        monkeypatch.setattr(scheduler, "live_feed", feed)
+
+        async def stored() -> dict:
+            async with test_session_factory() as db:
+                row = (await db.execute(select(LiveStatus).where(LiveStatus.user_id == "u"))).scalar_one()
+                return json.loads(row.payload)
+
+        await scheduler.track_all_users()
+        status = await stored()
+        assert status["now_playing"]["track_id"] == "a"
+        assert status["last_play"]["track_id"] == "a"
+
+        await scheduler.track_all_users()
+        status = await stored()
+        assert status["now_playing"] is None
+        assert status["last_play"]["track_id"] == "a"
@@ -0,0 +1,60 @@
+"""Tests for the event loop lag monitor."""
+
+import asyncio
+import logging
+import time
+
+import pytest
+
+from app.services.loop_monitor import LoopMonitor, percentile
+
+
+def block_the_loop(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+class TestLoopMonitor:
+    """Tests for lag sampling and blocked loop reports."""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        values = [float(v) for v in range(1, 101)]
+        assert percentile(values, 0.5) == 51.0
+        assert percentile(values, 0.99) == 100.0
+        assert percentile([], 0.5) == 0.0
+
+    @pytest.mark.asyncio
+    async def test_blocking_call_is_reported(self, caplog):
+        """Test that a blocking call shows up as lag, a stall and a logged stack."""
+        monitor = LoopMonitor(interval_ms=10, threshold_ms=100)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            with caplog.at_level(logging.WARNING, logger="app.services.loop_monitor"):
+                block_the_loop(0.3)
+                await asyncio.sleep(0.05)
+        finally:
+            await monitor.stop()
+
+        stats = monitor.stats()
+        assert stats["lag_ms"]["max"] >= 250
+        assert stats["lag_ms"]["p50"] < 100
+        assert stats["stall_count"] == 1
+        assert "block_the_loop" in stats["stalls"][0]["location"]
+
+        stacks = [r.getMessage() for r in caplog.records if "loop thread stack" in r.getMessage()]
+        assert len(stacks) == 1
+        assert "test_blocking_call_is_reported" in stacks[0]
+
+    @pytest.mark.asyncio
+    async def test_idle_loop_has_no_stalls(self):
+        """Test that a loop that isn't blocked reports low lag only."""
+        monitor = LoopMonitor(interval_ms=10, threshold_ms=100)
+        monitor.start()
+        await asyncio.sleep(0.2)
+        await monitor.stop()
+
+        stats = monitor.stats()
+        assert stats["samples"] > 5
+        assert stats["stall_count"] == 0
+        assert stats["lag_ms"]["max"] < 100
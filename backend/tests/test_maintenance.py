@@ -0,0 +1,63 @@
+"""Tests for the SQLite storage profile and maintenance jobs."""
+
+import pytest
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database import Base, configure_engine
+from app.services.maintenance import checkpoint, optimize, database_stats
+
+
+@pytest.fixture
+async def tuned_engine(tmp_path):
+    """A file database with the storage profile applied."""
+    engine = configure_engine(create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'tuned.db'}"))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+class TestStorageProfile:
+    """Tests for connection pragmas and upkeep."""
+
+    @pytest.mark.asyncio
+    async def test_pragmas_applied_on_connect(self, tuned_engine):
+        """Test that new connections use WAL and the configured pragmas."""
+        async with tuned_engine.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+            assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1  # NORMAL
+            assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 5000
+            assert (await conn.execute(text("PRAGMA mmap_size"))).scalar() > 0
+
+    @pytest.mark.asyncio
+    async def test_checkpoint_truncates_wal(self, tuned_engine):
+        """Test that a checkpoint empties the WAL file reported in stats."""
+        async with tuned_engine.begin() as conn:
+            for i in range(200):
+                await conn.execute(text(
+                    "INSERT INTO listening_sessions (user_id, track_id, track_name, artist_name, "
+                    f"album_name, duration_ms, played_at) VALUES ('u', 't{i}', 'T', 'A', 'B', 1, '2024-01-01')"
+                ))
+
+        before = await database_stats(tuned_engine)
+        assert before["wal_bytes"] > 0
+        assert before["journal_mode"] == "wal"
+
+        busy, _, _ = await checkpoint(tuned_engine)
+        after = await database_stats(tuned_engine)
+
+        assert busy == 0
+        assert after["wal_bytes"] == 0
+        assert after["size_bytes"] == after["page_size"] * after["page_count"]
+
+    @pytest.mark.asyncio
+    async def test_optimize_analyzes_once(self, tuned_engine):
+        """Test that the first optimize builds planner statistics."""
+        await optimize(tuned_engine)
+        await optimize(tuned_engine)
+
+        async with tuned_engine.connect() as conn:
+            result = await conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"))
+            assert result.first() is not None
@@ -0,0 +1,251 @@
+"""Tests for monthly listening session partitions."""
+
+import pytest
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import get_settings
+from app.schemas.tracking import RecordPlayBatchItem
+from app.services.archive_service import archive_old_sessions
+from app.database import Base
+from app.services import partitions
+from app.services.partitions import (
+    ID_BLOCK_SIZE,
+    allocate_ids,
+    drop_partition,
+    ensure_partition,
+    existing_months,
+    known_months,
+    session_tables,
+)
+from app.services.tracking_service import TrackingService
+
+
+@pytest.fixture
+def partitioned(monkeypatch):
+    """Enable session partitioning for one test."""
+    monkeypatch.setattr(get_settings(), "session_partitioning", True)
+
+
+def make_item(track_id: str, played_at: datetime) -> RecordPlayBatchItem:
+    return RecordPlayBatchItem(
+        track_id=track_id,
+        track_name=f"Track {track_id}",
+        artist_name="Test Artist",
+        album_name="Test Album",
+        duration_ms=180000,
+        played_at=played_at,
+    )
+
+
+@pytest.fixture
+async def two_engines(tmp_path):
+    """Session makers of two engines on one database, like the write and read engines."""
+    url = f"sqlite+aiosqlite:///{tmp_path / 'shared.db'}"
+    engines = [create_async_engine(url), create_async_engine(url)]
+    async with engines[0].begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield [async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False) for engine in engines]
+    for engine in engines:
+        await engine.dispose()
+
+
+class TestPartitions:
+    """Tests for routing, pruning and reading across partitions."""
+
+    @pytest.mark.asyncio
+    async def test_plays_are_routed_by_month(self, test_db, partitioned):
+        """Test that plays land in their month's table with unique ids."""
+        service = TrackingService(test_db, "user123")
+        response = await service.record_plays([
+            make_item("a", datetime(2024, 1, 20, 12, 0)),
+            make_item("b", datetime(2024, 2, 5, 12, 0)),
+            make_item("c", datetime(2024, 2, 6, 12, 0)),
+        ])
+
+        assert response.recorded == 3
+        assert await existing_months(test_db) == ["202401", "202402"]
+        assert len({r.id for r in response.results}) == 3
+
+        pruned = await session_tables(test_db, datetime(2024, 2, 1))
+        assert [table.name for table in pruned] == ["listening_sessions", "listening_sessions_202402"]
+
+    @pytest.mark.asyncio
+    async def test_known_partitions_skip_ddl_and_catalog(self, test_db, partitioned):
+        """Test that only the first insert into a month creates its table."""
+        statements = []
+        engine = test_db.get_bind()
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            service = TrackingService(test_db, "user123")
+            for minute in (0, 10, 20):
+                await service.record_play(make_item(f"t{minute}", datetime(2024, 1, 20, 12, minute)))
+            await service.get_history(days=0, limit=10)
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        creates = [s for s in statements if s.lstrip().upper().startswith("CREATE TABLE")]
+        catalog = [s for s in statements if "sqlite_master" in s]
+        assert len(creates) == 1
+        assert len(catalog) == 1
+
+    @pytest.mark.asyncio
+    async def test_rolled_back_partition_is_not_known(self, test_db, partitioned):
+        """Test that a partition created in a rolled back transaction is created again."""
+        await ensure_partition(test_db, "202405")
+        assert "202405" in await known_months(test_db)
+        await test_db.rollback()
+
+        assert "202405" not in await known_months(test_db)
+        await ensure_partition(test_db, "202405")
+        await test_db.commit()
+        assert await existing_months(test_db) == ["202405"]
+
+    @pytest.mark.asyncio
+    async def test_ids_come_from_a_block_per_process(self, test_db, partitioned):
+        """Test that writers share one reserved block instead of the sequence row."""
+        updates = []
+        engine = test_db.get_bind()
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("UPDATE ID_SEQUENCES"):
+                updates.append(statement)
+
+        service = TrackingService(test_db, "user123")
+        ids = [(await service.record_play(make_item("first", datetime(2024, 1, 20, 11, 0)))).id]
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            for minute in range(0, 50, 5):
+                response = await service.record_play(make_item(f"t{minute}", datetime(2024, 1, 20, 12, minute)))
+                ids.append(response.id)
+            await service.record_play(make_item("t0", datetime(2024, 1, 20, 12, 1)))
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+
+        assert updates == []
+        assert ids == list(range(ids[0], ids[0] + 11))
+
+    @pytest.mark.asyncio
+    async def test_rolled_back_ids_are_reserved_again(self, test_session_factory, partitioned):
+        """Test that only committed blocks are shared between sessions."""
+        async with test_session_factory() as db:
+            first = await allocate_ids(db, 1)
+            await db.rollback()
+            assert await allocate_ids(db, 1) == first
+            await db.commit()
+
+        async with test_session_factory() as db:
+            assert await allocate_ids(db, 1) == first + 1
+            assert await allocate_ids(db, ID_BLOCK_SIZE) == first + ID_BLOCK_SIZE
+
+    @pytest.mark.asyncio
+    async def test_duplicates_across_month_boundary(self, test_db, partitioned):
+        """Test that the duplicate window spans the neighbouring partition."""
+        service = TrackingService(test_db, "user123")
+        await service.record_plays([make_item("a", datetime(2024, 1, 31, 23, 59))])
+
+        response = await service.record_plays([make_item("a", datetime(2024, 2, 1, 0, 1))])
+        assert response.duplicates == 1
+
+    @pytest.mark.asyncio
+    async def test_reads_match_unpartitioned(self, test_db, test_session_factory, monkeypatch):
+        """Test that stats and history read the same with and without partitions."""
+        now = datetime.utcnow().replace(microsecond=0)
+        items = [make_item(f"t{i % 5}", now - timedelta(days=i * 3, minutes=i)) for i in range(30)]
+
+        async with test_session_factory() as db:
+            await TrackingService(db, "user123").record_plays(items)
+            plain = TrackingService(db, "user123")
+            expected_stats = await plain.get_stats(days=60)
+            expected_history = await plain.get_history(days=60, limit=100)
+
+        monkeypatch.setattr(get_settings(), "session_partitioning", True)
+        service = TrackingService(test_db, "user123")
+        await service.record_plays(items)
+
+        assert await service.get_stats(days=60) == expected_stats
+
+        history = await service.get_history(days=60, limit=100)
+        assert history.total == expected_history.total
+        assert [i.played_at for i in history.items] == [i.played_at for i in expected_history.items]
+
+        # Cursor and offset pages walk across partitions without gaps
+        cursor_ids, cursor = [], None
+        while True:
+            page = await service.get_history(days=60, limit=4, cursor=cursor, include_total=False)
+            cursor_ids += [item.id for item in page.items]
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        offset_ids = []
+        for offset in range(0, len(history.items), 4):
+            page = await service.get_history(days=60, limit=4, offset=offset, include_total=False)
+            offset_ids += [item.id for item in page.items]
+        assert cursor_ids == offset_ids == [item.id for item in history.items]
+
+    @pytest.mark.asyncio
+    async def test_archival_drops_old_partitions(self, test_db, partitioned, archive_store):
+        """Test that a month moved to the archive loses its table but stays readable."""
+        service = TrackingService(test_db, "user123")
+        await service.record_plays([
+            make_item("a", datetime(2023, 1, 10, 12, 0)),
+            make_item("b", datetime(2023, 3, 10, 12, 0)),
+        ])
+
+        moved = await archive_old_sessions(test_db, cutoff=datetime(2023, 2, 1))
+
+        assert moved == 1
+        assert await existing_months(test_db) == ["202303"]
+        assert archive_store.months("user123") == ["2023-01"]
+        history = await service.get_history(days=0, limit=10)
+        assert history.total == 2
+
+    @pytest.mark.asyncio
+    async def test_new_partition_is_visible_to_read_engine(self, two_engines, partitioned):
+        """Test that committing a new partition clears the read engine's cached months."""
+        writer, reader = two_engines
+        now = datetime.utcnow()
+        async with reader() as db:
+            assert (await TrackingService(db, "user123").get_history(days=0, limit=10)).total == 0
+
+        async with writer() as db:
+            await TrackingService(db, "user123").record_plays([make_item("a", now - timedelta(days=40))])
+
+        async with reader() as db:
+            history = await TrackingService(db, "user123").get_history(days=0, limit=10)
+        assert history.total == 1
+
+    @pytest.mark.asyncio
+    async def test_partition_dropped_elsewhere_reads_as_empty(self, two_engines, partitioned):
+        """Test that a partition still listed in a stale cache is read as an empty month."""
+        writer, reader = two_engines
+        now = datetime.utcnow()
+        async with writer() as db:
+            await TrackingService(db, "user123").record_plays([
+                make_item("a", now - timedelta(days=70)),
+                make_item("b", now - timedelta(hours=1)),
+            ])
+        async with reader() as db:
+            assert (await TrackingService(db, "user123").get_history(days=0, limit=10)).total == 2
+
+        # Another process drops the old month; this process's caches still list it
+        async with writer() as db:
+            months = await existing_months(db)
+            await drop_partition(db, months[0])
+            await db.commit()
+        async with reader() as db:
+            await known_months(db)
+            partitions._known[db.get_bind()].months.add(months[0])
+            service = TrackingService(db, "user123")
+            history = await service.get_history(days=0, limit=10)
+            stats = await service.get_stats(days=0)
+
+        assert history.total == 1
+        assert [item.track_id for item in history.items] == ["b"]
+        assert stats.total_plays == 1
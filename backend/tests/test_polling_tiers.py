@@ -0,0 +1,250 @@
+"""Tests for activity-tiered polling of tracked users."""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from app.models.day_sketch import ListeningDaySketch
+from app.models.listening_session import ListeningSession
+from app.models.user_token import UserToken
+from app.services import polling_tiers, scheduler
+from app.services.polling_tiers import ACTIVE, DORMANT, RECENT, PollingTiers, usual_hours
+from app.services.sketch_service import load_hourly_profiles
+
+
+def polled_at(tiers: PollingTiers, user_id: str, start: datetime, ticks: int, playing=lambda t: False) -> list[int]:
+    """Run 30 s ticks and return the ticks at which the user was polled."""
+    polled = []
+    for tick in range(ticks):
+        now = start + timedelta(seconds=30 * tick)
+        if tiers.is_due(user_id, now):
+            tiers.observe(user_id, playing(tick), now)
+            polled.append(tick)
+    return polled
+
+
+class TestPollingTiers:
+    """Tests for tier transitions and polling intervals."""
+
+    def test_tiers_follow_plays(self):
+        """Test active while playing, recent for a while after, then dormant."""
+        tiers = PollingTiers()
+        start = datetime(2024, 1, 1, 3, 0)
+        tiers.observe("u", True, start)
+        assert tiers.tier("u", start) == ACTIVE
+
+        later = start + timedelta(seconds=30)
+        tiers.observe("u", False, later)
+        assert tiers.tier("u", later + timedelta(minutes=29)) == RECENT
+        assert tiers.tier("u", later + timedelta(minutes=31)) == DORMANT
+
+    def test_polling_intervals(self):
+        """Test that idle users are polled rarely and playing ones every tick."""
+        tiers = PollingTiers()
+        start = datetime(2024, 1, 1, 3, 0)
+
+        # Listening for 5 minutes, then idle for almost two hours
+        polled = polled_at(tiers, "u", start, 240, playing=lambda tick: tick < 10)
+        assert polled[:11] == list(range(11))
+        recent = [tick for tick in polled if 10 < tick <= 66]
+        assert recent == list(range(14, 67, 4))
+        dormant = [tick for tick in polled if tick > 66]
+        assert dormant == list(range(86, 240, 20))
+
+    def test_promoted_as_soon_as_seen_playing(self):
+        """Test that a dormant user is polled every tick once seen playing."""
+        tiers = PollingTiers()
+        start = datetime(2024, 1, 1, 3, 0)
+        polled = polled_at(tiers, "u", start, 60, playing=lambda tick: tick >= 25)
+        assert polled == [0, 20] + list(range(40, 60))
+
+    def test_usual_hours_poll_more_often(self):
+        """Test that users are in the recent tier during their usual hours."""
+        tiers = PollingTiers()
+        tiers.usual_hours["u"] = frozenset({20})
+        assert tiers.tier("u", datetime(2024, 1, 1, 20, 15)) == RECENT
+        assert tiers.tier("u", datetime(2024, 1, 1, 21, 15)) == DORMANT
+
+    def test_disabled_polls_everyone(self, monkeypatch):
+        """Test that without tiers every user is polled on every tick."""
+        monkeypatch.setattr(polling_tiers.settings, "poll_tiers", False)
+        tiers = PollingTiers()
+        assert polled_at(tiers, "u", datetime(2024, 1, 1), 30) == list(range(30))
+
+
+class TestTrackingJob:
+    """Tests for the tracking job polling by tier."""
+
+    @pytest.mark.asyncio
+    async def test_only_due_users_are_polled(self, test_session_factory, monkeypatch):
+        """Test that users not due in their tier get no Spotify calls."""
+        async with test_session_factory() as db:
+            db.add_all([
+                UserToken(
+                    user_id=user_id,
+                    access_token=f"token-{user_id}",
+                    refresh_token="refresh",
+                    token_expires_at=datetime.utcnow() + timedelta(hours=1),
+                    tracking_enabled=True,
+                )
+                for user_id in ("idle", "new")
+            ])
+            await db.commit()
+
+        tiers = PollingTiers()
+        start = datetime(2024, 1, 1, 3, 0)
+        tiers.observe("idle", False, start)
+        tiers.observe("gone", False, start)
+        tiers.profiles_loaded_at = start
+
+        calls = []
+
+        async def recently_played(access_token, after):
+            calls.append(access_token)
+            return []
+
+        monkeypatch.setattr(scheduler, "async_session_maker", test_session_factory)
+        monkeypatch.setattr(scheduler, "polling", tiers)
+        monkeypatch.setattr(scheduler, "get_recently_played", recently_played)
+
+        await scheduler.track_all_users(now=start + timedelta(minutes=2))
+        assert calls == ["token-new"]
+        assert "gone" not in tiers.last_polled
+
+        await scheduler.track_all_users(now=start + timedelta(minutes=10))
+        assert calls == ["token-new", "token-idle"]
+
+    @pytest.mark.asyncio
+    async def test_recently_played_promotes(self, test_session_factory, monkeypatch):
+        """Test that users polled rarely are asked for finished plays, and promoted by them."""
+        async with test_session_factory() as db:
+            db.add(UserToken(
+                user_id="u",
+                access_token="token",
+                refresh_token="refresh",
+                token_expires_at=datetime.utcnow() + timedelta(hours=1),
+                tracking_enabled=True,
+            ))
+            await db.commit()
+
+        tiers = PollingTiers()
+        start = datetime.utcnow() - timedelta(minutes=10)
+        tiers.observe("u", False, start)
+        tiers.profiles_loaded_at = start
+
+        def track(track_id: str) -> dict:
+            return {"id": track_id, "name": track_id, "duration_ms": 200000, "artists": [{"name": "A"}], "album": {"name": "B"}}
+
+        playing = []
+
+        async def currently_playing(access_token):
+            playing.append(access_token)
+            return track("now")
+
+        after = []
+
+        async def recently_played(access_token, since):
+            after.append(since)
+            played_at = (start + timedelta(minutes=5)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+            return [{"track": track("missed"), "played_at": played_at}]
+
+        monkeypatch.setattr(scheduler, "async_session_maker", test_session_factory)
+        monkeypatch.setattr(scheduler, "user_session_maker", lambda user_id: test_session_factory)
+        monkeypatch.setattr(scheduler, "polling", tiers)
+        monkeypatch.setattr(scheduler, "get_currently_playing", currently_playing)
+        monkeypatch.setattr(scheduler, "get_recently_played", recently_played)
+
+        await scheduler.track_all_users(now=start + timedelta(minutes=10))
+        assert after == [start]
+        assert playing == []
+        assert tiers.tier("u", start + timedelta(minutes=10, seconds=30)) == ACTIVE
+
+        await scheduler.track_all_users(now=start + timedelta(minutes=10, seconds=30))
+        assert after == [start]
+        assert playing == ["token"]
+
+        async with test_session_factory() as db:
+            result = await db.execute(select(ListeningSession.track_id).order_by(ListeningSession.played_at))
+            assert result.scalars().all() == ["missed", "now"]
+
+
+    @pytest.mark.asyncio
+    async def test_failed_commit_does_not_block_next_user(self, test_session_factory, monkeypatch):
+        """Test that a user whose commit fails is rolled back before the next one is tracked."""
+        async with test_session_factory() as db:
+            db.add_all([
+                UserToken(
+                    user_id=user_id,
+                    access_token=f"token-{user_id}",
+                    refresh_token="refresh",
+                    token_expires_at=datetime.utcnow() + timedelta(hours=1),
+                    tracking_enabled=True,
+                )
+                for user_id in ("a", "b")
+            ])
+            await db.commit()
+
+        async def currently_playing(access_token):
+            user_id = access_token.removeprefix("token-")
+            return {"id": f"track-{user_id}", "name": "T", "duration_ms": 200000, "artists": [{"name": "A"}], "album": {"name": "B"}}
+
+        flush = scheduler.live_feed.flush
+
+        async def failing_flush(db):
+            await flush(db)
+            if not failing_flush.failed:
+                # Fails on commit: user_id is unique
+                failing_flush.failed = True
+                db.add(UserToken(user_id="a", access_token="x", refresh_token="x", token_expires_at=datetime.utcnow()))
+
+        failing_flush.failed = False
+        monkeypatch.setattr(scheduler, "async_session_maker", test_session_factory)
+        monkeypatch.setattr(scheduler, "user_session_maker", lambda user_id: test_session_factory)
+        # Both seen playing on their last poll
+        tiers = PollingTiers()
+        tiers.observe("a", True, datetime.utcnow())
+        tiers.observe("b", True, datetime.utcnow())
+        monkeypatch.setattr(scheduler, "polling", tiers)
+        monkeypatch.setattr(scheduler, "get_currently_playing", currently_playing)
+        monkeypatch.setattr(scheduler.live_feed, "flush", failing_flush)
+
+        await scheduler.track_all_users()
+
+        async with test_session_factory() as db:
+            plays = await db.execute(select(ListeningSession.track_id).order_by(ListeningSession.track_id))
+            tracked = await db.execute(select(UserToken.user_id).where(UserToken.last_tracked_at.is_not(None)))
+            assert plays.scalars().all() == ["track-a", "track-b"]
+            assert tracked.scalars().all() == ["b"]
+
+
+class TestHourlyProfiles:
+    """Tests for usual listening hours from day sketches."""
+
+    def test_usual_hours(self):
+        """Test that only hours holding enough of the plays count."""
+        counts = [0] * 24
+        counts[8], counts[20], counts[21], counts[3] = 10, 40, 45, 5
+        assert usual_hours(counts, 0.06) == frozenset({8, 20, 21})
+        assert usual_hours([0] * 24, 0.06) == frozenset()
+
+    @pytest.mark.asyncio
+    async def test_profiles_from_sketches(self, test_db):
+        """Test that hourly plays are summed over the days in the window."""
+        for user_id, day, hour, plays in [
+            ("a", "2024-01-01", 20, 3),
+            ("a", "2024-01-02", 20, 2),
+            ("b", "2024-01-02", 7, 1),
+            ("a", "2023-11-01", 5, 9),
+        ]:
+            hourly = [[0, 0] for _ in range(24)]
+            hourly[hour] = [plays, plays * 180000]
+            test_db.add(ListeningDaySketch(user_id=user_id, day=day, plays=plays, time_ms=0, hourly=json.dumps(hourly)))
+        await test_db.commit()
+
+        profiles = await load_hourly_profiles(test_db, "2023-12-15")
+        assert set(profiles) == {"a", "b"}
+        assert profiles["a"][20] == 5
+        assert sum(profiles["a"]) == 5
+        assert profiles["b"][7] == 1
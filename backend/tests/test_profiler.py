@@ -0,0 +1,113 @@
+"""Tests for the on-demand sampling profiler."""
+
+import re
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import get_settings
+from app.services import profiler, scheduler
+from app.services.profiler import is_authorized, profiled_tick, profiling_middleware, request_tick_profile
+
+
+@pytest.fixture
+def profiling(tmp_path, monkeypatch):
+    """Enable profiling with a token, writing profiles to a temporary directory."""
+    monkeypatch.setattr(get_settings(), "profiling_token", "secret")
+    monkeypatch.setattr(get_settings(), "profile_dir", str(tmp_path))
+    monkeypatch.setattr(get_settings(), "profiling_interval_ms", 1)
+    monkeypatch.setattr(profiler, "_tick_requested", False)
+    return tmp_path
+
+
+def busy_work(seconds: float) -> None:
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+def profiled_app() -> httpx.AsyncClient:
+    app = FastAPI()
+    app.middleware("http")(profiling_middleware)
+
+    @app.get("/work")
+    async def work():
+        busy_work(0.1)
+        return {"done": True}
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+class TestProfiler:
+    """Tests for profiling requests and scheduler ticks."""
+
+    @pytest.mark.asyncio
+    async def test_request_with_token_is_profiled(self, profiling):
+        """Test that a request with the token gets a collapsed stack profile."""
+        async with profiled_app() as client:
+            response = await client.get("/work", headers={"X-Profile": "secret"})
+
+        path = profiling / response.headers["X-Profile"]
+        lines = path.read_text().splitlines()
+        assert lines
+        assert all(re.fullmatch(r".+ \d+", line) for line in lines)
+        assert any("busy_work (test_profiler.py:" in line for line in lines)
+
+    @pytest.mark.asyncio
+    async def test_request_without_token_is_not_profiled(self, profiling, monkeypatch):
+        """Test that wrong or missing tokens, or no configured token, change nothing."""
+        async with profiled_app() as client:
+            wrong = await client.get("/work", params={"profile": "guess"})
+            monkeypatch.setattr(get_settings(), "profiling_token", None)
+            unset = await client.get("/work", headers={"X-Profile": "secret"})
+
+        assert "X-Profile" not in wrong.headers
+        assert "X-Profile" not in unset.headers
+        assert list(profiling.iterdir()) == []
+
+    @pytest.mark.asyncio
+    async def test_requested_tick_is_profiled_once(self, profiling):
+        """Test that only the tick after a request is profiled."""
+
+        @profiled_tick
+        async def tick():
+            busy_work(0.02)
+
+        await tick()
+        assert list(profiling.iterdir()) == []
+
+        request_tick_profile()
+        await tick()
+        await tick()
+        profiles = list(profiling.iterdir())
+        assert len(profiles) == 1
+        assert profiles[0].name.endswith("-tick.folded")
+
+    def test_tick_endpoint_requires_token(self, profiling, monkeypatch):
+        """Test that only the profiling token can request a tick profile."""
+        from app.main import app
+
+        monkeypatch.setattr(scheduler, "scheduler", object())
+        client = TestClient(app)
+        assert client.post("/admin/profile/tick", headers={"X-Profile": "nope"}).status_code == 403
+        assert client.post("/admin/profile/tick", headers={"X-Profile": "secret"}).status_code == 200
+        assert profiler._tick_requested
+
+    def test_non_ascii_token_is_refused(self, profiling, monkeypatch):
+        """Test that tokens outside ASCII are compared rather than raising."""
+        assert not is_authorized("sécret")
+        monkeypatch.setattr(get_settings(), "profiling_token", "hasło")
+        assert is_authorized("hasło")
+        assert not is_authorized("haslo")
+
+    def test_tick_request_needs_scheduler_process(self, profiling, monkeypatch):
+        """Test that a worker not running the jobs refuses to queue a tick profile."""
+        from app.main import app
+
+        monkeypatch.setattr(scheduler, "scheduler", None)
+        client = TestClient(app)
+        assert client.post("/admin/profile/tick", headers={"X-Profile": "secret"}).status_code == 409
+        assert not profiler._tick_requested
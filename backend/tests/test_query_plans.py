@@ -0,0 +1,177 @@
+"""
+Query plan regression tests.
+
+Every statement a TrackingService method sends is captured and run
+through EXPLAIN QUERY PLAN on a seeded, ANALYZEd database. A method fails
+if it sends more queries than its budget (an N-query loop), if a plan
+scans a listening table instead of searching an index, or if an index it
+is expected to use no longer shows up in its plans.
+"""
+
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base
+from app.models.listening_session import ListeningSession
+from app.schemas.tracking import RecordPlayBatchItem, RecordPlayRequest
+from app.services.sketch_service import rebuild_day_sketches
+from app.services.summary_service import rebuild_entity_summaries
+from app.services.tracking_service import TrackingService
+
+# A full scan of one of the per-user tables (covering scans of an index are fine)
+FULL_SCAN = re.compile(
+    r"^SCAN (listening_sessions|listening_entity_summaries|listening_day_sketches)\b(?! USING COVERING INDEX)"
+)
+
+NEW_PLAY = dict(track_id="new", track_name="New", artist_name="Artist 1", album_name="Album", duration_ms=200000)
+
+# method name -> (call, max queries, indexes its plans must use)
+CASES = {
+    "stats": (
+        lambda service: service.get_stats(days=30),
+        3,
+        {"idx_user_played", "idx_summary_user_entity"},
+    ),
+    "stats_approx": (
+        lambda service: service.get_stats(days=30, approx=True),
+        3,
+        {"idx_sketch_user_day"},
+    ),
+    "history": (
+        lambda service: service.get_history(days=30, limit=20),
+        2,
+        {"idx_user_played"},
+    ),
+    "analytics": (
+        lambda service: service.get_advanced_analytics(days=30),
+        5,
+        {"idx_user_played"},
+    ),
+    "analytics_approx": (
+        lambda service: service.get_advanced_analytics(days=30, approx=True),
+        4,
+        {"idx_sketch_user_day"},
+    ),
+    "monthly": (
+        lambda service: service.get_monthly_comparison(months=6),
+        1,
+        {"idx_user_played"},
+    ),
+    "forgotten": (
+        lambda service: service.get_forgotten_favorites(),
+        1,
+        {"idx_summary_user_last"},
+    ),
+    "record_play": (
+        lambda service: service.record_play(RecordPlayRequest(**NEW_PLAY)),
+        4,
+        {"idx_user_played", "idx_sketch_user_day"},
+    ),
+    "record_plays": (
+        lambda service: service.record_plays([
+            RecordPlayBatchItem(**NEW_PLAY, played_at=datetime.utcnow() - timedelta(minutes=10 * i))
+            for i in range(5)
+        ]),
+        6,
+        {"idx_user_played", "idx_sketch_user_day"},
+    ),
+}
+
+
+@pytest.fixture
+async def plan_engine(tmp_path):
+    """A file database with a few users' plays, summaries, sketches and statistics."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'plans.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    now = datetime.utcnow()
+    async with session_maker() as db:
+        db.add_all([
+            ListeningSession(
+                user_id=f"user{i % 3}",
+                track_id=f"track{i % 50}",
+                track_name=f"Track {i % 50}",
+                artist_name=f"Artist {i % 9}",
+                album_name=f"Album {i % 20}",
+                duration_ms=200000,
+                played_at=now - timedelta(hours=i),
+            )
+            for i in range(3000)
+        ])
+        # Today's sketch exists, as it does after a day's first play, even just after midnight
+        db.add_all([
+            ListeningSession(
+                user_id=f"user{i}",
+                track_id="today",
+                track_name="Today",
+                artist_name="Artist 1",
+                album_name="Album 1",
+                duration_ms=200000,
+                played_at=now.replace(hour=0, minute=0, second=0, microsecond=0),
+            )
+            for i in range(3)
+        ])
+        await db.commit()
+        await rebuild_entity_summaries(db)
+        await rebuild_day_sketches(db)
+
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql("ANALYZE")
+
+    yield engine, session_maker
+
+    await engine.dispose()
+
+
+async def explain(engine, statement: str, parameters) -> list[str]:
+    """The EXPLAIN QUERY PLAN detail lines of a statement."""
+    if isinstance(parameters, list):  # executemany: one parameter set is enough
+        parameters = parameters[0]
+    async with engine.connect() as conn:
+        result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row[-1] for row in result.all()]
+
+
+class TestQueryPlans:
+    """Tests for query counts and index use of the tracking endpoints."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("name", list(CASES))
+    async def test_query_budget_and_indexes(self, plan_engine, name):
+        """Test that a method stays within its query budget and searches indexes."""
+        engine, session_maker = plan_engine
+        call, budget, indexes = CASES[name]
+
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        async with session_maker() as db:
+            service = TrackingService(db, "user1")
+            event.listen(engine.sync_engine, "before_cursor_execute", capture)
+            try:
+                await call(service)
+            finally:
+                event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+        queries = [
+            (statement, parameters) for statement, parameters in statements
+            if statement.lstrip().upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"))
+        ]
+        assert len(queries) <= budget, f"{name} sent {len(queries)} queries (budget {budget})"
+
+        used = set()
+        for statement, parameters in queries:
+            plan = await explain(engine, statement, parameters)
+            scans = [line for line in plan if FULL_SCAN.match(line)]
+            assert not scans, f"{name} scans a table: {scans} in {statement}"
+            used.update(re.findall(r"INDEX (\w+)", " ".join(plan)))
+
+        assert indexes <= used, f"{name} no longer uses {indexes - used}"
@@ -0,0 +1,79 @@
+"""Tests for per-request Server-Timing instrumentation."""
+
+import asyncio
+import json
+import logging
+import re
+
+import httpx
+import pytest
+from fastapi import APIRouter, FastAPI
+
+from app.main import app
+from app.routers.tracking import get_user_id, get_user_read_db
+from app.services.request_timing import TimedRoute, server_timing_middleware, span
+
+
+def phases(header: str) -> dict[str, float]:
+    return {name: float(ms) for name, ms in re.findall(r"(\w+);dur=([\d.]+)", header)}
+
+
+class TestRequestTiming:
+    """Tests for the timing middleware, spans and routes."""
+
+    @pytest.mark.asyncio
+    async def test_phases_in_header(self):
+        """Test that spans, serialization and the remainder show up in the header."""
+        test_app = FastAPI()
+        test_app.middleware("http")(server_timing_middleware)
+        router = APIRouter(route_class=TimedRoute)
+
+        @router.get("/slow")
+        async def slow():
+            with span("spotify"):
+                await asyncio.sleep(0.02)
+            return [{"value": i} for i in range(20000)]
+
+        test_app.include_router(router)
+
+        transport = httpx.ASGITransport(app=test_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/slow")
+
+        timings = phases(response.headers["Server-Timing"])
+        assert list(timings) == ["spotify", "sql", "aggregate", "serialize", "app", "total"]
+        assert timings["spotify"] >= 20
+        assert timings["serialize"] > 0
+        assert timings["total"] >= timings["spotify"] + timings["serialize"]
+
+    @pytest.mark.asyncio
+    async def test_tracking_request_counts_queries(self, test_session_factory, caplog):
+        """Test the SQL phase and the log line of a real tracking endpoint."""
+
+        async def fake_user_id():
+            with span("spotify"):
+                return "user123"
+
+        async def read_db():
+            async with test_session_factory() as session:
+                yield session
+
+        app.dependency_overrides[get_user_id] = fake_user_id
+        app.dependency_overrides[get_user_read_db] = read_db
+        try:
+            transport = httpx.ASGITransport(app=app)
+            with caplog.at_level(logging.INFO, logger="app.services.request_timing"):
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    response = await client.get("/api/tracking/stats")
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 200
+        queries = int(re.search(r'sql;dur=[\d.]+;desc="(\d+) queries"', response.headers["Server-Timing"]).group(1))
+        assert queries > 0
+
+        record = json.loads(caplog.records[-1].getMessage())
+        assert record["path"] == "/api/tracking/stats"
+        assert record["status"] == 200
+        assert record["sql_queries"] == queries
+        assert set(record) >= {"spotify_ms", "sql_ms", "aggregate_ms", "serialize_ms", "app_ms", "total_ms"}
@@ -0,0 +1,151 @@
+"""Tests for per-user database shards."""
+
+import zlib
+
+import pytest
+
+from sqlalchemy import select, func
+
+from app import database
+from app.config import get_settings
+from app.models.day_sketch import ListeningDaySketch
+from app.models.entity_summary import ListeningEntitySummary
+from app.models.listening_session import ListeningSession
+from app.schemas.tracking import RecordPlayRequest
+from app.services import shards as shard_service
+from app.services.tracking_service import TrackingService
+
+
+@pytest.fixture
+async def shards(tmp_path, monkeypatch):
+    """Enable four shards in a temporary directory."""
+    monkeypatch.setattr(get_settings(), "shard_count", 4)
+    monkeypatch.setattr(get_settings(), "shard_dir", str(tmp_path / "shards"))
+    await database.create_shard_tables()
+    yield tmp_path / "shards"
+    await database.dispose_shards()
+
+
+def user_on_other_shard(user_id: str) -> str:
+    """A user id that hashes to a different shard than user_id."""
+    return next(
+        f"user{i}" for i in range(100)
+        if database.shard_for(f"user{i}") != database.shard_for(user_id)
+    )
+
+
+def make_request(track_id: str) -> RecordPlayRequest:
+    return RecordPlayRequest(
+        track_id=track_id,
+        track_name=f"Track {track_id}",
+        artist_name="Test Artist",
+        album_name="Test Album",
+        duration_ms=180000,
+    )
+
+
+async def count_rows(session_maker, model, user_id: str) -> int:
+    async with session_maker() as db:
+        return await db.scalar(select(func.count()).select_from(model).where(model.user_id == user_id))
+
+
+class TestSharding:
+    """Tests for routing users to shards."""
+
+    def test_shard_for_is_stable(self, monkeypatch):
+        """Test that a user always maps to the same shard in range."""
+        monkeypatch.setattr(get_settings(), "shard_count", 8)
+
+        shards = {database.shard_for(f"user{i}") for i in range(200)}
+        assert shards == set(range(8))
+        assert database.shard_for("user123") == database.shard_for("user123")
+
+    def test_unsharded_uses_main_database(self):
+        """Test that without shards every user gets the main session factory."""
+        assert database.user_session_maker("user123") is database.async_session_maker
+        assert database.data_session_makers() == [database.async_session_maker]
+
+    @pytest.mark.asyncio
+    async def test_plays_are_stored_in_user_shard(self, shards):
+        """Test that each user's plays land only in their own shard file."""
+        users = ["user123", user_on_other_shard("user123")]
+        request = RecordPlayRequest(
+            track_id="track123",
+            track_name="Test Track",
+            artist_name="Test Artist",
+            album_name="Test Album",
+            duration_ms=180000,
+        )
+
+        for user_id in users:
+            async with database.user_session_maker(user_id)() as db:
+                response = await TrackingService(db, user_id).record_play(request)
+                assert response.recorded is True
+                assert database.holds_user(db, user_id)
+                assert not database.holds_user(db, users[0] if user_id != users[0] else users[1])
+
+        assert len(list(shards.glob("shard-*.db"))) == 4
+        for user_id in users:
+            async with database.user_session_maker(user_id)() as db:
+                count = await db.scalar(select(func.count()).select_from(ListeningSession))
+                stats = await TrackingService(db, user_id).get_stats(days=1)
+            assert count == 1
+            assert stats.total_plays == 1
+
+    @pytest.mark.asyncio
+    async def test_unsharded_data_moves_into_shards(self, test_session_factory, tmp_path, monkeypatch):
+        """Test that enabling shards moves existing history out of the main database."""
+        users = ["user123", "user456"]
+        async with test_session_factory() as db:
+            for user_id in users:
+                await TrackingService(db, user_id).record_play(make_request("a"))
+                await TrackingService(db, user_id).record_play(make_request("b"))
+
+        monkeypatch.setattr(shard_service, "async_session_maker", test_session_factory)
+        monkeypatch.setattr(get_settings(), "shard_count", 4)
+        monkeypatch.setattr(get_settings(), "shard_dir", str(tmp_path / "shards"))
+        await database.create_shard_tables()
+        try:
+            assert await shard_service.migrate_to_shards() == 4
+            assert await shard_service.migrate_to_shards() == 0
+
+            for user_id in users:
+                shard = database.user_session_maker(user_id)
+                assert await count_rows(test_session_factory, ListeningSession, user_id) == 0
+                assert await count_rows(test_session_factory, ListeningDaySketch, user_id) == 0
+                assert await count_rows(test_session_factory, ListeningEntitySummary, user_id) == 0
+                assert await count_rows(shard, ListeningSession, user_id) == 2
+                assert await count_rows(shard, ListeningDaySketch, user_id) == 1
+                async with shard() as db:
+                    stats = await TrackingService(db, user_id).get_stats(days=1)
+                assert stats.total_plays == 2
+        finally:
+            await database.dispose_shards()
+
+    @pytest.mark.asyncio
+    async def test_changed_shard_count_rebalances_users(self, test_session_factory, shards, monkeypatch):
+        """Test that users routed to another shard by a new shard_count are moved there."""
+        monkeypatch.setattr(shard_service, "async_session_maker", test_session_factory)
+        users = [f"user{i}" for i in range(8)]
+        for user_id in users:
+            async with database.user_session_maker(user_id)() as db:
+                await TrackingService(db, user_id).record_play(make_request("a"))
+
+        monkeypatch.setattr(get_settings(), "shard_count", 3)
+        await database.create_shard_tables()
+        moved = await shard_service.migrate_to_shards()
+
+        assert 0 < moved == sum(1 for user_id in users if database.shard_for(user_id) != zlib.crc32(user_id.encode()) % 4)
+        for user_id in users:
+            assert await count_rows(database.user_session_maker(user_id), ListeningSession, user_id) == 1
+        async with database.shard_session_maker(3)() as db:
+            assert await db.scalar(select(func.count()).select_from(ListeningSession)) == 0
+
+    @pytest.mark.asyncio
+    async def test_sharding_needs_sqlite(self, monkeypatch):
+        """Test that shards are refused next to a PostgreSQL database."""
+        monkeypatch.setattr(get_settings(), "shard_count", 4)
+        monkeypatch.setattr(database, "engine", database.create_engine_for("postgresql+asyncpg://user@localhost/stats"))
+
+        with pytest.raises(RuntimeError, match="SQLite"):
+            await database.create_shard_tables()
@@ -0,0 +1,166 @@
+"""Tests for approximate statistics sketches."""
+
+import asyncio
+
+import pytest
+from datetime import datetime, timedelta
+
+from app.services.sketches import HyperLogLog, SpaceSaving
+from app.services.sketch_service import update_day_sketches, load_sketch_window
+from app.services.tracking_service import TrackingService
+from app.models.listening_session import ListeningSession
+
+
+class TestHyperLogLog:
+    """Tests for HyperLogLog distinct counting."""
+    
+    def test_small_cardinality_is_exact(self):
+        """Test that small sets are counted exactly by linear counting."""
+        sketch = HyperLogLog()
+        for i in range(100):
+            sketch.add(f"track{i}")
+            sketch.add(f"track{i}")
+        
+        assert sketch.estimate() == 100
+    
+    def test_large_cardinality_within_error_bound(self):
+        """Test that estimates stay within 3 standard errors (~7%)."""
+        sketch = HyperLogLog()
+        for i in range(50000):
+            sketch.add(f"track{i}")
+        
+        assert abs(sketch.estimate() - 50000) / 50000 < 0.07
+    
+    def test_merge_equals_union(self):
+        """Test that merging serialized sketches equals sketching the union."""
+        a, b, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        for i in range(300):
+            a.add(f"artist{i}")
+        for i in range(200, 2000):
+            b.add(f"artist{i}")
+        for i in range(2000):
+            union.add(f"artist{i}")
+        
+        merged = HyperLogLog.from_bytes(a.to_bytes())
+        merged.merge_bytes(b.to_bytes())
+        
+        assert merged.registers == union.registers
+        assert abs(merged.estimate() - 2000) / 2000 < 0.07
+
+
+class TestSpaceSaving:
+    """Tests for Space-Saving top-K summaries."""
+    
+    def test_exact_below_capacity(self):
+        """Test that counts are exact while keys fit in the summary."""
+        summary = SpaceSaving(capacity=10)
+        for i in range(5):
+            for _ in range(i + 1):
+                summary.add(f"track{i}", 1000)
+        
+        top = summary.top(2)
+        assert [key for key, _ in top] == ["track4", "track3"]
+        assert top[0][1][0] == 5
+        assert top[0][1][2] == 5000
+        assert summary.floor == 0
+    
+    def test_heavy_hitter_survives_merge(self):
+        """Test that a frequent key stays on top with bounded error after merging."""
+        day1, day2 = SpaceSaving(capacity=5), SpaceSaving(capacity=5)
+        for day in (day1, day2):
+            for i in range(20):
+                day.add(f"rare{i}")
+                day.add("favourite")
+        
+        day1.merge(SpaceSaving.from_json(day2.to_json()))
+        
+        key, (count, error, _, _) = day1.top(1)[0]
+        assert key == "favourite"
+        assert count - error <= 40 <= count
+
+
+class TestApproximateStats:
+    """Tests for ?approx=true answered from day sketches."""
+    
+    @pytest.mark.asyncio
+    async def test_approx_stats_match_exact(self, test_db):
+        """Test that approximate stats agree with exact ones on small data."""
+        service = TrackingService(test_db, "user123")
+        
+        sessions = []
+        for i in range(6):
+            session = ListeningSession(
+                user_id="user123",
+                track_id=f"track{i % 3}",
+                track_name=f"Track {i % 3}",
+                artist_name=f"Artist {i % 2}",
+                album_name="Test Album",
+                duration_ms=180000,
+                played_at=datetime.utcnow() - timedelta(hours=i),
+            )
+            test_db.add(session)
+            sessions.append(session)
+        
+        await update_day_sketches(test_db, sessions)
+        await test_db.commit()
+        
+        exact = await service.get_stats(days=30)
+        approx = await service.get_stats(days=30, approx=True)
+        
+        assert approx.approximate is True
+        assert approx.total_plays == exact.total_plays
+        assert approx.total_time_ms == exact.total_time_ms
+        assert approx.unique_tracks == exact.unique_tracks
+        assert approx.unique_artists == exact.unique_artists
+        assert approx.top_tracks[0].play_count == exact.top_tracks[0].play_count
+    
+    @pytest.mark.asyncio
+    async def test_record_play_updates_sketch(self, test_db):
+        """Test that recording a play folds it into today's sketch."""
+        service = TrackingService(test_db, "user123")
+        
+        from app.schemas.tracking import RecordPlayRequest
+        await service.record_play(RecordPlayRequest(
+            track_id="track1",
+            track_name="Track 1",
+            artist_name="Artist",
+            album_name="Album",
+            duration_ms=200000,
+        ))
+        
+        window = await load_sketch_window(test_db, "user123")
+        assert window.plays == 1
+        assert window.time_ms == 200000
+        
+        analytics = await service.get_advanced_analytics(days=7, approx=True)
+        assert analytics.approximate is True
+        assert analytics.new_tracks_count == 1
+        assert analytics.streak.current_streak == 1
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_writers_merge_into_one_day(self, test_session_factory):
+        """Test that writers folding plays into the same new day lose nothing."""
+        played_at = datetime(2024, 3, 1, 12, 0)
+        
+        async def fold(i: int):
+            async with test_session_factory() as db:
+                play = ListeningSession(
+                    user_id="user123",
+                    track_id=f"track{i}",
+                    track_name=f"Track {i}",
+                    artist_name="Artist",
+                    album_name="Album",
+                    duration_ms=1000,
+                    played_at=played_at + timedelta(minutes=i),
+                )
+                await update_day_sketches(db, [play])
+                await asyncio.sleep(0.01)
+                await db.commit()
+        
+        await asyncio.gather(*(fold(i) for i in range(4)))
+        
+        async with test_session_factory() as db:
+            window = await load_sketch_window(db, "user123")
+            assert window.plays == 4
+            assert window.time_ms == 4000
+            assert window.tracks_hll.estimate() == 4
@@ -0,0 +1,92 @@
+"""Tests for lifetime entity summaries."""
+
+import pytest
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.models.entity_summary import ListeningEntitySummary
+from app.models.listening_session import ListeningSession
+from app.services.summary_service import update_entity_summaries, rebuild_entity_summaries
+from app.services.tracking_service import TrackingService
+
+
+def make_session(track: str, artist: str, played_at: datetime) -> ListeningSession:
+    """Build a listening session for user123."""
+    return ListeningSession(
+        user_id="user123",
+        track_id=track,
+        track_name=f"Track {track}",
+        artist_name=artist,
+        album_name=f"Album {artist}",
+        duration_ms=180000,
+        played_at=played_at,
+    )
+
+
+class TestEntitySummaries:
+    """Tests for summary maintenance and lookups."""
+    
+    @pytest.mark.asyncio
+    async def test_upsert_accumulates(self, test_db):
+        """Test that repeated updates merge counts and first/last dates."""
+        now = datetime.utcnow()
+        await update_entity_summaries(test_db, [make_session("t1", "Artist", now - timedelta(days=3))])
+        await update_entity_summaries(test_db, [
+            make_session("t1", "Artist", now),
+            make_session("t1", "Artist", now - timedelta(days=10)),
+        ])
+        await test_db.commit()
+        
+        result = await test_db.execute(
+            select(ListeningEntitySummary).where(ListeningEntitySummary.entity_type == "track")
+        )
+        summary = result.scalar_one()
+        
+        assert summary.play_count == 3
+        assert summary.total_ms == 3 * 180000
+        assert summary.first_played_at == now - timedelta(days=10)
+        assert summary.last_played_at == now
+    
+    @pytest.mark.asyncio
+    async def test_new_artists_and_tracks_use_lifetime_history(self, test_db):
+        """Test that an artist heard before the window is not reported as new."""
+        now = datetime.utcnow()
+        sessions = [
+            make_session("old", "Old Artist", now - timedelta(days=60)),
+            make_session("old", "Old Artist", now - timedelta(days=1)),
+            make_session("new", "New Artist", now - timedelta(days=2)),
+            make_session("new", "New Artist", now - timedelta(days=1)),
+        ]
+        test_db.add_all(sessions)
+        await test_db.commit()
+        await rebuild_entity_summaries(test_db)
+        
+        service = TrackingService(test_db, "user123")
+        analytics = await service.get_advanced_analytics(days=30)
+        
+        assert [a.artist_name for a in analytics.new_artists] == ["New Artist"]
+        assert analytics.new_artists[0].total_plays == 2
+        assert analytics.new_tracks_count == 1
+        
+        stats = await service.get_stats(days=30)
+        first_listens = {t.track_id: t.first_played_at for t in stats.top_tracks}
+        assert first_listens["old"] == now - timedelta(days=60)
+    
+    @pytest.mark.asyncio
+    async def test_forgotten_favorites(self, test_db):
+        """Test that only items not heard recently are returned, most played first."""
+        now = datetime.utcnow()
+        await update_entity_summaries(test_db, [
+            make_session("a", "Loved", now - timedelta(days=200)),
+            make_session("b", "Loved", now - timedelta(days=150)),
+            make_session("c", "Once", now - timedelta(days=120)),
+            make_session("d", "Current", now - timedelta(days=1)),
+        ])
+        await test_db.commit()
+        
+        service = TrackingService(test_db, "user123")
+        forgotten = await service.get_forgotten_favorites(entity_type="artist", inactive_days=90)
+        
+        assert [f.name for f in forgotten] == ["Loved", "Once"]
+        assert forgotten[0].play_count == 2
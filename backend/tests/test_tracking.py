@@ -1,12 +1,17 @@
 """Tests for tracking service and endpoints."""
 
+import asyncio
 import pytest
 from datetime import datetime, timedelta
 from unittest.mock import patch, AsyncMock
 
-from app.services.tracking_service import TrackingService
-from app.schemas.tracking import RecordPlayRequest
-from app.models.listening_session import ListeningSession
+from sqlalchemy import select, func, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database import _upgrade_schema
+from app.services.tracking_service import TrackingService, insert_new_plays
+from app.schemas.tracking import RecordPlayRequest, RecordPlayBatchItem
+from app.models.listening_session import ListeningSession, play_bucket
 
 
 class TestTrackingService:
@@ -53,6 +58,47 @@ class TestTrackingService:
         assert response2.recorded is False
         assert "duplicate" in response2.message.lower()
     
+    @pytest.mark.asyncio
+    async def test_record_plays_batch(self, test_db):
+        """Test that a batch is deduplicated and reports per-play results in order."""
+        service = TrackingService(test_db, "user123")
+        now = datetime.utcnow().replace(microsecond=0)
+        
+        def item(track_id: str, minutes_ago: int) -> RecordPlayBatchItem:
+            return RecordPlayBatchItem(
+                track_id=track_id,
+                track_name="Test Track",
+                artist_name="Test Artist",
+                album_name="Test Album",
+                duration_ms=180000,
+                played_at=now - timedelta(minutes=minutes_ago),
+            )
+        
+        test_db.add(ListeningSession(
+            user_id="user123",
+            track_id="stored",
+            track_name="Stored",
+            artist_name="Test Artist",
+            album_name="Test Album",
+            duration_ms=180000,
+            played_at=now - timedelta(minutes=60),
+        ))
+        await test_db.commit()
+        
+        response = await service.record_plays([
+            item("track1", 10),
+            item("stored", 61),  # Within 3 minutes of the stored play
+            item("track2", 8),
+            item("track1", 9),  # Within 3 minutes of the first item
+        ])
+        
+        assert [r.recorded for r in response.results] == [True, False, True, False]
+        assert (response.recorded, response.duplicates) == (2, 2)
+        
+        stored = await test_db.get(ListeningSession, response.results[2].id)
+        assert stored.track_id == "track2"
+        assert stored.played_at == now - timedelta(minutes=8)
+    
     @pytest.mark.asyncio
     async def test_get_stats_empty(self, test_db):
         """Test get_stats with no listening history."""
@@ -127,6 +173,142 @@ class TestTrackingService:
         # Most recent first
         assert history.items[0].track_name == "Track 0"
     
+    @pytest.mark.asyncio
+    async def test_get_history_cursor_pagination(self, test_db):
+        """Test that next_cursor walks the history without gaps or repeats."""
+        service = TrackingService(test_db, "user123")
+        
+        played_at = datetime.utcnow() - timedelta(hours=1)
+        for i in range(5):
+            # Two sessions share each timestamp to exercise the id tie-breaker
+            session = ListeningSession(
+                user_id="user123",
+                track_id=f"track{i}",
+                track_name=f"Track {i}",
+                artist_name="Test Artist",
+                album_name="Test Album",
+                duration_ms=180000,
+                played_at=played_at - timedelta(minutes=i // 2),
+            )
+            test_db.add(session)
+        
+        await test_db.commit()
+        
+        page1 = await service.get_history(days=30, limit=2)
+        page2 = await service.get_history(days=30, limit=2, cursor=page1.next_cursor, include_total=False)
+        page3 = await service.get_history(days=30, limit=2, cursor=page2.next_cursor)
+        counted = await service.get_history(days=30, limit=2, cursor=page1.next_cursor, include_total=True)
+        
+        assert page1.total == 5
+        assert page2.total is None
+        assert page3.total is None  # cursor pages skip the count by default
+        assert counted.total == 5
+        assert page3.next_cursor is None
+        
+        ids = [item.id for page in (page1, page2, page3) for item in page.items]
+        assert len(ids) == 5
+        assert len(set(ids)) == 5
+    
+    @pytest.mark.asyncio
+    async def test_get_history_invalid_cursor(self, test_db):
+        """Test that a malformed cursor is rejected."""
+        service = TrackingService(test_db, "user123")
+        
+        with pytest.raises(ValueError):
+            await service.get_history(cursor="not-a-cursor")
+    
+    @pytest.mark.asyncio
+    async def test_analytics_concurrent_queries_match_sequential(self, test_session_factory):
+        """Test that running sub-queries on separate sessions gives the same result."""
+        async with test_session_factory() as db:
+            for i in range(20):
+                db.add(ListeningSession(
+                    user_id="user123",
+                    track_id=f"track{i % 4}",
+                    track_name=f"Track {i % 4}",
+                    artist_name=f"Artist {i % 3}",
+                    album_name="Test Album",
+                    duration_ms=180000,
+                    played_at=datetime.utcnow() - timedelta(days=i),
+                ))
+            await db.commit()
+        
+        async with test_session_factory() as db:
+            sequential = await TrackingService(db, "user123").get_advanced_analytics(days=7)
+            concurrent = await TrackingService(
+                db, "user123", session_factory=test_session_factory
+            ).get_advanced_analytics(days=7)
+        
+        assert concurrent == sequential
+        assert concurrent.trend.current_period_ms == 7 * 180000
+        assert concurrent.trend.previous_period_ms == 7 * 180000
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_record_play_stores_one_row(self, test_session_factory):
+        """Test that two writers recording the same play at once store it once."""
+        request = RecordPlayRequest(
+            track_id="track123",
+            track_name="Test Track",
+            artist_name="Test Artist",
+            album_name="Test Album",
+            duration_ms=180000,
+        )
+    
+        async def record():
+            async with test_session_factory() as db:
+                return await TrackingService(db, "user123").record_play(request)
+    
+        responses = await asyncio.gather(record(), record())
+        assert sorted(r.recorded for r in responses) == [False, True]
+    
+        async with test_session_factory() as db:
+            count = await db.scalar(select(func.count()).select_from(ListeningSession))
+        assert count == 1
+    
+    @pytest.mark.asyncio
+    async def test_bucket_index_rejects_same_play(self, test_db):
+        """Test that the unique bucket index skips a play that slipped past the check."""
+        play = ListeningSession(
+            user_id="user123",
+            track_id="track123",
+            track_name="Test Track",
+            artist_name="Test Artist",
+            album_name="Test Album",
+            duration_ms=180000,
+            played_at=datetime(2024, 1, 15, 14, 30, 0),
+        )
+    
+        first = await insert_new_plays(test_db, [play])
+        second = await insert_new_plays(test_db, [play])
+    
+        assert first[0] is not None
+        assert second == [None]
+    
+    @pytest.mark.asyncio
+    async def test_schema_upgrade_adds_bucket(self, tmp_path):
+        """Test that an old database gains the bucket column and unique index."""
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "CREATE TABLE listening_sessions (id INTEGER PRIMARY KEY, user_id VARCHAR, "
+                "track_id VARCHAR, track_name VARCHAR, artist_name VARCHAR, album_name VARCHAR, "
+                "duration_ms INTEGER, played_at DATETIME)"
+            ))
+            for played_at in ("2024-01-15 14:30:00.000000", "2024-01-15 14:31:00.000000", "2024-01-15 15:00:00.000000"):
+                await conn.execute(text(
+                    "INSERT INTO listening_sessions (user_id, track_id, track_name, artist_name, "
+                    f"album_name, duration_ms, played_at) VALUES ('u', 't', 'T', 'A', 'B', 1, '{played_at}')"
+                ))
+            await conn.run_sync(_upgrade_schema)
+    
+            result = await conn.execute(text("SELECT played_at, played_bucket FROM listening_sessions ORDER BY id"))
+            rows = result.all()
+        await engine.dispose()
+    
+        assert rows[0][1] == play_bucket(datetime(2024, 1, 15, 14, 30))
+        assert rows[1][1] is None  # Older duplicate kept outside the index
+        assert rows[2][1] == play_bucket(datetime(2024, 1, 15, 15, 0))
+    
     def test_format_time_minutes(self):
         """Test time formatting for minutes."""
         result = TrackingService._format_time(300000)  # 5 minutes